@@ -156,14 +156,29 @@ export class ChatMessage extends HTMLElement {
       this.querySelector(".rb-loading-ellipsis")
     );
     let responseComplete = this.querySelector(".rb-loading-complete");
-    let webSocket = new WebSocket(endPoint);
+    const loadingLabel = responseLoading.getAttribute("aria-label") || "Loading";
+    /** @type {WebSocket} */
+    let webSocket;
     let streamedContent = "";
+    let started = false;
+    // A dropped connection resumes the response from the frames received so far, unless it has ended
+    let framesReceived = 0;
+    let responseEnded = false;
+    let reconnectAttempts = 0;
+    const MAX_RECONNECT_ATTEMPTS = 3;
+    const RECONNECT_DELAY_MS = 1000;
+    const canResume = () =>
+      this.dataset.status === "streaming" &&
+      !responseEnded &&
+      reconnectAttempts < MAX_RECONNECT_ATTEMPTS &&
+      Boolean(chatControllerRef.dataset.sessionId);
 
     // Stop streaming on escape-key or stop-button press
+    // The server saves the response so far, sends "end" and then closes the connection
     const stopStreaming = () => {
       this.dataset.status = "stopped";
       if (webSocket.readyState === WebSocket.OPEN) {
-        webSocket.close();
+        webSocket.send(JSON.stringify({ type: "stop" }));
       }
     };
     this.addEventListener("keydown", (evt) => {
@@ -173,24 +188,33 @@ export class ChatMessage extends HTMLElement {
     });
     document.addEventListener("stop-streaming", stopStreaming);
 
-    webSocket.onopen = (event) => {
-      webSocket.send(
-        JSON.stringify({
-          message: message,
-          sessionId: sessionId,
-          selectedFiles: selectedDocuments,
-          activities: activities,
-          llm: llm,
-        })
-      );
+    /**
+     * Opens a connection and sends it a first message
+     * @param {object} firstMessage
+     */
+    const connect = (firstMessage) => {
+      webSocket = new WebSocket(endPoint);
+      webSocket.onopen = onOpen(firstMessage);
+      webSocket.onerror = onError;
+      webSocket.onclose = onClose;
+      webSocket.onmessage = onMessage;
+    };
+
+    /** @param {object} firstMessage */
+    const onOpen = (firstMessage) => (event) => {
+      webSocket.send(JSON.stringify(firstMessage));
+      if (started) {
+        return;
+      }
+      started = true;
       this.dataset.status = "streaming";
       const chatResponseStartEvent = new CustomEvent("chat-response-start");
       document.dispatchEvent(chatResponseStartEvent);
     };
 
-    webSocket.onerror = (event) => {
+    const onError = (event) => {
       console.error("WebSocket encountered an error:", event);
-      if (!this.responseContainer) {
+      if (!this.responseContainer || canResume()) {
         return;
       }
       this.responseContainer.innerHTML =
@@ -198,8 +222,21 @@ export class ChatMessage extends HTMLElement {
       this.dataset.status = "error";
     };
 
-    webSocket.onclose = (event) => {
+    const onClose = (event) => {
       console.warn("WebSocket connection closed:", event);
+      if (canResume()) {
+        reconnectAttempts++;
+        window.setTimeout(() => {
+          if (this.dataset.status === "streaming") {
+            connect({
+              type: "resume",
+              sessionId: chatControllerRef.dataset.sessionId,
+              offset: framesReceived,
+            });
+          }
+        }, RECONNECT_DELAY_MS * reconnectAttempts);
+        return;
+      }
       responseLoading.style.display = "none";
       if (responseComplete) {
         responseComplete.textContent = "Response complete";
@@ -211,7 +248,9 @@ export class ChatMessage extends HTMLElement {
       document.dispatchEvent(stopStreamingEvent);
     };
 
-    webSocket.onmessage = (event) => {
+    const onMessage = (event) => {
+      framesReceived++;
+      reconnectAttempts = 0;
       let response;
       try {
         response = JSON.parse(event.data);
@@ -244,9 +283,19 @@ export class ChatMessage extends HTMLElement {
           plausible("Chat-message-route", { props: { route: response.data } });
           this.plausibleRouteDataSent = true;
         }
+      } else if (response.type === "queue-position") {
+        // Position 0 means the response has left the queue
+        const loadingText = response.data
+          ? `Waiting for other responses to finish, number ${response.data} in the queue`
+          : loadingLabel;
+        responseLoading.setAttribute("aria-label", loadingText);
+        if (responseLoading.firstChild) {
+          responseLoading.firstChild.textContent = loadingText;
+        }
       } else if (response.type === "activity") {
         this.addActivity(response.data, "ai");
       } else if (response.type === "end") {
+        responseEnded = true;
         sourcesContainer.showCitations(response.data.message_id);
         feedbackContainer?.showFeedback(response.data.message_id);
         this.#addFootnotes(streamedContent);
@@ -258,6 +307,7 @@ export class ChatMessage extends HTMLElement {
         });
         document.dispatchEvent(chatResponseEndEvent);
       } else if (response.type === "error") {
+        responseEnded = true;
         this.querySelector(".govuk-notification-banner")?.removeAttribute(
           "hidden"
         );
@@ -285,6 +335,14 @@ export class ChatMessage extends HTMLElement {
         
       }
     };
+
+    connect({
+      message: message,
+      sessionId: sessionId,
+      selectedFiles: selectedDocuments,
+      activities: activities,
+      llm: llm,
+    });
   };
 }
 customElements.define("chat-message", ChatMessage);
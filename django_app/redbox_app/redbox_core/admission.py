@@ -0,0 +1,203 @@
+"""
+Admission control for the chat answers each worker generates.
+
+Answers wait their turn in a queue, so that one user's burst of requests can't hold every LLM call this worker makes,
+and the answers running when a burst arrives keep their pace. An answer runs once the worker is running fewer than
+max_running answers, its user fewer than max_running_per_user, and both its user's token bucket and the worker's hold
+its estimated tokens. Estimates are raised as an answer reports the tokens it has selected and used, taking the
+difference from both buckets, so a heavy user's next answers wait for their own bucket to refill while other users'
+answers go ahead of them. The worker's bucket is a ceiling on all users together, which answers wait for in turn.
+"""
+
+import asyncio
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Awaitable, Callable, Hashable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+
+class BusyError(Exception):
+    """Raised when an answer can't even be queued."""
+
+
+@dataclass(eq=False)
+class Admission:
+    user_id: Hashable
+    tokens: int
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+@dataclass
+class TokenBucket:
+    """Tokens refilled at a steady rate up to capacity, which charges for tokens already used may overdraw."""
+
+    capacity: int
+    tokens_per_second: float
+    tokens: float
+    refilled_at: float
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.tokens_per_second)
+        self.refilled_at = now
+
+    def seconds_until(self, tokens: int) -> float:
+        return (tokens - self.tokens) / self.tokens_per_second
+
+
+class AdmissionController:
+    """Admits answers in the order they arrive, except that an answer whose user is at their limit of running answers
+    or out of tokens lets other users' answers by.
+    """
+
+    def __init__(
+        self,
+        max_running: int,
+        max_running_per_user: int,
+        max_queued: int,
+        tokens_per_minute: int,
+        tokens_per_minute_per_user: int,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.max_running = max_running
+        self.max_running_per_user = max_running_per_user
+        self.max_queued = max_queued
+        self.tokens_per_minute_per_user = tokens_per_minute_per_user
+        self.timer = timer
+        self.queue: list[Admission] = []
+        self.running: Counter[Hashable] = Counter()
+        self.bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60, tokens_per_minute, timer())
+        self.user_buckets: dict[Hashable, TokenBucket] = {}
+        self._wake: asyncio.TimerHandle | None = None
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        user_id: Hashable,
+        estimated_tokens: int,
+        on_queued: Callable[[int], Awaitable[None]] | None = None,
+    ) -> AsyncIterator[Admission]:
+        """Waits for the answer's turn, then holds its place among those running until the block exits.
+
+        While queued, on_queued is told the answer's position from 1 whenever it changes, and 0 once it's admitted.
+        Raises BusyError if max_queued answers are already waiting.
+        """
+        if len(self.queue) >= self.max_queued:
+            raise BusyError
+        admission = Admission(user_id, min(estimated_tokens, self.bucket.capacity, self.tokens_per_minute_per_user))
+        self.queue.append(admission)
+        self._admit_waiting()
+        try:
+            await self._wait(admission, on_queued)
+        except BaseException:
+            if admission in self.queue:
+                self.queue.remove(admission)
+                self._admit_waiting()
+            else:
+                self._finish(admission)
+            raise
+
+        try:
+            yield admission
+        finally:
+            self._finish(admission)
+
+    def charge(self, admission: Admission, tokens: int) -> None:
+        """Takes any tokens the answer is now known to need beyond those already taken for it, from its user's bucket
+        and the worker's.
+        """
+        if tokens > admission.tokens:
+            now = self.timer()
+            for bucket in (self.bucket, self._user_bucket(admission.user_id, now)):
+                bucket.refill(now)
+                bucket.tokens -= tokens - admission.tokens
+            admission.tokens = tokens
+
+    @property
+    def running_total(self) -> int:
+        return self.running.total()
+
+    async def _wait(self, admission: Admission, on_queued: Callable[[int], Awaitable[None]] | None) -> None:
+        position = 0
+        while admission in self.queue:
+            admission.changed.clear()
+            if on_queued and (new_position := self.queue.index(admission) + 1) != position:
+                position = new_position
+                await on_queued(position)
+            await admission.changed.wait()
+        if on_queued and position:
+            await on_queued(0)
+
+    def _admit_waiting(self) -> None:
+        now = self.timer()
+        self.bucket.refill(now)
+        out_of_tokens: set[Hashable] = set()
+        refills: list[float] = []
+        for admission in list(self.queue):
+            if self.running_total >= self.max_running:
+                break
+            if admission.user_id in out_of_tokens or self.running[admission.user_id] >= self.max_running_per_user:
+                continue
+            user_bucket = self._user_bucket(admission.user_id, now)
+            if user_bucket.tokens < admission.tokens:
+                # The user's later answers wait behind this one, but other users' answers go ahead
+                out_of_tokens.add(admission.user_id)
+                refills.append(user_bucket.seconds_until(admission.tokens))
+                continue
+            if self.bucket.tokens < admission.tokens:
+                # Nobody overtakes an answer waiting for the worker's tokens, or it might never get enough
+                refills.append(self.bucket.seconds_until(admission.tokens))
+                break
+            self.queue.remove(admission)
+            self.running[admission.user_id] += 1
+            user_bucket.tokens -= admission.tokens
+            self.bucket.tokens -= admission.tokens
+            admission.changed.set()
+        self._forget_idle_users(now)
+        self._wake_after(min(refills, default=None))
+        for admission in self.queue:
+            admission.changed.set()
+
+    def _finish(self, admission: Admission) -> None:
+        self.running[admission.user_id] -= 1
+        if self.running[admission.user_id] <= 0:
+            del self.running[admission.user_id]
+        self._admit_waiting()
+
+    def _user_bucket(self, user_id: Hashable, now: float) -> TokenBucket:
+        if (bucket := self.user_buckets.get(user_id)) is None:
+            capacity = self.tokens_per_minute_per_user
+            bucket = self.user_buckets[user_id] = TokenBucket(capacity, capacity / 60, capacity, now)
+        bucket.refill(now)
+        return bucket
+
+    def _forget_idle_users(self, now: float) -> None:
+        """Drops the buckets of users with no answers running or queued once they've refilled."""
+        queued = {admission.user_id for admission in self.queue}
+        for user_id, bucket in list(self.user_buckets.items()):
+            if user_id not in self.running and user_id not in queued:
+                bucket.refill(now)
+                if bucket.tokens >= bucket.capacity:
+                    del self.user_buckets[user_id]
+
+    def _wake_after(self, delay: float | None) -> None:
+        if self._wake is not None:
+            self._wake.cancel()
+            self._wake = None
+        if delay is not None:
+            self._wake = asyncio.get_running_loop().call_later(delay, self._on_refilled)
+
+    def _on_refilled(self) -> None:
+        self._wake = None
+        self._admit_waiting()
+
+
+admission_controller = AdmissionController(
+    max_running=settings.CHAT_MAX_RUNNING,
+    max_running_per_user=settings.CHAT_MAX_RUNNING_PER_USER,
+    max_queued=settings.CHAT_MAX_QUEUED,
+    tokens_per_minute=settings.CHAT_TOKENS_PER_MINUTE,
+    tokens_per_minute_per_user=settings.CHAT_TOKENS_PER_MINUTE_PER_USER,
+)
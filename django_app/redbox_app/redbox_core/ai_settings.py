@@ -0,0 +1,109 @@
+"""
+Resolving AISettings rows into the AISettings redbox runs with, cached in each process and in the shared Django cache.
+
+Rows are cached by label until they or any ChatLLMBackend are saved or deleted. Resolved AISettings are cached by the
+label, the row's modified_at and the contents of its backends, so a saved row or backend is never resolved from a stale
+entry.
+
+Saving only clears the caches of the process that saved, so other processes keep their own entries for up to
+AI_SETTINGS_CACHE_SECONDS. The Django cache is only used when it's shared between processes. A per-process cache,
+such as the local-memory default, would keep other processes' entries stale for AI_SETTINGS_SHARED_CACHE_SECONDS.
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.forms.models import model_to_dict
+
+from redbox.cache import TTLCache
+from redbox.models.chain import AISettings
+from redbox_app.redbox_core.models import AISettings as AISettingsModel
+from redbox_app.redbox_core.models import ChatLLMBackend
+
+_local_cache = TTLCache(max_size=1_000, ttl_seconds=settings.AI_SETTINGS_CACHE_SECONDS)
+
+
+def _model_key(label: str) -> str:
+    return f"redbox:ai-settings-model:{label}"
+
+
+def _backend_hash(backend: ChatLLMBackend | None) -> str:
+    backend_dict = model_to_dict(backend) if backend else None
+    return hashlib.sha256(json.dumps(backend_dict, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _resolved_key(ai_settings: AISettingsModel, chat_backend: ChatLLMBackend) -> str:
+    return ":".join(
+        (
+            "redbox:ai-settings",
+            ai_settings.label,
+            ai_settings.modified_at.isoformat(),
+            _backend_hash(chat_backend),
+            _backend_hash(ai_settings.condense_backend),
+        )
+    )
+
+
+def _shared_cache_enabled() -> bool:
+    return not isinstance(caches["default"], LocMemCache)
+
+
+def _get_cached(key: str, load):
+    if (value := _local_cache.get(key)) is None:
+        if not _shared_cache_enabled():
+            value = load()
+        elif (value := cache.get(key)) is None:
+            value = load()
+            cache.set(key, value, settings.AI_SETTINGS_SHARED_CACHE_SECONDS)
+        _local_cache.set(key, value)
+    return value
+
+
+def get_ai_settings_model(label: str) -> AISettingsModel:
+    """The AISettings row with this label, with its backends."""
+    return _get_cached(
+        _model_key(label),
+        lambda: AISettingsModel.objects.select_related("chat_backend", "condense_backend").get(label=label),
+    )
+
+
+def build_ai_settings(ai_settings: AISettingsModel, chat_backend: ChatLLMBackend) -> AISettings:
+    settings_dict = model_to_dict(ai_settings, exclude=["label", "chat_backend", "condense_backend"])
+    settings_dict["chat_backend"] = model_to_dict(chat_backend)
+    if condense_backend := ai_settings.condense_backend:
+        settings_dict["condense_backend"] = model_to_dict(condense_backend)
+
+    # we remove null values so that AISettings can populate them with defaults
+    settings_dict = {k: v for k, v in settings_dict.items() if v is not None}
+    return AISettings.model_validate(settings_dict)
+
+
+def resolve_ai_settings(ai_settings: AISettingsModel, chat_backend: ChatLLMBackend) -> AISettings:
+    """The AISettings to chat with, shared between requests, so must not be changed."""
+    return _get_cached(
+        _resolved_key(ai_settings, chat_backend),
+        lambda: build_ai_settings(ai_settings, chat_backend),
+    )
+
+
+def forget_ai_settings_model(label: str) -> None:
+    _local_cache.pop(_model_key(label))
+    if _shared_cache_enabled():
+        cache.delete(_model_key(label))
+
+
+@receiver([post_save, post_delete], sender=AISettingsModel)
+def _forget_saved_ai_settings(instance: AISettingsModel, **_kwargs) -> None:
+    forget_ai_settings_model(instance.label)
+
+
+@receiver([post_save, post_delete], sender=ChatLLMBackend)
+def _forget_ai_settings_for_saved_backend(**_kwargs) -> None:
+    # Any row may have this backend, and the resolved cache keys move on with the backend's contents
+    for label in AISettingsModel.objects.values_list("label", flat=True):
+        forget_ai_settings_model(label)
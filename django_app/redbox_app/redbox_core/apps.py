@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RedboxCoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "redbox_app.redbox_core"
+
+    def ready(self):
+        # Registers the signal handlers that clear cached AISettings
+        from redbox_app.redbox_core import ai_settings  # noqa: F401
@@ -1,26 +1,30 @@
+import asyncio
 import json
 import logging
 from asyncio import CancelledError
 from collections import defaultdict
-from collections.abc import Mapping, Sequence
-from typing import Any, ClassVar
+from collections.abc import Awaitable, Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any
 from uuid import UUID
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import BaseChannelLayer, get_channel_layer
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.forms.models import model_to_dict
+from django.db import transaction
 from django.utils import timezone
 from langchain_core.documents import Document
 from openai import RateLimitError
 from websockets import ConnectionClosedError, WebSocketClientProtocol
-from asgiref.sync import sync_to_async
 
 from redbox import Redbox
+from redbox.chains.components import get_tokeniser
 from redbox.models.chain import (
     AISettings,
     ChainChatMessage,
+    LLMCallMetadata,
     RedboxQuery,
     RedboxState,
     RequestMetadata,
@@ -31,6 +35,8 @@ from redbox.models.chain import Citation as AICitation
 from redbox.models.graph import RedboxActivityEvent
 from redbox.models.settings import get_settings
 from redbox_app.redbox_core import error_messages
+from redbox_app.redbox_core.admission import Admission, BusyError, admission_controller
+from redbox_app.redbox_core.ai_settings import get_ai_settings_model, resolve_ai_settings
 from redbox_app.redbox_core.models import (
     ActivityEvent,
     Chat,
@@ -40,7 +46,7 @@ from redbox_app.redbox_core.models import (
     Citation,
     File,
 )
-from redbox_app.redbox_core.models import AISettings as AISettingsModel
+from redbox_app.redbox_core.tracing import RequestTrace
 
 User = get_user_model()
 OptFileSeq = Sequence[File] | None
@@ -78,163 +84,224 @@ def escape_curly_brackets(text: str):
     return text.replace("{", "{{").replace("}", "}}")
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
-    full_reply: ClassVar = []
-    citations: ClassVar[list[tuple[File, AICitation]]] = []
-    activities: ClassVar[list[RedboxActivityEvent]] = []
-    route = None
-    metadata: RequestMetadata = RequestMetadata()
-    redbox = Redbox(env=get_settings(), debug=True)
+@dataclass
+class Conversation:
+    """What bootstrap_conversation loads for a chat turn."""
 
-    async def receive(self, text_data=None, bytes_data=None):
-        """Receive & respond to message from browser websocket."""
-        try:
-            # Reset state variables
-            self.full_reply = []
-            self.citations = []
-            self.external_citations = []
-            self.route = None
-            self.activities = []
+    session: Chat
+    permitted_files: list[File]
+    selected_files: list[File]
+    message_history: list[ChatMessage]
+    ai_settings: AISettings
 
-            data = json.loads(text_data or bytes_data)
-            logger.debug("received %s from browser", data)
 
-            user_message_text: str = data.get("message", "")
-            selected_file_uuids: Sequence[UUID] = [UUID(u) for u in data.get("selectedFiles", [])]
-            activities: Sequence[str] = data.get("activities", [])
-            user: User = self.scope.get("user")
+class TextStreamCoalescer:
+    """Collects streamed text and sends it in one frame per window_seconds, or sooner once max_chars are waiting.
 
-            user_ai_settings = await AISettingsModel.objects.aget(label=user.ai_settings_id)
+    With a window of 0 every piece of text is sent as it arrives.
+    """
 
-            chat_backend = await ChatLLMBackend.objects.aget(id=data.get("llm", user_ai_settings.chat_backend_id))
-            temperature = data.get("temperature", user_ai_settings.temperature)
+    def __init__(self, send: Callable[[str], Awaitable[None]], window_seconds: float, max_chars: int):
+        self.window_seconds = window_seconds
+        self.max_chars = max_chars
+        self._send = send
+        self._buffer: list[str] = []
+        self._buffered_chars = 0
+        self._flush_task: asyncio.Task | None = None
 
-            if session_id := data.get("sessionId"):
-                session = await Chat.objects.aget(id=session_id)
-                session.chat_backend = chat_backend
-                session.temperature = temperature
-                logger.info("updating session: chat_backend=%s temperature=%s", chat_backend, temperature)
-                await session.asave()
-            else:
-                logger.info("creating session: chat_backend=%s temperature=%s", chat_backend, temperature)
-                session = await Chat.objects.acreate(
-                    name=user_message_text[: settings.CHAT_TITLE_LENGTH],
-                    user=user,
-                    chat_backend=chat_backend,
-                    temperature=temperature,
-                )
+    async def add(self, text: str) -> None:
+        self._buffer.append(text)
+        self._buffered_chars += len(text)
+        if self.window_seconds <= 0 or self._buffered_chars >= self.max_chars:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_window())
 
-            # Save user message
-            permitted_files = File.objects.filter(user=user, status=File.Status.complete)
-            selected_files = permitted_files.filter(id__in=selected_file_uuids)
-            await self.save_user_message(session, user_message_text, selected_files=selected_files, activities=activities)
+    async def flush(self) -> None:
+        """Sends any waiting text now. Call before sending anything else so frames stay in order."""
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+        self._flush_task = None
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._buffered_chars = 0
+        await self._send(text)
 
-            # Process conversation
-            await self.llm_conversation(selected_files, session, user, user_message_text, permitted_files)
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window_seconds)
+        await self.flush()
 
-        except Exception as e:
-            logger.exception("Error in WebSocket message processing: %s", str(e))
-            self.full_reply = []
-            self.citations = []
-            self.route = None
-            await self.send_to_client("error", {"error": str(e)})
 
-        finally:
-            # Ensure WebSocket connection is closed in all cases
-            if not self.scope.get("_connection_closed", False):
-                logger.warning("Closing unclean connection.")
-                await self.close()
+# The envelope of a text frame, so streamed text is the only part serialised per frame
+TEXT_FRAME_PREFIX = json.dumps({"type": "text", "data": None})[: -len("null}")]
 
-    async def llm_conversation(
-        self, selected_files: Sequence[File], session: Chat, user: User, title: str, permitted_files: Sequence[File]
-    ) -> None:
-        """Initiate & close websocket conversation with the core-api message endpoint."""
-        logger.warning("Starting LLM conversation for session: %s", session.id)
-        await self.send_to_client("session-id", session.id)
 
-        session_messages = ChatMessage.objects.filter(chat=session).order_by("created_at")
-        message_history: Sequence[Mapping[str, str]] = [message async for message in session_messages]
+def reply_group(message_id: UUID) -> str:
+    """The group the frames of the reply to a user's message are published to."""
+    return f"chat-reply-{message_id}"
 
-        ai_settings = await self.get_ai_settings(session)
-        logger.warning("Retrieved AI settings: %s", json.dumps(ai_settings.model_dump(), indent=2))
 
-        permitted_files_list = await sync_to_async(list)(permitted_files)
-        logger.warning("Metadata retrieved for permitted files: %s", json.dumps([
-            {"file_name": file.file_name, "unique_name": file.unique_name}
-            for file in permitted_files_list
-        ], indent=2))
+def reply_control_group(message_id: UUID) -> str:
+    """The group the generation of the reply to a user's message listens to, to resend frames or stop."""
+    return f"chat-reply-{message_id}-control"
 
-        logger.warning("Processed chat history: %s", json.dumps([
-            {"role": message.role, "text": escape_curly_brackets(message.text)}
-            for message in message_history
-        ], indent=2))
 
-        state = RedboxState(
-            request=RedboxQuery(
-                question=message_history[-1].text,
-                s3_keys=[f.unique_name for f in selected_files],
-                user_uuid=user.id,
-                chat_history=[
-                    ChainChatMessage(
-                        role=message.role,
-                        text=escape_curly_brackets(message.text),
-                    )
-                    for message in message_history[:-1]
-                ],
-                ai_settings=ai_settings,
-                permitted_s3_keys=[f.unique_name async for f in permitted_files],
-            ),
+# The event loop only keeps weak references to tasks, so running generations are kept here
+_generation_tasks: set[asyncio.Task] = set()
+
+
+class ChatGeneration:
+    """Answers a user's message in the background, independently of the connection that sent it.
+
+    Each frame of the answer is published to the message's reply_group, numbered by its offset, ending with a None
+    frame that tells followers to close. Frames are kept so that a ChatConsumer that starts following part way through,
+    e.g. after the browser reconnects, can ask for the ones it missed through the reply_control_group.
+
+    The answer is stopped when a follower asks, or settings.CHAT_RESUME_SECONDS after its last follower leaves. Its
+    frames are kept for as long after it finishes. So closing the browser tab doesn't stop an answer straight away: it
+    carries on, using LLM tokens and a place in the admission queue, for up to CHAT_RESUME_SECONDS in case the browser
+    reconnects. The stop button stops it at once.
+    """
+
+    redbox = Redbox(env=get_settings(), debug=True)
+
+    def __init__(
+        self, conversation: Conversation, user: User, title: str, channel_layer: BaseChannelLayer | None = None
+    ):
+        self.conversation = conversation
+        self.user = user
+        self.title = title
+        self.channel_layer = channel_layer or get_channel_layer()
+        self.frames: list[str | None] = []
+        self.followers = 1
+        self.abandoned: asyncio.TimerHandle | None = None
+        self.task: asyncio.Task | None = None
+        self.admission: Admission | None = None
+
+        self.full_reply: list[str] = []
+        self.citations: list[tuple[File | None, AICitation]] = []
+        self.activities: list[RedboxActivityEvent] = []
+        self.route: str | None = None
+        self.metadata = RequestMetadata()
+        self.files_by_uri: dict[str, File | None] = {
+            file.original_file.name: file for file in conversation.permitted_files
+        }
+        self.text_stream = TextStreamCoalescer(
+            self.publish_text,
+            window_seconds=settings.CHAT_STREAM_COALESCE_MS / 1000,
+            max_chars=settings.CHAT_STREAM_COALESCE_MAX_CHARS,
         )
+        self.trace = RequestTrace("chat", chat_id=conversation.session.id, user_id=user.id)
+
+    @property
+    def message_id(self) -> UUID:
+        return self.conversation.message_history[-1].id
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.frames) and self.frames[-1] is None
+
+    async def start(self) -> asyncio.Task:
+        """Starts answering, once the reply_control_group is joined so that nothing followers send to it is missed."""
+        control_channel = await self.channel_layer.new_channel()
+        await self.channel_layer.group_add(reply_control_group(self.message_id), control_channel)
+        self.task = asyncio.create_task(self.run(control_channel))
+        _generation_tasks.add(self.task)
+        self.task.add_done_callback(_generation_tasks.discard)
+        return self.task
+
+    async def run(self, control_channel: str) -> None:
+        listening = asyncio.create_task(self.listen(control_channel))
+        try:
+            try:
+                await self.llm_conversation()
+            except Exception as e:
+                logger.exception("Error in WebSocket message processing")
+                await self.publish("error", {"error": str(e)})
+            finally:
+                await self.text_stream.flush()
+                await self.publish_frame(None)
+            # Kept for followers that reconnect just as the answer finishes, unless it was stopped
+            await asyncio.sleep(settings.CHAT_RESUME_SECONDS)
+        finally:
+            listening.cancel()
+            await self.channel_layer.group_discard(reply_control_group(self.message_id), control_channel)
+
+    async def listen(self, channel: str) -> None:
+        """Acts on what followers send to the reply_control_group."""
+        while True:
+            message = await self.channel_layer.receive(channel)
+            if message["type"] == "chat.resume":
+                self.followers += 1
+                if self.abandoned:
+                    self.abandoned.cancel()
+                    self.abandoned = None
+                offset = message["offset"]
+                await self.channel_layer.send(
+                    message["reply_channel"], {"type": "chat.frames", "offset": offset, "frames": self.frames[offset:]}
+                )
+            elif message["type"] == "chat.leave":
+                self.followers -= 1
+                if self.followers <= 0 and self.abandoned is None:
+                    self.abandoned = asyncio.get_running_loop().call_later(
+                        settings.CHAT_RESUME_SECONDS, self.task.cancel
+                    )
+            elif message["type"] == "chat.stop" and not self.finished:
+                self.task.cancel()
 
-        # Log the constructed RedboxQuery payload
-        logger.warning("Constructed RedboxQuery payload: %s", json.dumps({
-            "question": message_history[-1].text,
-            "s3_keys": [f.unique_name for f in selected_files],
-            "chat_history": [
-                {"role": message.role, "text": escape_curly_brackets(message.text)}
-                for message in message_history[:-1]
-            ],
-            "ai_settings": ai_settings.model_dump(),
-            "permitted_s3_keys": [f.unique_name for f in permitted_files_list],
-        }, indent=2))
-
-        logger.warning("Validation for the RedboxQuery Payload:")
-        if not message_history[-1].text:
-            logger.error("The 'question' field is empty in RedboxQuery!")
-            raise ValueError("The 'question' field must not be empty.")
+    async def llm_conversation(self) -> None:
+        """Initiate & close websocket conversation with the core-api message endpoint."""
+        session = self.conversation.session
+        ai_settings = self.conversation.ai_settings
+        title = self.title
 
-        for i, message in enumerate(message_history[:-1]):
-            if not message.text:
-                logger.error(f"Message {i} in 'chat_history' has empty content: {message}")
-                raise ValueError(f"Invalid message at index {i}: {message}")
+        logger.info("Starting LLM conversation for session: %s", session.id)
+        await self.publish("session-id", session.id)
 
-        if not selected_files and not message_history[-1].text:
-            logger.warning("No files selected and the query is empty. This may cause an issue.")
+        state = self.build_state()
+        # Until the graph reports the tokens of the selected files, only the conversation's are known
+        estimated_tokens = sum(message.token_count or 0 for message in self.conversation.message_history)
 
         try:
-            await self.redbox.run(
-                state,
-                response_tokens_callback=self.handle_text,
-                route_name_callback=self.handle_route,
-                documents_callback=self.handle_documents,
-                citations_callback=self.handle_citations,
-                metadata_tokens_callback=self.handle_metadata,
-                activity_event_callback=self.handle_activity,
-            )
-            logger.warning("Successfully received response from Bedrock.")
-            message = await self.save_ai_message(
-                session,
-                "".join(self.full_reply),
-            )
-            await self.send_to_client("end", {"message_id": message.id, "title": title, "session_id": session.id})
-            logger.warning("Finished LLM conversation for session: %s", session.id)
+            try:
+                async with admission_controller.admit(
+                    self.user.id, estimated_tokens, on_queued=self.publish_queue_position
+                ) as self.admission:
+                    await self.redbox.run(
+                        state,
+                        response_tokens_callback=self.handle_text,
+                        route_name_callback=self.handle_route,
+                        documents_callback=self.handle_documents,
+                        citations_callback=self.handle_citations,
+                        metadata_tokens_callback=self.handle_metadata,
+                        activity_event_callback=self.handle_activity,
+                    )
+            except CancelledError as e:
+                if not asyncio.current_task().cancelling():
+                    # Raised by core rather than by stopping this task, e.g. when its connection was dropped
+                    logger.exception("Error from core.", exc_info=e)
+                    await self.publish("error", error_messages.CORE_ERROR_MESSAGE)
+                    return
+                logger.info("Stopped LLM conversation for session: %s", session.id)
+                self.trace.add(stopped=True)
+                self.add_interrupted_token_use(ai_settings)
+                # Shielded so that what the answer got to is saved, and followers told, however the task was cancelled
+                await asyncio.shield(self.finish_stopped_reply(session, title))
+                raise
+            await self.finish_reply(session, title)
+            logger.info("Finished LLM conversation for session: %s", session.id)
 
         except RateLimitError as e:
             logger.exception("Rate limit error", exc_info=e)
-            await self.send_to_client("error", error_messages.RATE_LIMITED)
-        except (TimeoutError, ConnectionClosedError, CancelledError) as e:
+            await self.publish("error", error_messages.RATE_LIMITED)
+        except BusyError:
+            logger.warning("Too many answers queued to answer session: %s", session.id)
+            await self.publish("error", error_messages.BUSY)
+        except (TimeoutError, ConnectionClosedError) as e:
             logger.exception("Error from core.", exc_info=e)
-            await self.send_to_client("error", error_messages.CORE_ERROR_MESSAGE)
+            await self.publish("error", error_messages.CORE_ERROR_MESSAGE)
         except Exception as e:
             # Log the exception details with traceback
             logger.exception("General error encountered during Bedrock invocation.", exc_info=e)
@@ -268,49 +335,104 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     logger.error("Failed to log minimal state information. Error: %s", str(minimal_log_error))
 
             # Notify the client of the error
-            await self.send_to_client("error", error_messages.CORE_ERROR_MESSAGE)
+            await self.publish("error", error_messages.CORE_ERROR_MESSAGE)
 
             # Re-raise the original exception to propagate it
             raise
         finally:
-            await self.close()
-
-    async def send_to_client(self, message_type: str, data: str | Mapping[str, Any] | None = None) -> None:
-        message = {"type": message_type, "data": data}
-        logger.warning("Sending message to client: %s", json.dumps(message, default=str, indent=2))
-        await self.send(json.dumps(message, default=str))
+            self.trace.add(route=self.route, reply="".join(self.full_reply), activities=self.activities)
+            self.trace.emit()
 
-    @staticmethod
-    async def send_to_server(websocket: WebSocketClientProtocol, data: Mapping[str, Any]) -> None:
-        logger.debug("sending %s to core-api", data)
-        return await websocket.send(json.dumps(data, default=str))
+    def build_state(self) -> RedboxState:
+        """Builds the graph's request from the conversation, checking that neither the question nor history is empty."""
+        session = self.conversation.session
+        selected_files = self.conversation.selected_files
+        message_history = self.conversation.message_history
+        ai_settings = self.conversation.ai_settings
+        user = self.user
 
-    @database_sync_to_async
-    def save_user_message(
-        self,
-        session: Chat,
-        user_message_text: str,
-        selected_files: Sequence[File] | None = None,
-        activities: Sequence[str] | None = None,
-    ) -> ChatMessage:
-        chat_message = ChatMessage(
-            chat=session,
-            text=user_message_text,
-            role=ChatMessage.Role.user,
-            route=self.route,
+        state = RedboxState(
+            request=RedboxQuery(
+                question=message_history[-1].text,
+                s3_keys=[f.unique_name for f in selected_files],
+                user_uuid=user.id,
+                chat_history=[
+                    ChainChatMessage(
+                        role=message.role,
+                        text=escape_curly_brackets(message.text),
+                        token_count=message.token_count,
+                    )
+                    for message in message_history[:-1]
+                ],
+                ai_settings=ai_settings,
+                permitted_s3_keys=[f.unique_name for f in self.conversation.permitted_files],
+                chat_id=session.id,
+            ),
         )
-        chat_message.save()
-        if selected_files:
-            chat_message.selected_files.set(selected_files)
+        self.trace.add(request=state["request"])
 
-        # Save user activities
-        for message in activities:
-            activity = ActivityEvent.objects.create(chat_message=chat_message, message=message)
-            activity.save()
+        if not message_history[-1].text:
+            logger.error("The 'question' field is empty in RedboxQuery!")
+            raise ValueError("The 'question' field must not be empty.")
 
-        chat_message.log()
+        for i, message in enumerate(message_history[:-1]):
+            if not message.text:
+                logger.error(f"Message {i} in 'chat_history' has empty content: {message}")
+                raise ValueError(f"Invalid message at index {i}: {message}")
 
-        return chat_message
+        return state
+
+    async def finish_reply(self, session: Chat, title: str) -> None:
+        message = await self.save_ai_message(session, "".join(self.full_reply))
+        await self.publish("end", {"message_id": message.id, "title": title, "session_id": session.id})
+
+    async def finish_stopped_reply(self, session: Chat, title: str) -> None:
+        """Saves the reply so far, or if nothing was streamed, the tokens used, on the user's message."""
+        if self.full_reply:
+            await self.finish_reply(session, title)
+        elif self.metadata:
+            await self.save_token_use(self.conversation.message_history[-1])
+
+    def add_interrupted_token_use(self, ai_settings: AISettings) -> None:
+        """Adds the tokens streamed by an interrupted final response, whose LLM call never reported its use.
+
+        The output tokens are counted from the reply so far. The call's input tokens can't be known, so aren't added.
+        """
+        if self.full_reply:
+            output_tokens = len(get_tokeniser().encode("".join(self.full_reply)))
+            self.metadata = metadata_reducer(
+                self.metadata,
+                RequestMetadata(
+                    llm_calls=[
+                        LLMCallMetadata(
+                            llm_model_name=ai_settings.chat_backend.name,
+                            input_tokens=0,
+                            output_tokens=output_tokens,
+                        )
+                    ]
+                ),
+            )
+
+    async def publish(self, message_type: str, data: str | Mapping[str, Any] | None = None) -> None:
+        await self.text_stream.flush()
+        message = {"type": message_type, "data": data}
+        logger.debug("publishing %s", message)
+        await self.publish_frame(json.dumps(message, default=str))
+
+    async def publish_queue_position(self, position: int) -> None:
+        await self.publish("queue-position", position)
+
+    async def publish_text(self, text: str) -> None:
+        logger.debug("publishing %d characters of text", len(text))
+        await self.publish_frame(f"{TEXT_FRAME_PREFIX}{json.dumps(text)}}}")
+
+    async def publish_frame(self, frame: str | None) -> None:
+        """Keeps the frame and sends it to followers. Call publish rather than this so frames stay in order."""
+        offset = len(self.frames)
+        self.frames.append(frame)
+        await self.channel_layer.group_send(
+            reply_group(self.message_id), {"type": "chat.frames", "offset": offset, "frames": [frame]}
+        )
 
     @database_sync_to_async
     def save_ai_message(
@@ -318,20 +440,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
         session: Chat,
         user_message_text: str,
     ) -> ChatMessage:
-        chat_message = ChatMessage(
-            chat=session,
-            text=user_message_text,
-            role=ChatMessage.Role.ai,
-            route=self.route,
-        )
-        chat_message.save()
+        """Saves the reply with its citations, token use and activities in one transaction of bulk inserts."""
+        citations = []
+        referenced_file_ids = set()
         for file, ai_citation in self.citations:
             for citation_source in ai_citation.sources:
                 if file:
-                    file.last_referenced = timezone.now()
-                    file.save()
-                    Citation.objects.create(
-                        chat_message=chat_message,
+                    referenced_file_ids.add(file.id)
+                    citation = Citation(
                         text_in_answer=ai_citation.text_in_answer,
                         file=file,
                         text=citation_source.highlighted_text_in_source,
@@ -339,92 +455,113 @@ class ChatConsumer(AsyncWebsocketConsumer):
                         source=Citation.Origin.USER_UPLOADED_DOCUMENT,
                     )
                 else:
-                    Citation.objects.create(
-                        chat_message=chat_message,
+                    citation = Citation(
                         text_in_answer=ai_citation.text_in_answer,
                         url=citation_source.source,
                         text=citation_source.highlighted_text_in_source,
                         page_numbers=citation_source.page_numbers,
                         source=Citation.Origin(citation_source.source_type),
                     )
+                citation.validate_and_sanitise()
+                citations.append(citation)
+
+        token_uses = self.token_uses()
+        activities = [ActivityEvent(message=activity.message) for activity in self.activities or []]
+
+        with transaction.atomic():
+            chat_message = ChatMessage(
+                chat=session,
+                text=user_message_text,
+                role=ChatMessage.Role.ai,
+                route=self.route,
+            )
+            chat_message.footnoted_text = chat_message.add_footnotes(citations)
+            chat_message.save()
 
-        if self.metadata:
-            for model, token_count in self.metadata.input_tokens.items():
-                ChatMessageTokenUse.objects.create(
-                    chat_message=chat_message,
-                    use_type=ChatMessageTokenUse.UseType.INPUT,
-                    model_name=model,
-                    token_count=token_count,
-                )
-            for model, token_count in self.metadata.output_tokens.items():
-                ChatMessageTokenUse.objects.create(
-                    chat_message=chat_message,
-                    use_type=ChatMessageTokenUse.UseType.OUTPUT,
-                    model_name=model,
-                    token_count=token_count,
-                )
+            for row in (*citations, *token_uses, *activities):
+                row.chat_message = chat_message
+            Citation.objects.bulk_create(citations)
+            ChatMessageTokenUse.objects.bulk_create(token_uses)
+            ActivityEvent.objects.bulk_create(activities)
 
-        if self.activities:
-            for activity in self.activities:
-                ActivityEvent.objects.create(chat_message=chat_message, message=activity.message)
+            if referenced_file_ids:
+                now = timezone.now()
+                File.objects.filter(id__in=referenced_file_ids).update(last_referenced=now, modified_at=now)
 
         chat_message.log()
 
         return chat_message
 
-    @staticmethod
     @database_sync_to_async
-    def get_ai_settings(chat: Chat) -> AISettings:
-        ai_settings = model_to_dict(chat.user.ai_settings, exclude=["label", "chat_backend"])
-        ai_settings["chat_backend"] = model_to_dict(chat.chat_backend)
+    def save_token_use(self, user_message: ChatMessage) -> None:
+        """Saves the tokens used by an answer stopped before any reply, on the user's message as there's no reply."""
+        token_uses = self.token_uses()
+        for token_use in token_uses:
+            token_use.chat_message = user_message
+        ChatMessageTokenUse.objects.bulk_create(token_uses)
+
+    def token_uses(self) -> list[ChatMessageTokenUse]:
+        if not self.metadata:
+            return []
+        return [
+            ChatMessageTokenUse(use_type=use_type, model_name=model, token_count=token_count)
+            for use_type, token_counts in (
+                (ChatMessageTokenUse.UseType.INPUT, self.metadata.input_tokens),
+                (ChatMessageTokenUse.UseType.OUTPUT, self.metadata.output_tokens),
+            )
+            for model, token_count in token_counts.items()
+        ]
 
-        # we remove null values so that AISettings can populate them with defaults
-        ai_settings = {k: v for k, v in ai_settings.items() if v is not None}
-        return AISettings.model_validate(ai_settings)
+    async def resolve_files(self, uris: Iterable[str]) -> dict[str, File | None]:
+        """Maps each uri to the File it names, or None for external sources.
+
+        Files are remembered for the rest of the generation, starting with the permitted files, so only uris not
+        seen before are looked up, all in one query.
+        """
+        uris = set(uris)
+        if unseen := uris - self.files_by_uri.keys():
+            found = {file.original_file.name: file async for file in File.objects.filter(original_file__in=unseen)}
+            self.files_by_uri.update({uri: found.get(uri) for uri in unseen})
+        return {uri: self.files_by_uri[uri] for uri in uris}
 
     async def handle_text(self, response: str) -> str:
-        logger.warning("Text response received from Bedrock: %s", convert_to_dict(response))
-        await self.send_to_client("text", response)
+        await self.text_stream.add(response)
         self.full_reply.append(response)
 
     async def handle_route(self, response: str) -> str:
-        logger.warning("Route response received: %s", convert_to_dict(response))
-        await self.send_to_client("route", response)
+        logger.debug("route received: %s", response)
+        await self.publish("route", response)
         self.route = response
 
     async def handle_metadata(self, response: dict):
-        try:
-            # Convert the response to a JSON-serializable dictionary
-            logger.warning("Metadata received: %s", json.dumps(convert_to_dict(response), indent=2))
-        except Exception as serialization_error:
-            logger.error("Failed to serialize metadata response for logging. Error: %s", str(serialization_error))
+        logger.debug("metadata received: %s", response)
         self.metadata = metadata_reducer(self.metadata, RequestMetadata.model_validate(response))
+        if self.admission:
+            used_tokens = sum(self.metadata.input_tokens.values()) + sum(self.metadata.output_tokens.values())
+            admission_controller.charge(self.admission, max(self.metadata.selected_files_total_tokens, used_tokens))
 
     async def handle_activity(self, response: dict):
-        logger.warning("Activity received: %s", json.dumps(convert_to_dict(response), indent=2))
-        await self.send_to_client("activity", response.message)
+        logger.debug("activity received: %s", response)
+        await self.publish("activity", response.message)
         self.activities.append(RedboxActivityEvent.model_validate(response))
 
     async def handle_documents(self, response: list[Document]):
         """
         Map documents used to create answer to AICitations for storing as citations
         """
-        try:
-            logger.warning("Documents received from Bedrock: %s", json.dumps([
-                {"uri": doc.metadata.get("uri"), "content": convert_to_dict(doc.page_content)}
-                for doc in response
-            ], indent=2))
-        except Exception as e:
-            logger.error("Failed to serialize documents: %s", str(e))
-        
+        if self.trace.sampled:
+            self.trace.add(
+                documents=[{"uri": doc.metadata.get("uri"), "content": doc.page_content} for doc in response]
+            )
+
         sources_by_resource_ref: dict[str, Document] = defaultdict(list)
         for document in response:
             ref = document.metadata.get("uri")
             sources_by_resource_ref[ref].append(document)
 
+        files = await self.resolve_files(sources_by_resource_ref)
         for ref, sources in sources_by_resource_ref.items():
-            try:
-                file = await File.objects.aget(original_file=ref)
+            if file := files[ref]:
                 payload = {"url": str(file.url), "file_name": file.file_name}
                 response_sources = [
                     Source(
@@ -436,8 +573,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     )
                     for cited_chunk in sources
                 ]
-            except File.DoesNotExist:
-                file = None
+            else:
                 payload = {"url": ref, "file_name": None}
                 response_sources = [
                     Source(
@@ -450,7 +586,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     for cited_chunk in sources
                 ]
 
-            await self.send_to_client("source", payload)
+            await self.publish("source", payload)
             self.citations.append((file, AICitation(text_in_answer="", sources=response_sources)))
 
     async def handle_citations(self, citations: list[AICitation]):
@@ -458,25 +594,221 @@ class ChatConsumer(AsyncWebsocketConsumer):
         Map AICitations used to create answer to AICitations for storing as citations. The link to user files
         must be populated
         """
-        try:
-            logger.warning("Citations received: %s", json.dumps([
-                {"text_in_answer": c.text_in_answer, "sources": [convert_to_dict(s.source) for s in c.sources]}
-                for c in citations
-            ], indent=2))
-        except Exception as e:
-            logger.error("Failed to serialize citations: %s", str(e))
-        
+        self.trace.add(citations=citations)
+
+        files = await self.resolve_files({s.source for c in citations for s in c.sources})
         for c in citations:
             for s in c.sources:
-                try:
-                    file = await File.objects.aget(original_file=s.source)
+                if file := files[s.source]:
                     payload = {"url": str(file.url), "file_name": file.file_name, "text_in_answer": c.text_in_answer}
-                except File.DoesNotExist:
-                    file = None
+                else:
                     payload = {"url": s.source, "file_name": s.source, "text_in_answer": c.text_in_answer}
-                await self.send_to_client("source", payload)
+                await self.publish("source", payload)
                 self.citations.append((file, AICitation(text_in_answer=c.text_in_answer, sources=[s])))
 
+
+class ChatConsumer(AsyncWebsocketConsumer):
+    """Relays the frames of a ChatGeneration to the browser, starting the generation for a new message."""
+
+    message_id: UUID | None = None
+    next_offset = 0
+    finished = False
+    resuming: asyncio.Task | None = None
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """Receive message from browser websocket, and answer it, stop the answer or resume following it."""
+        try:
+            data = json.loads(text_data or bytes_data)
+            logger.debug("received %s from browser", data)
+
+            if data.get("type") == "stop":
+                await self.stop()
+            elif data.get("type") == "resume":
+                await self.resume(data["sessionId"], data.get("offset", 0))
+            elif self.message_id:
+                logger.warning("Ignoring message received while following an answer.")
+            else:
+                await self.converse(data)
+
+        except Exception as e:
+            logger.exception("Error in WebSocket message processing")
+            await self.send_to_client("error", {"error": str(e)})
+            await self.close()
+
+    async def converse(self, data: Mapping[str, Any]) -> None:
+        """Saves the user's message and starts answering it in the background."""
+        user_message_text: str = data.get("message", "")
+        selected_file_uuids: Sequence[UUID] = [UUID(u) for u in data.get("selectedFiles", [])]
+        activities: Sequence[str] = data.get("activities", [])
+        user: User = self.scope.get("user")
+
+        conversation = await self.bootstrap_conversation(
+            user,
+            user_message_text,
+            session_id=data.get("sessionId"),
+            chat_backend_id=data.get("llm"),
+            temperature=data.get("temperature"),
+            selected_file_uuids=selected_file_uuids,
+            activities=activities,
+        )
+
+        generation = ChatGeneration(conversation, user, user_message_text, self.channel_layer)
+        await self.follow(generation.message_id)
+        await generation.start()
+
+    async def follow(self, message_id: UUID, offset: int = 0) -> None:
+        self.message_id = message_id
+        self.next_offset = offset
+        self.waiting_frames: dict[int, str | None] = {}
+        await self.channel_layer.group_add(reply_group(message_id), self.channel_name)
+
+    async def resume(self, session_id: str, offset: int) -> None:
+        """Follows the answer to the user's latest message in the chat from offset, e.g. after reconnecting."""
+        message = await ChatMessage.objects.filter(
+            chat_id=session_id, chat__user=self.scope.get("user"), role=ChatMessage.Role.user
+        ).alatest("created_at")
+        await self.follow(message.id, offset)
+        self.resuming = asyncio.create_task(self.stop_resuming_after_timeout())
+        await self.channel_layer.group_send(
+            reply_control_group(message.id),
+            {"type": "chat.resume", "offset": offset, "reply_channel": self.channel_name},
+        )
+
+    async def stop_resuming_after_timeout(self) -> None:
+        """Gives up on an answer that isn't being generated any more, or has been forgotten."""
+        await asyncio.sleep(settings.CHAT_RESUME_TIMEOUT_SECONDS)
+        await self.send_to_client("error", error_messages.ANSWER_UNAVAILABLE)
+        await self.close()
+
+    async def stop(self) -> None:
+        """Asks the generation to stop. It saves the reply so far and sends "end" before followers close."""
+        if self.message_id and not self.finished:
+            await self.channel_layer.group_send(reply_control_group(self.message_id), {"type": "chat.stop"})
+
+    async def disconnect(self, code):  # noqa: ARG002
+        """Stops following the answer, which the generation stops CHAT_RESUME_SECONDS later unless it's resumed."""
+        if self.resuming:
+            self.resuming.cancel()
+        if self.message_id:
+            await self.channel_layer.group_discard(reply_group(self.message_id), self.channel_name)
+            if not self.finished:
+                await self.channel_layer.group_send(reply_control_group(self.message_id), {"type": "chat.leave"})
+
+    async def chat_frames(self, event: Mapping[str, Any]) -> None:
+        """Relays frames to the browser in order, once each, however they arrive."""
+        if self.resuming:
+            self.resuming.cancel()
+            self.resuming = None
+        for offset, frame in enumerate(event["frames"], start=event["offset"]):
+            if offset >= self.next_offset:
+                self.waiting_frames[offset] = frame
+        while self.next_offset in self.waiting_frames:
+            frame = self.waiting_frames.pop(self.next_offset)
+            self.next_offset += 1
+            if frame is None:
+                self.finished = True
+                await self.close()
+                return
+            await self.send(frame)
+
+    async def send_to_client(self, message_type: str, data: str | Mapping[str, Any] | None = None) -> None:
+        message = {"type": message_type, "data": data}
+        logger.debug("sending %s to client", message)
+        await self.send(json.dumps(message, default=str))
+
+    @staticmethod
+    async def send_to_server(websocket: WebSocketClientProtocol, data: Mapping[str, Any]) -> None:
+        logger.debug("sending %s to core-api", data)
+        return await websocket.send(json.dumps(data, default=str))
+
+    @database_sync_to_async
+    def bootstrap_conversation(
+        self,
+        user: User,
+        user_message_text: str,
+        session_id: str | None = None,
+        chat_backend_id: int | None = None,
+        temperature: float | None = None,
+        selected_file_uuids: Sequence[UUID] = (),
+        activities: Sequence[str] = (),
+    ) -> Conversation:
+        """Creates or updates the chat, saves the user's message and loads everything the graph needs.
+
+        It all happens in one trip to a database thread, in one transaction, with one query per table. The user's
+        AISettings are cached, see redbox_core.ai_settings.
+        """
+        user_ai_settings = get_ai_settings_model(user.ai_settings_id)
+
+        if chat_backend_id is None or chat_backend_id == user_ai_settings.chat_backend_id:
+            chat_backend = user_ai_settings.chat_backend
+        else:
+            chat_backend = ChatLLMBackend.objects.get(id=chat_backend_id)
+        if temperature is None:
+            temperature = user_ai_settings.temperature
+
+        with transaction.atomic():
+            if session_id:
+                session = Chat.objects.get(id=session_id)
+                session.chat_backend = chat_backend
+                session.temperature = temperature
+                logger.info("updating session: chat_backend=%s temperature=%s", chat_backend, temperature)
+                session.save(update_fields=["chat_backend", "temperature", "modified_at"])
+            else:
+                logger.info("creating session: chat_backend=%s temperature=%s", chat_backend, temperature)
+                session = Chat.objects.create(
+                    name=user_message_text[: settings.CHAT_TITLE_LENGTH],
+                    user=user,
+                    chat_backend=chat_backend,
+                    temperature=temperature,
+                )
+
+            permitted_files = list(File.objects.filter(user=user, status=File.Status.complete))
+            selected_file_uuids = set(selected_file_uuids)
+            selected_files = [file for file in permitted_files if file.id in selected_file_uuids]
+
+            self.save_user_message(session, user_message_text, selected_files=selected_files, activities=activities)
+
+            message_history = list(ChatMessage.objects.filter(chat=session).order_by("created_at"))
+
+        return Conversation(
+            session=session,
+            permitted_files=permitted_files,
+            selected_files=selected_files,
+            message_history=message_history,
+            ai_settings=resolve_ai_settings(user_ai_settings, chat_backend),
+        )
+
+    def save_user_message(
+        self,
+        session: Chat,
+        user_message_text: str,
+        selected_files: Sequence[File] | None = None,
+        activities: Sequence[str] | None = None,
+    ) -> ChatMessage:
+        """Saves the user's message. Runs in bootstrap_conversation's database thread and transaction."""
+        chat_message = ChatMessage(
+            chat=session,
+            text=user_message_text,
+            role=ChatMessage.Role.user,
+        )
+        chat_message.save()
+        if selected_files:
+            chat_message.selected_files.set(selected_files)
+
+        # Save user activities
+        ActivityEvent.objects.bulk_create(
+            ActivityEvent(chat_message=chat_message, message=message) for message in activities or []
+        )
+
+        transaction.on_commit(chat_message.log)
+
+        return chat_message
+
+    @staticmethod
+    @database_sync_to_async
+    def get_ai_settings(chat: Chat) -> AISettings:
+        return resolve_ai_settings(get_ai_settings_model(chat.user.ai_settings_id), chat.chat_backend)
+
     async def handle_activity_event(self, event: RedboxActivityEvent):
         try:
             logger.warning("Activity event received: %s", json.dumps({
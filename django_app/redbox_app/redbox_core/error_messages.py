@@ -10,3 +10,11 @@ RATE_LIMITED = (
     "Redbox has temporarily exceeded its usage allowance with the AI server. "
     'Please try again in a few minutes, and contact <a href="/support/">support</a> if the problem persists.'
 )
+BUSY = (
+    "Redbox is busy answering other questions. "
+    'Please try again in a few minutes, and contact <a href="/support/">support</a> if the problem persists.'
+)
+ANSWER_UNAVAILABLE = (
+    "Redbox can no longer continue this response. Please reload the page to see the response so far, "
+    'and contact <a href="/support/">support</a> if the problem persists.'
+)
@@ -1,6 +1,6 @@
 from django.core.management import BaseCommand
 
-from redbox.models.settings import get_settings
+from redbox.models.settings import LazyElasticsearchClient, get_settings
 
 import logging
 
@@ -9,7 +9,7 @@ logger = logging.getLogger(__name__)
 env = get_settings()
 
 logger.warning("inside add_es_alias.py")
-es_client = env.elasticsearch_client()
+es_client = LazyElasticsearchClient(env)
 
 
 class Command(BaseCommand):
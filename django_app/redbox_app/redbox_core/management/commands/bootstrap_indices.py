@@ -0,0 +1,18 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from redbox.models.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = """This should be run once per deploy to create the chunk index and alias if they don't exist.
+    It's safe to run again, so web and worker processes no longer check on startup.
+    """
+
+    def handle(self, *_args, **_kwargs):
+        env = get_settings()
+        self.stdout.write(self.style.NOTICE(f"Bootstrapping {env.elastic_root_index} indices"))
+        env.bootstrap_indices()
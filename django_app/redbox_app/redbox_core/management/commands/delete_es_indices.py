@@ -2,14 +2,14 @@ import logging
 
 from django.core.management import BaseCommand, CommandError
 
-from redbox.models.settings import get_settings
+from redbox.models.settings import LazyElasticsearchClient, get_settings
 
 logger = logging.getLogger(__name__)
 logger.warning("inside delete_es_indices.py")
 
 env = get_settings()
 
-es_client = env.elasticsearch_client()
+es_client = LazyElasticsearchClient(env)
 
 
 class Command(BaseCommand):
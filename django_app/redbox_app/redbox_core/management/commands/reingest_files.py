@@ -4,7 +4,7 @@ import time
 from django.core.management import BaseCommand
 from django_q.tasks import async_task
 
-from redbox.models.settings import get_settings
+from redbox.models.settings import LazyElasticsearchClient, get_settings
 from redbox_app.redbox_core.models import File
 from redbox_app.worker import ingest
 
@@ -12,7 +12,7 @@ logger = logging.getLogger(__name__)
 logger.warning("inside reingest_files.py")
 env = get_settings()
 
-es_client = env.elasticsearch_client()
+es_client = LazyElasticsearchClient(env)
 
 
 def switch_aliases(alias, new_index):
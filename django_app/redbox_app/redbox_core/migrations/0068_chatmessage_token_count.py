@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2024-11-14 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("redbox_core", "0067_alter_aisettings_agentic_give_up_question_prompt_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chatmessage",
+            name="token_count",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="number of tokens in text, used to budget chat history", null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2024-11-15 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("redbox_core", "0068_chatmessage_token_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="aisettings",
+            name="self_route_mode",
+            field=models.CharField(
+                blank=True,
+                choices=[("stream", "stream"), ("classify", "classify")],
+                help_text="stream answers while checking them, or classify the question before answering",
+                max_length=8,
+                null=True,
+            ),
+        ),
+    ]
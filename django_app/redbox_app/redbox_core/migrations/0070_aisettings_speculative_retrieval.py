@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2024-11-15 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("redbox_core", "0069_aisettings_self_route_mode"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="aisettings",
+            name="speculative_retrieval_enabled",
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="aisettings",
+            name="speculative_retrieval_threshold",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2024-11-18 11:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("redbox_core", "0070_aisettings_speculative_retrieval"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="aisettings",
+            name="condense_backend",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="smaller, faster LLM for condensing questions, uses the chat backend if not set",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="redbox_core.chatllmbackend",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2024-11-20 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("redbox_core", "0071_aisettings_condense_backend"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chatmessage",
+            name="footnoted_text",
+            field=models.TextField(
+                blank=True,
+                help_text="text with links to its citations' footnotes, saved with them for display",
+                null=True,
+            ),
+        ),
+    ]
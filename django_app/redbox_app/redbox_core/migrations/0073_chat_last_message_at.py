@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2024-11-21 09:30
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def back_populate_last_message_at(apps, schema_editor):
+    Chat = apps.get_model("redbox_core", "Chat")
+    ChatMessage = apps.get_model("redbox_core", "ChatMessage")
+    latest_message = ChatMessage.objects.filter(chat=OuterRef("pk")).order_by("-created_at").values("created_at")[:1]
+    Chat.objects.update(last_message_at=Subquery(latest_message))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("redbox_core", "0072_chatmessage_footnoted_text"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chat",
+            name="last_message_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="when the latest message was saved, set by ChatMessage.save to order chats by",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(back_populate_last_message_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="chat",
+            index=models.Index(fields=["user", "-last_message_at", "-id"], name="chat_user_last_message_idx"),
+        ),
+    ]
@@ -2,7 +2,7 @@ import logging
 import os
 import textwrap
 import uuid
-from collections.abc import Collection, Sequence
+from collections.abc import Collection, Iterable, Sequence
 from datetime import UTC, date, datetime, timedelta
 from typing import override
 
@@ -12,13 +12,14 @@ from django.contrib.auth.base_user import BaseUserManager as BaseSSOUserManager
 from django.contrib.postgres.fields import ArrayField
 from django.core import validators
 from django.db import models
-from django.db.models import Max, Min, Prefetch, UniqueConstraint
+from django.db.models import Min, Prefetch, Q, UniqueConstraint
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_use_email_as_username.models import BaseUser, BaseUserManager
 from yarl import URL
 
-from redbox.models.settings import get_settings, catch_403
+from redbox.chains.components import get_tokeniser
+from redbox.models.settings import LazyElasticsearchClient, catch_403, get_settings
 from redbox_app.redbox_core.utils import get_date_group
 
 logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
@@ -28,7 +29,7 @@ env = get_settings()
 
 logger.warning("inside models.py")
 
-es_client = env.elasticsearch_client()
+es_client = LazyElasticsearchClient(env)
 
 
 class UUIDPrimaryKeyBase(models.Model):
@@ -114,9 +115,27 @@ class AISettings(UUIDPrimaryKeyBase, TimeStampedModel, AbstractAISettings):
     context_window_size = models.PositiveIntegerField(null=True, blank=True)
     llm_max_tokens = models.PositiveIntegerField(null=True, blank=True)
 
+    condense_backend = models.ForeignKey(
+        ChatLLMBackend,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text="smaller, faster LLM for condensing questions, uses the chat backend if not set",
+    )
+
     # Prompts and LangGraph settings
     max_document_tokens = models.PositiveIntegerField(null=True, blank=True)
     self_route_enabled = models.BooleanField(null=True, blank=True)
+    self_route_mode = models.CharField(
+        max_length=8,
+        choices=[("stream", "stream"), ("classify", "classify")],
+        null=True,
+        blank=True,
+        help_text="stream answers while checking them, or classify the question before answering",
+    )
+    speculative_retrieval_enabled = models.BooleanField(null=True, blank=True)
+    speculative_retrieval_threshold = models.FloatField(null=True, blank=True)
     map_max_concurrency = models.PositiveIntegerField(null=True, blank=True)
     stuff_chunk_context_ratio = models.FloatField(null=True, blank=True)
     recursion_limit = models.PositiveIntegerField(null=True, blank=True)
@@ -705,6 +724,12 @@ class Chat(UUIDPrimaryKeyBase, TimeStampedModel, AbstractAISettings):
         null=True, blank=True, help_text="Did Redbox help to improve your work?"
     )
     feedback_notes = models.TextField(null=True, blank=True, help_text="Do you want to tell us anything further?")
+    last_message_at = models.DateTimeField(
+        null=True, blank=True, help_text="when the latest message was saved, set by ChatMessage.save to order chats by"
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "-last_message_at", "-id"], name="chat_user_last_message_idx")]
 
     def __str__(self) -> str:  # pragma: no cover
         return self.name or ""
@@ -723,20 +748,40 @@ class Chat(UUIDPrimaryKeyBase, TimeStampedModel, AbstractAISettings):
 
     @classmethod
     def get_ordered_by_last_message_date(
-        cls, user: User, exclude_chat_ids: Collection[uuid.UUID] | None = None
+        cls, user: User, exclude_chat_ids: Collection[uuid.UUID] | None = None, after: str | None = None
     ) -> Sequence["Chat"]:
-        """Returns all chat histories for a given user, ordered by the date of the latest message."""
+        """Returns all chat histories with messages for a given user, ordered by the date of the latest message.
+
+        To page through them, slice the result and pass the cursor of the last chat of one page as after to get the
+        chats that follow it. Pages are read from the (user, last_message_at, id) index, so a page takes as long to
+        read however far back it is. Raises ValueError if after isn't a cursor.
+        """
         exclude_chat_ids = exclude_chat_ids or []
-        return (
-            cls.objects.filter(user=user, archived=False)
+        chats = (
+            cls.objects.filter(user=user, archived=False, last_message_at__isnull=False)
             .exclude(id__in=exclude_chat_ids)
-            .annotate(latest_message_date=Max("chatmessage__created_at"))
-            .order_by("-latest_message_date")
+            .order_by("-last_message_at", "-id")
         )
+        if after:
+            last_message_at, chat_id = cls.parse_cursor(after)
+            chats = chats.filter(
+                Q(last_message_at__lt=last_message_at) | Q(last_message_at=last_message_at, id__lt=chat_id)
+            )
+        return chats
+
+    @property
+    def cursor(self) -> str:
+        """Where this chat comes in get_ordered_by_last_message_date, to get the chats after it."""
+        return f"{self.last_message_at.isoformat()}_{self.id}"
+
+    @staticmethod
+    def parse_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+        last_message_at, chat_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(last_message_at), uuid.UUID(chat_id)
 
     @property
     def newest_message_date(self) -> date:
-        return self.chatmessage_set.aggregate(newest_date=Max("created_at"))["newest_date"].date()
+        return self.last_message_at.date()
 
     @property
     def date_group(self):
@@ -782,6 +827,14 @@ class Citation(UUIDPrimaryKeyBase, TimeStampedModel):
         return textwrap.shorten(text, width=128, placeholder="...")
 
     def save(self, *args, force_insert=False, force_update=False, using=None, update_fields=None):
+        self.validate_and_sanitise()
+        super().save(*args, force_insert, force_update, using, update_fields)
+
+    def validate_and_sanitise(self) -> None:
+        """Checks the file or url is set to suit the source and sanitises the text.
+
+        save does this, so it only needs calling directly before bulk_create.
+        """
         if self.source == self.Origin.USER_UPLOADED_DOCUMENT:
             if self.file is None:
                 msg = "file must be specified for a user-uploaded-document"
@@ -802,8 +855,6 @@ class Citation(UUIDPrimaryKeyBase, TimeStampedModel):
 
         self.text = sanitise_string(self.text)
 
-        super().save(*args, force_insert, force_update, using, update_fields)
-
     @property
     def uri(self) -> URL:
         """returns the url of either the external citation or the user-uploaded document"""
@@ -830,15 +881,31 @@ class ChatMessage(UUIDPrimaryKeyBase, TimeStampedModel):
     )
     rating_text = models.TextField(blank=True, null=True)
     rating_chips = ArrayField(models.CharField(max_length=32), null=True, blank=True)
+    token_count = models.PositiveIntegerField(
+        null=True, blank=True, help_text="number of tokens in text, used to budget chat history"
+    )
+    footnoted_text = models.TextField(
+        null=True, blank=True, help_text="text with links to its citations' footnotes, saved with them for display"
+    )
 
     def __str__(self) -> str:  # pragma: no cover
         return textwrap.shorten(self.text, width=20, placeholder="...")
 
     def save(self, *args, force_insert=False, force_update=False, using=None, update_fields=None):
         self.text = sanitise_string(self.text)
+        self.footnoted_text = sanitise_string(self.footnoted_text)
         self.rating_text = sanitise_string(self.rating_text)
+        if self.token_count is None:
+            self.token_count = len(get_tokeniser().encode(self.text))
+            if update_fields is not None:
+                update_fields = {*update_fields, "token_count"}
 
+        adding = self._state.adding
         super().save(*args, force_insert, force_update, using, update_fields)
+        if adding:
+            Chat.objects.filter(
+                Q(last_message_at__isnull=True) | Q(last_message_at__lt=self.created_at), id=self.chat_id
+            ).update(last_message_at=self.created_at)
 
     @classmethod
     def get_messages_ordered_by_citation_priority(cls, chat_id: uuid.UUID) -> Sequence["ChatMessage"]:
@@ -852,7 +919,8 @@ class ChatMessage(UUIDPrimaryKeyBase, TimeStampedModel):
                     queryset=File.objects.all()
                     .annotate(min_created_at=Min("citation__created_at"))
                     .order_by("min_created_at"),
-                )
+                ),
+                Prefetch("citation_set", queryset=Citation.objects.select_related("file")),
             )
         )
 
@@ -877,17 +945,33 @@ class ChatMessage(UUIDPrimaryKeyBase, TimeStampedModel):
             body=elastic_log_msg,
         )
 
-    def unique_citation_uris(self) -> list[tuple[str, str]]:
-        """a unique set of names and hrefs for all citations"""
+    def unique_citation_uris(self, citations: Iterable[Citation] | None = None) -> list[tuple[str, str]]:
+        """a unique set of names and hrefs for all citations, or for the citations given"""
 
         def get_display(citation):
             if not citation.file:
                 return str(citation.uri)
             return citation.file.file_name
 
-        return sorted(
-            {(get_display(citation), citation.uri, citation.text_in_answer) for citation in self.citation_set.all()}
-        )
+        if citations is None:
+            citations = self.citation_set.all()
+        return sorted({(get_display(citation), citation.uri, citation.text_in_answer) for citation in citations})
+
+    def add_footnotes(self, citations: Iterable[Citation] | None = None) -> str:
+        """The text with a numbered link to each citation's footnote after the text it cites.
+
+        Saved as footnoted_text with the message, and otherwise worked out from its saved citations.
+        """
+        text = self.text
+        footnote_counter = 1
+        for _display, _href, text_in_answer in self.unique_citation_uris(citations):
+            if text_in_answer:
+                text = text.replace(
+                    text_in_answer,
+                    f'{text_in_answer}<a class="rb-footnote-link" href="#footnote-{self.id}-{footnote_counter}">{footnote_counter}</a>',  # noqa: E501
+                )
+                footnote_counter = footnote_counter + 1
+        return text
 
 
 class ChatMessageTokenUse(UUIDPrimaryKeyBase, TimeStampedModel):
@@ -0,0 +1,70 @@
+import json
+import logging
+import random
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Traces are serialised and logged one at a time on this thread, so requests never wait on them
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="redbox-trace")
+
+
+def truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} more characters]"
+
+
+def cap(value: Any, max_chars: int, max_items: int = 50) -> Any:
+    """Converts value to something JSON serialisable, with strings cut to max_chars and lists to max_items."""
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    if isinstance(value, str):
+        return truncate(value, max_chars)
+    if isinstance(value, Mapping):
+        return {str(key): cap(item, max_chars, max_items) for key, item in value.items()}
+    if isinstance(value, list | tuple | set):
+        items = [cap(item, max_chars, max_items) for item in list(value)[:max_items]]
+        if len(value) > max_items:
+            items.append(f"... [{len(value) - max_items} more items]")
+        return items
+    if value is None or isinstance(value, bool | int | float):
+        return value
+    return truncate(str(value), max_chars)
+
+
+class RequestTrace:
+    """Collects what happened during one chat request and logs it as a single JSON record at INFO.
+
+    Only settings.CHAT_TRACE_SAMPLE_RATE of requests are traced, and then only when this module's logger is enabled
+    for INFO. Fields of untraced requests are dropped as they're added. Each field is serialised when the trace is
+    emitted, on a background thread, with strings cut to settings.CHAT_TRACE_MAX_FIELD_CHARS.
+    """
+
+    def __init__(self, name: str, sample_rate: float | None = None, max_field_chars: int | None = None, **fields):
+        if sample_rate is None:
+            sample_rate = settings.CHAT_TRACE_SAMPLE_RATE
+        self.name = name
+        self.max_field_chars = settings.CHAT_TRACE_MAX_FIELD_CHARS if max_field_chars is None else max_field_chars
+        self.sampled = logger.isEnabledFor(logging.INFO) and random.random() < sample_rate  # noqa: S311
+        self.fields: dict[str, Any] = {}
+        self.add(**fields)
+
+    def add(self, **fields: Any) -> None:
+        if self.sampled:
+            self.fields.update(fields)
+
+    def emit(self) -> None:
+        """Logs the trace in the background. Later changes to the fields' values may or may not be included."""
+        if self.sampled:
+            _executor.submit(self._log, dict(self.fields))
+
+    def _log(self, fields: dict[str, Any]) -> None:
+        try:
+            logger.info(json.dumps({"trace": self.name, **cap(fields, self.max_field_chars)}))
+        except Exception:
+            logger.exception("Failed to log %s trace", self.name)
@@ -24,7 +24,18 @@ logger = logging.getLogger(__name__)
 class ChatsView(View):
     @method_decorator(login_required)
     def get(self, request: HttpRequest, chat_id: uuid.UUID | None = None) -> HttpResponse:
-        chat = Chat.get_ordered_by_last_message_date(request.user)
+        try:
+            chats = list(
+                Chat.get_ordered_by_last_message_date(request.user, after=request.GET.get("after"))[
+                    : settings.CHAT_HISTORY_PAGE_SIZE + 1
+                ]
+            )
+        except ValueError:
+            return redirect(request.path)
+        older_chats_url = None
+        if len(chats) > settings.CHAT_HISTORY_PAGE_SIZE:
+            chats = chats[: settings.CHAT_HISTORY_PAGE_SIZE]
+            older_chats_url = URL(request.path).with_query(after=chats[-1].cursor)
 
         messages: Sequence[ChatMessage] = []
         current_chat = None
@@ -44,25 +55,20 @@ class ChatsView(View):
         completed_files, processing_files = File.get_completed_and_processing_files(request.user)
 
         self.decorate_selected_files(completed_files, messages)
-        chat_grouped_by_date_group = groupby(chat, attrgetter("date_group"))
+        chat_grouped_by_date_group = groupby(chats, attrgetter("date_group"))
 
         chat_backend = current_chat.chat_backend if current_chat else ChatLLMBackend.objects.get(is_default=True)
 
-        # Add footnotes to messages
+        # Add footnotes to messages saved without them
         for message in messages:
-            footnote_counter = 1
-            for display, href, text_in_answer in message.unique_citation_uris():  # noqa: B007
-                if text_in_answer:
-                    message.text = message.text.replace(
-                        text_in_answer,
-                        f'{text_in_answer}<a class="rb-footnote-link" href="#footnote-{message.id}-{footnote_counter}">{footnote_counter}</a>',  # noqa: E501
-                    )
-                    footnote_counter = footnote_counter + 1
+            message.text = message.add_footnotes() if message.footnoted_text is None else message.footnoted_text
 
         context = {
             "chat_id": chat_id,
             "messages": messages,
             "chat_grouped_by_date_group": chat_grouped_by_date_group,
+            "older_chats_url": older_chats_url,
+            "newer_chats_url": request.path if "after" in request.GET else None,
             "current_chat": current_chat,
             "streaming": {"endpoint": str(endpoint)},
             "contact_email": settings.CONTACT_EMAIL,
@@ -123,6 +123,19 @@ TEMPLATES = [
 WSGI_APPLICATION = "redbox_app.wsgi.application"
 ASGI_APPLICATION = "redbox_app.asgi.application"
 
+# Chat answers are published to channel layer groups that websocket connections follow. Deployments with more than one
+# worker set CHANNEL_LAYER_REDIS_URL, so a browser can resume following an answer, or stop it, through any worker. The
+# in-memory layer used locally only reaches connections to the worker that started the answer.
+if CHANNEL_LAYER_REDIS_URL := env.str("CHANNEL_LAYER_REDIS_URL", None):
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [CHANNEL_LAYER_REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer", "CONFIG": {"capacity": 1000}}}
+
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
     "redbox_app.oidc_auth.CustomOIDCAuthenticationBackend"
@@ -421,6 +434,36 @@ MAGIC_LINK = {
 IMPORT_FORMATS = [CSV]
 
 CHAT_TITLE_LENGTH = 30
+# Chats listed on each page of a user's chat history
+CHAT_HISTORY_PAGE_SIZE = env.int("CHAT_HISTORY_PAGE_SIZE", 50)
+# Streamed response text is sent in frames collected over this many milliseconds, or once this many characters are
+# waiting. A window of 0 sends every token in its own frame.
+CHAT_STREAM_COALESCE_MS = env.int("CHAT_STREAM_COALESCE_MS", 30)
+CHAT_STREAM_COALESCE_MAX_CHARS = env.int("CHAT_STREAM_COALESCE_MAX_CHARS", 512)
+# Share of chat requests whose details are logged at INFO by redbox_core.tracing, with each field cut to a length
+CHAT_TRACE_SAMPLE_RATE = env.float("CHAT_TRACE_SAMPLE_RATE", 0.0)
+CHAT_TRACE_MAX_FIELD_CHARS = env.int("CHAT_TRACE_MAX_FIELD_CHARS", 2000)
+# An answer nobody is following is stopped after this many seconds, and a finished answer's frames are kept as long,
+# so a browser that reconnects can resume it. Until then an abandoned answer keeps using LLM tokens and its place in
+# the admission queue, so this trades wasted work for resumable answers, and 0 stops answers as soon as their browser
+# disconnects. A reconnecting browser waits CHAT_RESUME_TIMEOUT_SECONDS to hear an answer is still there.
+CHAT_RESUME_SECONDS = env.int("CHAT_RESUME_SECONDS", 30)
+CHAT_RESUME_TIMEOUT_SECONDS = env.int("CHAT_RESUME_TIMEOUT_SECONDS", 5)
+# Each worker runs at most CHAT_MAX_RUNNING answers at once, and CHAT_MAX_RUNNING_PER_USER for any one user, queueing
+# up to CHAT_MAX_QUEUED more before turning answers away as busy. Answers also wait for their estimated tokens from
+# their user's bucket, refilled at CHAT_TOKENS_PER_MINUTE_PER_USER, and from the worker's, refilled at
+# CHAT_TOKENS_PER_MINUTE. See redbox_core.admission.
+CHAT_MAX_RUNNING = env.int("CHAT_MAX_RUNNING", 16)
+CHAT_MAX_RUNNING_PER_USER = env.int("CHAT_MAX_RUNNING_PER_USER", 2)
+CHAT_MAX_QUEUED = env.int("CHAT_MAX_QUEUED", 64)
+CHAT_TOKENS_PER_MINUTE = env.int("CHAT_TOKENS_PER_MINUTE", 2_000_000)
+CHAT_TOKENS_PER_MINUTE_PER_USER = env.int("CHAT_TOKENS_PER_MINUTE_PER_USER", 500_000)
+# How long AISettings are kept in each worker, and in the Django cache if it's shared between workers, before being
+# read again. Saving AISettings or a ChatLLMBackend clears the Django cache and the saving worker's, so other workers
+# see changes within AI_SETTINGS_CACHE_SECONDS. No CACHES are configured, so the Django cache is the per-worker
+# local-memory default, which redbox_core.ai_settings doesn't use.
+AI_SETTINGS_CACHE_SECONDS = env.int("AI_SETTINGS_CACHE_SECONDS", 60)
+AI_SETTINGS_SHARED_CACHE_SECONDS = env.int("AI_SETTINGS_SHARED_CACHE_SECONDS", 60 * 60)
 FILE_EXPIRY_IN_SECONDS = env.int("FILE_EXPIRY_IN_DAYS") * 24 * 60 * 60
 SUPERUSER_EMAIL = env.str("SUPERUSER_EMAIL", None)
 MAX_SECURITY_CLASSIFICATION = Classification[env.str("MAX_SECURITY_CLASSIFICATION")]
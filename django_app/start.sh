@@ -1,6 +1,7 @@
 #!/bin/sh
 
 venv/bin/django-admin migrate
+venv/bin/django-admin bootstrap_indices
 venv/bin/django-admin collectstatic --noinput
 venv/bin/django-admin create_admin_user
 
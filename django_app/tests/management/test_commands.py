@@ -261,6 +261,17 @@ def test_delete_es_indices_no_new_index():
     assert str(exception.value) == "No new index given for alias"
 
 
+def test_bootstrap_indices(mocker: MockerFixture):
+    # Given
+    bootstrap_indices = mocker.patch("redbox.models.settings.Settings.bootstrap_indices")
+
+    # When
+    call_command("bootstrap_indices", stdout=StringIO())
+
+    # Then
+    bootstrap_indices.assert_called_once_with()
+
+
 @pytest.mark.django_db(transaction=True)
 def test_update_users(alice: User):
     original_file_path = os.path.join(  # noqa: PTH118
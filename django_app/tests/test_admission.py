@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from redbox_app.redbox_core.admission import AdmissionController, BusyError
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def hold(controller: AdmissionController, user_id: str, release: asyncio.Event, positions: list[int], tokens=0):
+    async def on_queued(position: int):
+        positions.append(position)
+
+    async with controller.admit(user_id, tokens, on_queued=on_queued):
+        await release.wait()
+
+
+@pytest.mark.asyncio()
+async def test_admission_lets_other_users_by_a_user_at_their_limit():
+    # Given
+    controller = AdmissionController(
+        max_running=3, max_running_per_user=1, max_queued=10, tokens_per_minute=1000, tokens_per_minute_per_user=1000
+    )
+    release = asyncio.Event()
+    positions = {name: [] for name in ("alice-1", "alice-2", "bob")}
+
+    # When
+    tasks = [asyncio.create_task(hold(controller, name.split("-")[0], release, positions[name])) for name in positions]
+    await asyncio.sleep(0)
+
+    # Then
+    assert controller.running == {"alice": 1, "bob": 1}
+    assert positions == {"alice-1": [], "alice-2": [1], "bob": []}
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert positions["alice-2"] == [1, 0]
+    assert not controller.running
+
+
+@pytest.mark.asyncio()
+async def test_admission_queues_until_full_then_is_busy():
+    # Given
+    controller = AdmissionController(
+        max_running=1, max_running_per_user=1, max_queued=1, tokens_per_minute=1000, tokens_per_minute_per_user=1000
+    )
+    release = asyncio.Event()
+    first_positions, second_positions = [], []
+    first = asyncio.create_task(hold(controller, "alice", release, first_positions))
+    second = asyncio.create_task(hold(controller, "bob", release, second_positions))
+    await asyncio.sleep(0)
+
+    # When
+    with pytest.raises(BusyError):
+        async with controller.admit("carol", 0):
+            pass
+
+    second.cancel()
+    await asyncio.gather(second, return_exceptions=True)
+    release.set()
+    await first
+
+    # Then
+    assert second_positions == [1]
+    assert not controller.queue
+    assert not controller.running
+
+
+@pytest.mark.asyncio()
+async def test_admission_waits_for_tokens_charged_to_earlier_answers():
+    # Given
+    timer = FakeTimer()
+    controller = AdmissionController(
+        max_running=10,
+        max_running_per_user=10,
+        max_queued=10,
+        tokens_per_minute=600,
+        tokens_per_minute_per_user=600,
+        timer=timer,
+    )
+
+    # When
+    async with controller.admit("alice", 100) as admission:
+        controller.charge(admission, 600)
+    waiting = asyncio.create_task(hold(controller, "bob", asyncio.Event(), [], tokens=100))
+    await asyncio.sleep(0)
+
+    # Then
+    assert controller.queue, "There shouldn't be enough tokens until the bucket refills"
+
+    timer.now = 10
+    controller._on_refilled()  # noqa: SLF001
+    await asyncio.sleep(0)
+    assert not controller.queue
+    assert controller.running == {"bob": 1}
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+
+
+@pytest.mark.asyncio()
+async def test_admission_lets_other_users_by_a_user_out_of_tokens():
+    # Given
+    timer = FakeTimer()
+    controller = AdmissionController(
+        max_running=10,
+        max_running_per_user=10,
+        max_queued=10,
+        tokens_per_minute=10_000,
+        tokens_per_minute_per_user=600,
+        timer=timer,
+    )
+    async with controller.admit("alice", 100) as admission:
+        controller.charge(admission, 600)
+
+    # When
+    alice = asyncio.create_task(hold(controller, "alice", asyncio.Event(), [], tokens=100))
+    await asyncio.sleep(0)
+    bob = asyncio.create_task(hold(controller, "bob", asyncio.Event(), [], tokens=100))
+    await asyncio.sleep(0)
+
+    # Then
+    assert controller.running == {"bob": 1}
+    assert [admission.user_id for admission in controller.queue] == ["alice"]
+
+    timer.now = 10
+    controller._on_refilled()  # noqa: SLF001
+    await asyncio.sleep(0)
+    assert controller.running == {"alice": 1, "bob": 1}
+    timer.now = 100
+    for task in (alice, bob):
+        task.cancel()
+    await asyncio.gather(alice, bob, return_exceptions=True)
+    assert not controller.user_buckets, "Idle users' buckets should be dropped once they refill"
@@ -0,0 +1,102 @@
+import pytest
+
+from redbox_app.redbox_core.ai_settings import _local_cache, get_ai_settings_model, resolve_ai_settings
+from redbox_app.redbox_core.models import AISettings, ChatLLMBackend
+
+
+@pytest.fixture(autouse=True)
+def _clear_local_cache():
+    # Rows rolled back by earlier tests send no signals, so would otherwise stay cached
+    _local_cache.clear()
+
+
+@pytest.mark.django_db()
+def test_get_ai_settings_model_is_cached_until_saved(default_ai_settings: AISettings, django_assert_num_queries):
+    # Given
+    get_ai_settings_model(default_ai_settings.label)
+
+    # When
+    with django_assert_num_queries(0):
+        cached = get_ai_settings_model(default_ai_settings.label)
+
+    default_ai_settings.temperature = 0.7
+    default_ai_settings.save()
+
+    # Then
+    assert cached.temperature == 0
+    assert get_ai_settings_model(default_ai_settings.label).temperature == 0.7
+
+
+@pytest.mark.django_db()
+def test_resolve_ai_settings_is_cached_until_saved(default_ai_settings: AISettings):
+    # Given
+    ai_settings_model = get_ai_settings_model(default_ai_settings.label)
+    resolved = resolve_ai_settings(ai_settings_model, ai_settings_model.chat_backend)
+
+    # When
+    resolved_again = resolve_ai_settings(ai_settings_model, ai_settings_model.chat_backend)
+
+    default_ai_settings.chat_system_prompt = "A new prompt"
+    default_ai_settings.save()
+    ai_settings_model = get_ai_settings_model(default_ai_settings.label)
+
+    # Then
+    assert resolved_again is resolved
+    assert resolve_ai_settings(ai_settings_model, ai_settings_model.chat_backend).chat_system_prompt == "A new prompt"
+
+
+@pytest.mark.django_db()
+def test_saving_a_backend_clears_resolved_ai_settings(default_ai_settings: AISettings):
+    # Given
+    ai_settings_model = get_ai_settings_model(default_ai_settings.label)
+    resolve_ai_settings(ai_settings_model, ai_settings_model.chat_backend)
+
+    # When
+    chat_backend = ChatLLMBackend.objects.get(pk=ai_settings_model.chat_backend.pk)
+    chat_backend.description = "A new description"
+    chat_backend.save()
+    ai_settings_model = get_ai_settings_model(default_ai_settings.label)
+
+    # Then
+    assert ai_settings_model.chat_backend.description == "A new description"
+    resolved = resolve_ai_settings(ai_settings_model, ai_settings_model.chat_backend)
+    assert resolved.chat_backend.description == "A new description"
+    assert ai_settings_model.modified_at == default_ai_settings.modified_at
+
+
+@pytest.mark.django_db()
+def test_another_workers_save_is_seen_once_the_local_cache_expires(default_ai_settings: AISettings):
+    # Given
+    get_ai_settings_model(default_ai_settings.label)
+
+    # When
+    # Saved by another worker, whose signals only clear its own caches
+    AISettings.objects.filter(label=default_ai_settings.label).update(temperature=0.7)
+    _local_cache.clear()
+
+    # Then
+    assert get_ai_settings_model(default_ai_settings.label).temperature == 0.7
+
+
+@pytest.mark.django_db()
+def test_a_shared_cache_is_used_across_workers_and_cleared_on_save(
+    default_ai_settings: AISettings, settings, tmp_path, django_assert_num_queries
+):
+    # Given
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": str(tmp_path)}
+    }
+    get_ai_settings_model(default_ai_settings.label)
+    _local_cache.clear()
+
+    # When
+    with django_assert_num_queries(0):
+        from_other_worker = get_ai_settings_model(default_ai_settings.label)
+
+    default_ai_settings.temperature = 0.7
+    default_ai_settings.save()
+    _local_cache.clear()
+
+    # Then
+    assert from_other_worker.temperature == 0
+    assert get_ai_settings_model(default_ai_settings.label).temperature == 0.7
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import os
@@ -7,7 +8,9 @@ from datetime import UTC, datetime
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from asgiref.sync import async_to_sync
 from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer
 from channels.testing import WebsocketCommunicator
 from django.contrib.auth import get_user_model
 from django.db.models import Model
@@ -17,16 +20,19 @@ from pydantic import BaseModel
 from websockets import WebSocketClientProtocol
 from websockets.legacy.client import Connect
 
-from redbox.models.chain import LLMCallMetadata, RedboxQuery, RequestMetadata
+from redbox.models.chain import AISettings, LLMCallMetadata, RedboxQuery, RequestMetadata, Source
+from redbox.models.chain import Citation as AICitation
 from redbox.models.graph import FINAL_RESPONSE_TAG, ROUTE_NAME_TAG, SOURCE_DOCUMENTS_TAG, RedboxActivityEvent
 from redbox.models.prompts import CHAT_MAP_QUESTION_PROMPT
-from redbox_app.redbox_core import error_messages
-from redbox_app.redbox_core.consumers import ChatConsumer
+from redbox_app.redbox_core import consumers, error_messages
+from redbox_app.redbox_core.admission import admission_controller
+from redbox_app.redbox_core.consumers import ChatConsumer, ChatGeneration, Conversation, TextStreamCoalescer
 from redbox_app.redbox_core.models import (
     ActivityEvent,
     Chat,
     ChatMessage,
     ChatMessageTokenUse,
+    Citation,
     File,
 )
 
@@ -51,13 +57,36 @@ def get_token_use_count(use_type: str) -> int:
     return ChatMessageTokenUse.objects.filter(use_type=use_type).latest("created_at").token_count
 
 
+@pytest.fixture(autouse=True)
+def _send_every_token(settings):
+    """Most tests check each streamed token arrives in its own frame."""
+    settings.CHAT_STREAM_COALESCE_MS = 0
+
+
+@pytest.fixture(autouse=True)
+def _forget_answers_when_finished(settings):
+    """So answers don't outlive the tests that start them."""
+    settings.CHAT_RESUME_SECONDS = 0
+
+
+async def wait_for_answers():
+    await asyncio.gather(*consumers._generation_tasks, return_exceptions=True)  # noqa: SLF001
+
+
+def build_generation(chat: Chat) -> ChatGeneration:
+    conversation = Conversation(
+        session=chat, permitted_files=[], selected_files=[], message_history=[], ai_settings=AISettings()
+    )
+    return ChatGeneration(conversation, chat.user, "A question")
+
+
 @pytest.mark.django_db(transaction=True)
 @pytest.mark.asyncio()
 async def test_chat_consumer_with_new_session(alice: User, uploaded_file: File, mocked_connect: Connect):
     # Given
 
     # When
-    with patch("redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph", new=mocked_connect):
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = alice
         connected, _ = await communicator.connect()
@@ -80,6 +109,7 @@ async def test_chat_consumer_with_new_session(alice: User, uploaded_file: File,
         assert response4["data"] == "gratitude"
         assert response5["type"] == "source"
         assert response5["data"]["file_name"] == uploaded_file.file_name
+        await receive_until_end(communicator)
         # Close
         await communicator.disconnect()
 
@@ -105,7 +135,7 @@ async def test_chat_consumer_staff_user(staff_user: User, mocked_connect: Connec
     # Given
 
     # When
-    with patch("redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph", new=mocked_connect):
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = staff_user
         connected, _ = await communicator.connect()
@@ -126,6 +156,7 @@ async def test_chat_consumer_staff_user(staff_user: User, mocked_connect: Connec
         assert response3["data"] == "Mr. Amor."
         assert response4["type"] == "route"
         assert response4["data"] == "gratitude"
+        await receive_until_end(communicator)
         # Close
         await communicator.disconnect()
 
@@ -138,7 +169,7 @@ async def test_chat_consumer_with_existing_session(alice: User, chat: Chat, mock
     # Given
 
     # When
-    with patch("redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph", new=mocked_connect):
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = alice
         connected, _ = await communicator.connect()
@@ -151,6 +182,8 @@ async def test_chat_consumer_with_existing_session(alice: User, chat: Chat, mock
         assert response1["type"] == "session-id"
         assert response1["data"] == str(chat.id)
 
+        await receive_until_end(communicator)
+
         # Close
         await communicator.disconnect()
 
@@ -164,7 +197,7 @@ async def test_chat_consumer_with_naughty_question(alice: User, uploaded_file: F
     # Given
 
     # When
-    with patch("redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph", new=mocked_connect):
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = alice
         connected, _ = await communicator.connect()
@@ -187,6 +220,7 @@ async def test_chat_consumer_with_naughty_question(alice: User, uploaded_file: F
         assert response4["data"] == "gratitude"
         assert response5["type"] == "source"
         assert response5["data"]["file_name"] == uploaded_file.file_name
+        await receive_until_end(communicator)
         # Close
         await communicator.disconnect()
 
@@ -205,7 +239,9 @@ async def test_chat_consumer_with_naughty_citation(
     # Given
 
     # When
-    with patch("redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph", new=mocked_connect_with_naughty_citation):
+    with patch(
+        "redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect_with_naughty_citation
+    ):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = alice
         connected, _ = await communicator.connect()
@@ -225,6 +261,7 @@ async def test_chat_consumer_with_naughty_citation(
         assert response3["data"] == "gratitude"
         assert response4["type"] == "source"
         assert response4["data"]["file_name"] == uploaded_file.file_name
+        await receive_until_end(communicator)
         # Close
         await communicator.disconnect()
 
@@ -241,7 +278,7 @@ async def test_chat_consumer_agentic(alice: User, uploaded_file: File, mocked_co
     # Given
 
     # When
-    with patch("redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph", new=mocked_connect_agentic_search):
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect_agentic_search):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = alice
         connected, _ = await communicator.connect()
@@ -264,6 +301,7 @@ async def test_chat_consumer_agentic(alice: User, uploaded_file: File, mocked_co
         assert response4["data"] == "search/agentic"
         assert response5["type"] == "source"
         assert response5["data"]["file_name"] == uploaded_file.file_name
+        await receive_until_end(communicator)
         # Close
         await communicator.disconnect()
 
@@ -286,6 +324,15 @@ def get_chat_message_text(user: User, role: ChatMessage.Role) -> Sequence[str]:
     return [m.text for m in ChatMessage.objects.filter(chat__user=user, role=role)]
 
 
+@database_sync_to_async
+def get_token_use_counts(user: User, role: ChatMessage.Role) -> set[tuple[str, str, int]]:
+    return set(
+        ChatMessageTokenUse.objects.filter(chat_message__chat__user=user, chat_message__role=role).values_list(
+            "use_type", "model_name", "token_count"
+        )
+    )
+
+
 @database_sync_to_async
 def get_chat_message_citation_set(user: User, role: ChatMessage.Role) -> Sequence[tuple[str, tuple[int]]]:
     return {
@@ -314,7 +361,7 @@ async def test_chat_consumer_with_selected_files(
     selected_files: Sequence[File] = several_files[2:]
 
     # When
-    with patch("redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph", new=mocked_connect_with_several_files):
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect_with_several_files):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = alice
         connected, _ = await communicator.connect()
@@ -372,7 +419,7 @@ async def test_chat_consumer_with_connection_error(alice: User, mocked_breaking_
     # Given
 
     # When
-    with patch("redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph", new=mocked_breaking_connect):
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_breaking_connect):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = alice
         connected, _ = await communicator.connect()
@@ -395,7 +442,7 @@ async def test_chat_consumer_with_explicit_unhandled_error(
 
     # When
     with patch(
-        "redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph", new=mocked_connect_with_explicit_unhandled_error
+        "redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect_with_explicit_unhandled_error
     ):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = alice
@@ -424,7 +471,7 @@ async def test_chat_consumer_with_rate_limited_error(alice: User, mocked_connect
 
     # When
     with patch(
-        "redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph", new=mocked_connect_with_rate_limited_error
+        "redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect_with_rate_limited_error
     ):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = alice
@@ -455,7 +502,7 @@ async def test_chat_consumer_with_explicit_no_document_selected_error(
 
     # When
     with patch(
-        "redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph",
+        "redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph",
         new=mocked_connect_with_explicit_no_document_selected_error,
     ):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
@@ -481,7 +528,7 @@ async def test_chat_consumer_get_ai_settings(
     chat_with_alice: Chat, mocked_connect_with_explicit_no_document_selected_error: Connect
 ):
     with patch(
-        "redbox_app.redbox_core.consumers.ChatConsumer.redbox.graph",
+        "redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph",
         new=mocked_connect_with_explicit_no_document_selected_error,
     ):
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
@@ -511,7 +558,7 @@ async def test_chat_consumer_redbox_state(
     selected_files: Sequence[File] = several_files[2:]
 
     # When
-    with patch("redbox_app.redbox_core.consumers.ChatConsumer.redbox.run") as mock_run:
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.run") as mock_run:
         ai_settings = await ChatConsumer.get_ai_settings(chat_with_files)
         communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
         communicator.scope["user"] = alice
@@ -542,18 +589,20 @@ async def test_chat_consumer_redbox_state(
         await communicator.disconnect()
 
         # Then
+        token_counts = {m.text: m.token_count async for m in ChatMessage.objects.filter(chat=chat_with_files)}
         expected_request = RedboxQuery(
             question="Third question, with selected files?",
             s3_keys=selected_file_keys,
             user_uuid=alice.id,
             chat_history=[
-                {"role": "user", "text": "A question?"},
-                {"role": "ai", "text": "An answer."},
-                {"role": "user", "text": "A second question?"},
-                {"role": "ai", "text": "A second answer."},
+                {"role": "user", "text": "A question?", "token_count": token_counts["A question?"]},
+                {"role": "ai", "text": "An answer.", "token_count": token_counts["An answer."]},
+                {"role": "user", "text": "A second question?", "token_count": token_counts["A second question?"]},
+                {"role": "ai", "text": "A second answer.", "token_count": token_counts["A second answer."]},
             ],
             ai_settings=ai_settings,
             permitted_s3_keys=permitted_file_keys,
+            chat_id=chat_with_files.id,
         )
         redbox_state = mock_run.call_args.args[0]  # pulls out the args that redbox.run was called with
 
@@ -562,6 +611,376 @@ async def test_chat_consumer_redbox_state(
         ), f"Expected {expected_request}. Received: {redbox_state["request"]}"
 
 
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio()
+async def test_chat_consumer_coalesces_streamed_text(alice: User, mocked_connect: Connect, settings):
+    # Given
+    settings.CHAT_STREAM_COALESCE_MS = 1000
+
+    # When
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+        communicator.scope["user"] = alice
+        connected, _ = await communicator.connect()
+        assert connected
+
+        await communicator.send_json_to({"message": "Hello Hal."})
+        response1 = await communicator.receive_json_from(timeout=5)
+        response2 = await communicator.receive_json_from(timeout=5)
+        response3 = await communicator.receive_json_from(timeout=5)
+
+        # Then
+        assert response1["type"] == "session-id"
+        assert response2 == {"type": "text", "data": "Good afternoon, Mr. Amor."}
+        assert response3["type"] == "route", "Waiting text should be sent before any other message"
+        await communicator.disconnect()
+
+    assert await get_chat_message_text(alice, ChatMessage.Role.ai) == ["Good afternoon, Mr. Amor."]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio()
+async def test_chat_consumer_when_too_busy(alice: User, mocked_connect: Connect):
+    # Given
+
+    # When
+    with (
+        patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_connect),
+        patch.object(admission_controller, "max_queued", new=0),
+    ):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+        communicator.scope["user"] = alice
+        connected, _ = await communicator.connect()
+        assert connected
+
+        await communicator.send_json_to({"message": "Hello Hal."})
+        response1 = await communicator.receive_json_from(timeout=5)
+        response2 = await communicator.receive_json_from(timeout=5)
+
+        # Then
+        assert response1["type"] == "session-id"
+        assert response2 == {"type": "error", "data": error_messages.BUSY}
+        await communicator.disconnect()
+
+    assert await get_chat_message_text(alice, ChatMessage.Role.ai) == []
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio()
+async def test_chat_consumer_stop_saves_reply_so_far(alice: User, mocked_stalled_connect: Connect):
+    # Given
+
+    # When
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_stalled_connect):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+        communicator.scope["user"] = alice
+        connected, _ = await communicator.connect()
+        assert connected
+
+        await communicator.send_json_to({"message": "Hello Hal."})
+        response1 = await communicator.receive_json_from(timeout=5)
+        response2 = await communicator.receive_json_from(timeout=5)
+        await communicator.send_json_to({"type": "stop"})
+        response3 = await communicator.receive_json_from(timeout=5)
+        closed = await communicator.receive_output(timeout=5)
+
+        # Then
+        assert response1["type"] == "session-id"
+        assert response2 == {"type": "text", "data": "Good afternoon, "}
+        assert response3["type"] == "end"
+        assert closed["type"] == "websocket.close"
+        assert mocked_stalled_connect.closed, "The graph's event stream should be closed"
+        await communicator.disconnect()
+
+    assert await get_chat_message_text(alice, ChatMessage.Role.ai) == ["Good afternoon, "]
+    assert await get_token_use_count(ChatMessageTokenUse.UseType.OUTPUT) > 0
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio()
+async def test_chat_consumer_stop_before_reply_saves_token_use(
+    alice: User, mocked_stalled_before_reply_connect: Connect
+):
+    # Given
+
+    # When
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_stalled_before_reply_connect):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+        communicator.scope["user"] = alice
+        connected, _ = await communicator.connect()
+        assert connected
+
+        await communicator.send_json_to({"message": "Hello Hal."})
+        response1 = await communicator.receive_json_from(timeout=5)
+        response2 = await communicator.receive_json_from(timeout=5)
+        await communicator.send_json_to({"type": "stop"})
+        closed = await communicator.receive_output(timeout=5)
+        await communicator.disconnect()
+        await wait_for_answers()
+
+    # Then
+    assert response1["type"] == "session-id"
+    assert response2 == {"type": "activity", "data": "Summarising the documents"}
+    assert closed["type"] == "websocket.close"
+    assert await get_chat_message_text(alice, ChatMessage.Role.ai) == []
+    assert await get_token_use_counts(alice, ChatMessage.Role.user) == {
+        (ChatMessageTokenUse.UseType.INPUT, "gpt-4o", 5000),
+        (ChatMessageTokenUse.UseType.OUTPUT, "gpt-4o", 200),
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio()
+async def test_chat_consumer_stops_answer_asked_to_stop_straight_away(alice: User, mocked_stalled_connect: Connect):
+    # Given
+    group_add = InMemoryChannelLayer.group_add
+
+    async def slow_group_add(self, group, channel):
+        # As over the network to a shared channel layer
+        await asyncio.sleep(0.1)
+        await group_add(self, group, channel)
+
+    # When
+    with (
+        patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_stalled_connect),
+        patch.object(InMemoryChannelLayer, "group_add", new=slow_group_add),
+    ):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+        communicator.scope["user"] = alice
+        connected, _ = await communicator.connect()
+        assert connected
+
+        await communicator.send_json_to({"message": "Hello Hal."})
+        await communicator.send_json_to({"type": "stop"})
+        while (output := await communicator.receive_output(timeout=5))["type"] != "websocket.close":
+            pass
+
+        # Then
+        assert output["type"] == "websocket.close", "The answer should stop, however soon it's asked to"
+        await communicator.disconnect()
+        await wait_for_answers()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio()
+async def test_chat_consumer_disconnect_cancels_answer(alice: User, mocked_stalled_connect: Connect):
+    # Given
+
+    # When
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_stalled_connect):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+        communicator.scope["user"] = alice
+        connected, _ = await communicator.connect()
+        assert connected
+
+        await communicator.send_json_to({"message": "Hello Hal."})
+        await communicator.receive_json_from(timeout=5)
+        await communicator.receive_json_from(timeout=5)
+        await communicator.disconnect()
+        await wait_for_answers()
+
+    # Then
+    assert mocked_stalled_connect.closed, "The graph's event stream should be closed"
+    assert await get_chat_message_text(alice, ChatMessage.Role.ai) == ["Good afternoon, "]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio()
+async def test_chat_consumer_resumes_answer_after_reconnecting(alice: User, mocked_stalled_connect: Connect, settings):
+    # Given
+    settings.CHAT_RESUME_SECONDS = 30
+
+    with patch("redbox_app.redbox_core.consumers.ChatGeneration.redbox.graph", new=mocked_stalled_connect):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+        communicator.scope["user"] = alice
+        connected, _ = await communicator.connect()
+        assert connected
+
+        await communicator.send_json_to({"message": "Hello Hal."})
+        session_id = (await communicator.receive_json_from(timeout=5))["data"]
+        await communicator.disconnect()
+
+        # When
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+        communicator.scope["user"] = alice
+        connected, _ = await communicator.connect()
+        assert connected
+
+        await communicator.send_json_to({"type": "resume", "sessionId": session_id, "offset": 1})
+        response1 = await communicator.receive_json_from(timeout=5)
+        await communicator.send_json_to({"type": "stop"})
+        response2 = await communicator.receive_json_from(timeout=5)
+        await communicator.disconnect()
+        await wait_for_answers()
+
+    # Then
+    assert response1 == {"type": "text", "data": "Good afternoon, "}
+    assert response2["type"] == "end"
+    assert await get_chat_message_text(alice, ChatMessage.Role.ai) == ["Good afternoon, "]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio()
+async def test_chat_consumer_gives_up_resuming_a_forgotten_answer(alice: User, chat_with_message: Chat, settings):
+    # Given
+    settings.CHAT_RESUME_TIMEOUT_SECONDS = 0
+
+    # When
+    communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+    communicator.scope["user"] = alice
+    connected, _ = await communicator.connect()
+    assert connected
+
+    await communicator.send_json_to({"type": "resume", "sessionId": str(chat_with_message.id), "offset": 3})
+    response = await communicator.receive_json_from(timeout=5)
+    closed = await communicator.receive_output(timeout=5)
+
+    # Then
+    assert response == {"type": "error", "data": error_messages.ANSWER_UNAVAILABLE}
+    assert closed["type"] == "websocket.close"
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio()
+async def test_text_stream_coalescer_sends_when_full_or_window_ends():
+    frames = []
+
+    async def send(text: str):
+        frames.append(text)
+
+    coalescer = TextStreamCoalescer(send, window_seconds=0.05, max_chars=10)
+
+    await coalescer.add("Hello")
+    await coalescer.add(", world")
+    assert frames == ["Hello, world"], "Reaching max_chars should send straight away"
+
+    await coalescer.add("!")
+    assert frames == ["Hello, world"]
+    await asyncio.sleep(0.1)
+    assert frames == ["Hello, world", "!"], "Text should be sent once the window ends"
+
+    await coalescer.flush()
+    assert frames == ["Hello, world", "!"], "Flushing with nothing waiting shouldn't send an empty frame"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_save_ai_message_bulk_inserts(chat: Chat, several_files: Sequence[File], django_assert_max_num_queries, mocker):
+    # Given
+    mocker.patch.object(ChatMessage, "log")
+    generation = build_generation(chat)
+    generation.route = "chat_with_docs"
+    generation.citations = [
+        (
+            file,
+            AICitation(
+                text_in_answer="some answer",
+                sources=[
+                    Source(
+                        source=str(file.url),
+                        source_type=Citation.Origin.USER_UPLOADED_DOCUMENT,
+                        document_name=file.file_name,
+                        highlighted_text_in_source=f"chunk {i}",
+                        page_numbers=[i],
+                    )
+                    for i in range(3)
+                ],
+            ),
+        )
+        for file in several_files
+    ] + [
+        (
+            None,
+            AICitation(
+                text_in_answer="another answer",
+                sources=[
+                    Source(
+                        source="https://www.gov.uk/guidance",
+                        source_type=Citation.Origin.GOV_UK,
+                        document_name="guidance",
+                        highlighted_text_in_source="guidance chunk",
+                    )
+                ],
+            ),
+        )
+    ]
+    generation.metadata = RequestMetadata(
+        llm_calls=[
+            LLMCallMetadata(llm_model_name="gpt-4o", input_tokens=10, output_tokens=20),
+            LLMCallMetadata(llm_model_name="claude", input_tokens=30, output_tokens=40),
+        ]
+    )
+    generation.activities = [RedboxActivityEvent(message=f"activity {i}") for i in range(5)]
+
+    # When
+    with django_assert_max_num_queries(8):
+        chat_message = async_to_sync(generation.save_ai_message)(chat, "An answer.")
+
+    # Then
+    assert chat_message.citation_set.count() == len(several_files) * 3 + 1
+    assert chat_message.chatmessagetokenuse_set.count() == 4
+    assert chat_message.activityevent_set.count() == 5
+    for file in several_files:
+        previously_referenced = file.last_referenced
+        file.refresh_from_db()
+        assert file.last_referenced > previously_referenced
+
+
+@pytest.mark.django_db()
+def test_resolve_files_looks_up_unseen_uris_once(chat: Chat, several_files: Sequence[File], django_assert_num_queries):
+    # Given
+    generation = build_generation(chat)
+    permitted, *others = several_files
+    generation.files_by_uri = {permitted.original_file.name: permitted}
+    uris = [file.original_file.name for file in several_files] + ["https://www.gov.uk/guidance"]
+
+    # When
+    with django_assert_num_queries(1):
+        files = async_to_sync(generation.resolve_files)(uris)
+    with django_assert_num_queries(0):
+        files_again = async_to_sync(generation.resolve_files)(uris)
+
+    # Then
+    assert files == files_again
+    assert files[permitted.original_file.name] is permitted
+    assert [files[file.original_file.name] for file in others] == others
+    assert files["https://www.gov.uk/guidance"] is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bootstrap_conversation(
+    alice: User, chat_with_files: Chat, several_files: Sequence[File], django_assert_max_num_queries, mocker
+):
+    # Given
+    mocker.patch.object(ChatMessage, "log")
+    consumer = ChatConsumer()
+    selected_files = several_files[2:]
+    bootstrap = async_to_sync(consumer.bootstrap_conversation)
+    bootstrap(alice, "Warm up the AISettings cache", session_id=str(chat_with_files.id))
+
+    # When
+    with django_assert_max_num_queries(12):
+        conversation = bootstrap(
+            alice,
+            "Third question, with selected files?",
+            session_id=str(chat_with_files.id),
+            temperature=0.5,
+            selected_file_uuids=[f.id for f in selected_files],
+            activities=["an activity"],
+        )
+
+    # Then
+    assert conversation.session.id == chat_with_files.id
+    assert conversation.session.temperature == 0.5
+    assert set(conversation.permitted_files) == set(several_files)
+    assert set(conversation.selected_files) == set(selected_files)
+    assert [m.text for m in conversation.message_history][-2:] == [
+        "Warm up the AISettings cache",
+        "Third question, with selected files?",
+    ]
+    assert set(conversation.message_history[-1].selected_files.all()) == set(selected_files)
+    assert conversation.ai_settings.chat_backend.name == chat_with_files.chat_backend.name
+
+
 @database_sync_to_async
 def get_chat_messages(user: User) -> Sequence[ChatMessage]:
     return list(
@@ -573,6 +992,12 @@ def get_chat_messages(user: User) -> Sequence[ChatMessage]:
     )
 
 
+async def receive_until_end(communicator: WebsocketCommunicator) -> None:
+    """Waits for the "end" frame, sent once the answer is saved. Answers carry on after their connection closes."""
+    while (await communicator.receive_json_from(timeout=5))["type"] != "end":
+        pass
+
+
 class Token(BaseModel):
     content: str
 
@@ -597,6 +1022,20 @@ class CannedGraphLLM(BaseChatModel):
             yield response
 
 
+class StalledGraphLLM(CannedGraphLLM):
+    """Streams its responses, then waits for more until it's closed."""
+
+    closed: bool = False
+
+    async def astream_events(self, *_args, **_kwargs):
+        try:
+            for response in self.responses:
+                yield response
+            await asyncio.Event().wait()
+        finally:
+            self.closed = True
+
+
 @pytest.fixture()
 def mocked_connect(uploaded_file: File) -> Connect:
     responses = [
@@ -656,6 +1095,37 @@ def mocked_connect(uploaded_file: File) -> Connect:
     return CannedGraphLLM(responses=responses)
 
 
+@pytest.fixture()
+def mocked_stalled_connect() -> StalledGraphLLM:
+    responses = [
+        {
+            "event": "on_chat_model_stream",
+            "tags": [FINAL_RESPONSE_TAG],
+            "data": {"chunk": Token(content="Good afternoon, ")},
+        },
+    ]
+    return StalledGraphLLM(responses=responses)
+
+
+@pytest.fixture()
+def mocked_stalled_before_reply_connect() -> StalledGraphLLM:
+    responses = [
+        {
+            "event": "on_custom_event",
+            "name": "on_metadata_generation",
+            "data": RequestMetadata(
+                llm_calls=[LLMCallMetadata(llm_model_name="gpt-4o", input_tokens=5000, output_tokens=200)],
+            ),
+        },
+        {
+            "event": "on_custom_event",
+            "name": "activity",
+            "data": RedboxActivityEvent(message="Summarising the documents"),
+        },
+    ]
+    return StalledGraphLLM(responses=responses)
+
+
 @pytest.fixture()
 def mocked_connect_with_naughty_citation(uploaded_file: File) -> CannedGraphLLM:
     responses = [
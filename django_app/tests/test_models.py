@@ -4,7 +4,9 @@ import pytest
 from django.core.files.uploadedfile import SimpleUploadedFile
 from yarl import URL
 
+from redbox.chains.components import get_tokeniser
 from redbox_app.redbox_core.models import (
+    Chat,
     ChatMessage,
     Citation,
     File,
@@ -163,3 +165,54 @@ def test_unique_citation_uris(chat_message: ChatMessage, uploaded_file: File):
     assert urls[0][1] == URL("http://example.com")
     assert urls[1][0] == "original_file.txt"
     assert urls[1][1].parts[-1] == "original_file.txt"
+
+
+@pytest.mark.django_db()
+def test_chat_message_token_count_set_on_save(chat: Chat):
+    chat_message = ChatMessage.objects.create(chat=chat, text="How many tokens?", role=ChatMessage.Role.user)
+    chat_message.refresh_from_db()
+
+    assert chat_message.token_count == len(get_tokeniser().encode("How many tokens?"))
+
+
+@pytest.mark.django_db()
+def test_add_footnotes_links_text_to_its_citations(chat: Chat):
+    chat_message = ChatMessage(chat=chat, text="Cats sleep. Dogs bark.", role=ChatMessage.Role.ai)
+    citations = [
+        Citation(text="about dogs", text_in_answer="Dogs bark.", source=Citation.Origin.WIKIPEDIA, url="http://b.com"),
+        Citation(text="about cats", text_in_answer="Cats sleep.", source=Citation.Origin.WIKIPEDIA, url="http://a.com"),
+    ]
+
+    footnoted_text = chat_message.add_footnotes(citations)
+
+    assert footnoted_text == (
+        f'Cats sleep.<a class="rb-footnote-link" href="#footnote-{chat_message.id}-1">1</a> '
+        f'Dogs bark.<a class="rb-footnote-link" href="#footnote-{chat_message.id}-2">2</a>'
+    )
+
+
+@pytest.mark.django_db()
+def test_chat_last_message_at_set_when_a_message_is_saved(chat: Chat):
+    first = ChatMessage.objects.create(chat=chat, text="A question?", role=ChatMessage.Role.user)
+    second = ChatMessage.objects.create(chat=chat, text="An answer.", role=ChatMessage.Role.ai)
+    first.rating = 5
+    first.save()
+
+    chat.refresh_from_db()
+
+    assert chat.last_message_at == second.created_at, "Saving an earlier message again shouldn't move it back"
+
+
+@pytest.mark.django_db()
+def test_get_ordered_by_last_message_date_pages_past_chats_without_messages(
+    user_with_chats_with_messages_over_time: User,
+):
+    Chat.objects.create(user=user_with_chats_with_messages_over_time, name="no messages")
+
+    first_page = list(Chat.get_ordered_by_last_message_date(user_with_chats_with_messages_over_time)[:2])
+    second_page = list(
+        Chat.get_ordered_by_last_message_date(user_with_chats_with_messages_over_time, after=first_page[-1].cursor)
+    )
+
+    assert [chat.name for chat in first_page] == ["today", "yesterday"]
+    assert [chat.name for chat in second_page] == ["5 days old", "20 days old", "40 days old"]
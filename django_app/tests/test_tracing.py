@@ -0,0 +1,56 @@
+import json
+import logging
+
+from redbox_app.redbox_core import tracing
+from redbox_app.redbox_core.tracing import RequestTrace
+
+
+def wait_for_traces():
+    # Traces are logged in order on a single thread
+    tracing._executor.submit(lambda: None).result()  # noqa: SLF001
+
+
+def test_sampled_trace_logs_truncated_fields(caplog):
+    # Given
+    caplog.set_level(logging.INFO, logger=tracing.__name__)
+    trace = RequestTrace("chat", sample_rate=1, max_field_chars=20, chat_id="abc")
+
+    # When
+    trace.add(reply="a" * 100, documents=[{"uri": "file.pdf"}] * 60)
+    trace.emit()
+    wait_for_traces()
+
+    # Then
+    (record,) = caplog.records
+    logged = json.loads(record.getMessage())
+    assert logged["trace"] == "chat"
+    assert logged["chat_id"] == "abc"
+    assert logged["reply"] == f"{"a" * 20}... [80 more characters]"
+    assert logged["documents"] == [{"uri": "file.pdf"}] * 50 + ["... [10 more items]"]
+
+
+def test_unsampled_trace_logs_nothing(caplog):
+    # Given
+    caplog.set_level(logging.INFO, logger=tracing.__name__)
+    trace = RequestTrace("chat", sample_rate=0)
+
+    # When
+    trace.add(reply="an answer")
+    trace.emit()
+    wait_for_traces()
+
+    # Then
+    assert not trace.fields
+    assert not caplog.records
+
+
+def test_trace_is_not_sampled_when_info_is_disabled(caplog, settings):
+    # Given
+    settings.CHAT_TRACE_SAMPLE_RATE = 1
+    caplog.set_level(logging.WARNING, logger=tracing.__name__)
+
+    # When
+    trace = RequestTrace("chat")
+
+    # Then
+    assert not trace.sampled
@@ -90,6 +90,28 @@ def test_chat_grouped_by_age(user_with_chats_with_messages_over_time: User, clie
         assert date_group.find_next_sibling("ul").find("a").text == chat_name
 
 
+@pytest.mark.django_db()
+def test_chat_history_is_paged(user_with_chats_with_messages_over_time: User, client: Client, settings):
+    # Given
+    settings.CHAT_HISTORY_PAGE_SIZE = 2
+    client.force_login(user_with_chats_with_messages_over_time)
+
+    # When
+    pages = []
+    url = reverse("chats")
+    while url:
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        soup = BeautifulSoup(response.content)
+        links = soup.find_all("a", {"class": "rb-chat-history__link"})
+        pages.append([link.text for link in links if not link.find_parent("template")])
+        older_chats = soup.find("a", string="Older chats")
+        url = older_chats and older_chats["href"]
+
+    # Then
+    assert pages == [["today", "yesterday"], ["5 days old", "20 days old"], ["40 days old"]]
+
+
 @pytest.mark.django_db()
 def test_nonexistent_chats(alice: User, client: Client):
     # Given
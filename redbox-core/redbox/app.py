@@ -1,13 +1,18 @@
+from contextlib import aclosing
+from functools import cached_property
 from logging import getLogger
 from typing import Literal
 
 from langchain_core.embeddings import Embeddings
 from langchain_core.tools import StructuredTool
 from langchain_core.vectorstores import VectorStoreRetriever
+from langgraph.graph.graph import CompiledGraph
 
 from redbox.chains.components import (
     get_all_chunks_retriever,
     get_embeddings,
+    get_external_search_cache,
+    get_external_search_session,
     get_metadata_retriever,
     get_parameterised_retriever,
 )
@@ -32,9 +37,16 @@ async def _default_callback(*args, **kwargs):
 
 
 logger = getLogger(__name__)
-logger.warning("inside app.py")
+
 
 class Redbox:
+    """Runs the Redbox graph.
+
+    Retrievers, tools and the graph are built on first use rather than here, and each subgraph is only compiled
+    when a request is first routed to it, so creating a Redbox is cheap. Compiled graphs are kept for the life of
+    the instance.
+    """
+
     def __init__(
         self,
         all_chunks_retriever: VectorStoreRetriever | None = None,
@@ -44,39 +56,73 @@ class Redbox:
         env: Settings | None = None,
         debug: bool = False,
     ):
-        _env = env or get_settings()
+        self.env = env or get_settings()
+        self.debug = debug
+
+        self._all_chunks_retriever = all_chunks_retriever
+        self._parameterised_retriever = parameterised_retriever
+        self._metadata_retriever = metadata_retriever
+        self._embedding_model = embedding_model
+
+    # Retrievers
+
+    @cached_property
+    def all_chunks_retriever(self) -> VectorStoreRetriever:
+        return self._all_chunks_retriever or get_all_chunks_retriever(self.env)
 
-        # Retrievers
+    @cached_property
+    def parameterised_retriever(self) -> VectorStoreRetriever:
+        return self._parameterised_retriever or get_parameterised_retriever(self.env)
 
-        self.all_chunks_retriever = all_chunks_retriever or get_all_chunks_retriever(_env)
-        self.parameterised_retriever = parameterised_retriever or get_parameterised_retriever(_env)
-        self.metadata_retriever = metadata_retriever or get_metadata_retriever(_env)
-        self.embedding_model = embedding_model or get_embeddings(_env)
+    @cached_property
+    def metadata_retriever(self) -> VectorStoreRetriever:
+        return self._metadata_retriever or get_metadata_retriever(self.env)
 
-        # Tools
-        logger.warning("inside app.py before search_documents")
+    @cached_property
+    def embedding_model(self) -> Embeddings:
+        return self._embedding_model or get_embeddings(self.env)
+
+    # Tools
+
+    @cached_property
+    def tools(self) -> dict[str, StructuredTool]:
         search_documents = build_search_documents_tool(
-            es_client=_env.elasticsearch_client(),
-            index_name=f"{_env.elastic_root_index}-chunk",
-            embedding_model=self.embedding_model,
-            embedding_field_name=_env.embedding_document_field_name,
+            es_client=self.env.tool_elasticsearch_client(),
+            async_es_client=self.env.async_elasticsearch_client(),
+            index_name=f"{self.env.elastic_root_index}-chunk",
+            embedding_model=self._embedding_model
+            or get_embeddings(self.env, timeout_seconds=self.env.document_search_timeout_seconds),
+            embedding_field_name=self.env.embedding_document_field_name,
             chunk_resolution=ChunkResolution.normal,
+            timeout_seconds=self.env.document_search_timeout_seconds,
+        )
+        search_wikipedia = build_search_wikipedia_tool(
+            session=get_external_search_session(),
+            cache=get_external_search_cache(),
+            timeout_seconds=self.env.external_search_timeout_seconds,
+        )
+        search_govuk = build_govuk_search_tool(
+            session=get_external_search_session(),
+            cache=get_external_search_cache(),
+            timeout_seconds=self.env.external_search_timeout_seconds,
         )
-        search_wikipedia = build_search_wikipedia_tool()
-        search_govuk = build_govuk_search_tool()
 
-        self.tools: dict[str, StructuredTool] = {
+        return {
             "_search_documents": search_documents,
             "_search_govuk": search_govuk,
             "_search_wikipedia": search_wikipedia,
         }
 
-        self.graph = get_root_graph(
+    # Graph
+
+    @cached_property
+    def graph(self) -> CompiledGraph:
+        return get_root_graph(
             all_chunks_retriever=self.all_chunks_retriever,
             parameterised_retriever=self.parameterised_retriever,
             metadata_retriever=self.metadata_retriever,
-            tools=self.tools,
-            debug=debug,
+            tools=lambda: self.tools,
+            debug=self.debug,
         )
 
     def run_sync(self, input: RedboxState):
@@ -98,40 +144,44 @@ class Redbox:
         final_state = None
         request_dict = input["request"].model_dump()
         logger.info("Request: %s", {k: request_dict[k] for k in request_dict.keys() - {"ai_settings"}})
-        async for event in self.graph.astream_events(
+        # Closing the stream as soon as the caller stops iterating, e.g. when its task is cancelled, cancels the
+        # graph's running nodes and their in-flight LLM calls rather than leaving them to finish in the background
+        events = self.graph.astream_events(
             input=input,
             version="v2",
             config={"recursion_limit": input["request"].ai_settings.recursion_limit},
-        ):
-            kind = event["event"]
-            tags = event.get("tags", [])
-            if kind == "on_chat_model_stream" and FINAL_RESPONSE_TAG in tags:
-                content = event["data"]["chunk"].content
-                if isinstance(content, str):
-                    await response_tokens_callback(content)
-            elif kind == "on_chain_end" and FINAL_RESPONSE_TAG in tags:
-                content = event["data"]["output"]
-                if isinstance(content, str):
-                    await response_tokens_callback(content)
-            elif kind == "on_custom_event" and event["name"] == RedboxEventType.response_tokens.value:
-                await response_tokens_callback(event["data"])
-            elif kind == "on_chain_end" and ROUTE_NAME_TAG in tags:
-                await route_name_callback(event["data"]["output"]["route_name"])
-            elif kind == "on_retriever_end" and SOURCE_DOCUMENTS_TAG in tags:
-                await documents_callback(event["data"]["output"])
-            elif kind == "on_tool_end" and SOURCE_DOCUMENTS_TAG in tags:
-                documents = flatten_document_state(event["data"]["output"].get("documents", {}))
-                await documents_callback(documents)
-            elif kind == "on_custom_event" and event["name"] == RedboxEventType.on_source_report.value:
-                await documents_callback(event["data"])
-            elif kind == "on_custom_event" and event["name"] == RedboxEventType.on_citations_report.value:
-                await citations_callback(event["data"])
-            elif kind == "on_custom_event" and event["name"] == RedboxEventType.on_metadata_generation.value:
-                await metadata_tokens_callback(event["data"])
-            elif kind == "on_custom_event" and event["name"] == RedboxEventType.activity.value:
-                await activity_event_callback(event["data"])
-            elif kind == "on_chain_end" and event["name"] == "LangGraph":
-                final_state = RedboxState(**event["data"]["output"])
+        )
+        async with aclosing(events):
+            async for event in events:
+                kind = event["event"]
+                tags = event.get("tags", [])
+                if kind == "on_chat_model_stream" and FINAL_RESPONSE_TAG in tags:
+                    content = event["data"]["chunk"].content
+                    if isinstance(content, str):
+                        await response_tokens_callback(content)
+                elif kind == "on_chain_end" and FINAL_RESPONSE_TAG in tags:
+                    content = event["data"]["output"]
+                    if isinstance(content, str):
+                        await response_tokens_callback(content)
+                elif kind == "on_custom_event" and event["name"] == RedboxEventType.response_tokens.value:
+                    await response_tokens_callback(event["data"])
+                elif kind == "on_chain_end" and ROUTE_NAME_TAG in tags:
+                    await route_name_callback(event["data"]["output"]["route_name"])
+                elif kind == "on_retriever_end" and SOURCE_DOCUMENTS_TAG in tags:
+                    await documents_callback(event["data"]["output"])
+                elif kind == "on_tool_end" and SOURCE_DOCUMENTS_TAG in tags:
+                    documents = flatten_document_state(event["data"]["output"].get("documents", {}))
+                    await documents_callback(documents)
+                elif kind == "on_custom_event" and event["name"] == RedboxEventType.on_source_report.value:
+                    await documents_callback(event["data"])
+                elif kind == "on_custom_event" and event["name"] == RedboxEventType.on_citations_report.value:
+                    await citations_callback(event["data"])
+                elif kind == "on_custom_event" and event["name"] == RedboxEventType.on_metadata_generation.value:
+                    await metadata_tokens_callback(event["data"])
+                elif kind == "on_custom_event" and event["name"] == RedboxEventType.activity.value:
+                    await activity_event_callback(event["data"])
+                elif kind == "on_chain_end" and event["name"] == "LangGraph":
+                    final_state = RedboxState(**event["data"]["output"])
         return final_state
 
     def get_available_keywords(self) -> dict[ChatRoute, str]:
@@ -0,0 +1,166 @@
+"""
+AWS credentials and SigV4 request signing shared across a process
+"""
+
+import hashlib
+import hmac
+import logging
+import time
+from collections.abc import Callable
+from functools import cache, lru_cache
+from threading import Lock, Thread
+from typing import Any
+
+import boto3
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import ReadOnlyCredentials
+from opensearchpy import AWSV4SignerAsyncAuth, AWSV4SignerAuth
+from opensearchpy.helpers.signer import AWSV4Signer
+
+logger = logging.getLogger(__name__)
+
+
+class CachedCredentialsProvider:
+    """Resolves AWS credentials once and hands out frozen copies until shortly before they expire.
+
+    Within refresh_margin_seconds of expiry the current credentials are still returned while a background
+    thread refreshes them, so requests only wait on STS or the instance metadata service when there are no
+    valid credentials at all. Credentials without an expiry, such as static keys, are kept for good.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], boto3.Session] = boto3.Session,
+        refresh_margin_seconds: float = 15 * 60,
+        timer: Callable[[], float] = time.time,
+    ):
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._session_factory = session_factory
+        self._timer = timer
+        self._credentials = None
+        self._frozen: ReadOnlyCredentials | None = None
+        self._expires_at: float | None = None
+        self._lock = Lock()
+        self._refreshing = False
+
+    def get_frozen_credentials(self) -> ReadOnlyCredentials:
+        frozen, expires_at = self._frozen, self._expires_at
+        now = self._timer()
+
+        if frozen is None or (expires_at is not None and expires_at <= now):
+            return self._refresh(force=False)
+
+        if expires_at is not None and expires_at - now <= self.refresh_margin_seconds:
+            self._refresh_in_background()
+
+        return frozen
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        Thread(target=self._refresh, kwargs={"force": True}, daemon=True).start()
+
+    def _refresh(self, force: bool) -> ReadOnlyCredentials:
+        try:
+            with self._lock:
+                # Another caller may have refreshed while this one waited
+                if not force and self._frozen is not None and not self._is_expired():
+                    return self._frozen
+
+                if self._credentials is None:
+                    self._credentials = self._session_factory().get_credentials()
+                    if self._credentials is None:
+                        msg = "No AWS credentials could be found"
+                        raise ValueError(msg)
+
+                # botocore refreshes refreshable credentials itself when they're close to expiry
+                self._frozen = self._credentials.get_frozen_credentials()
+                expiry_time = getattr(self._credentials, "_expiry_time", None)
+                self._expires_at = expiry_time.timestamp() if expiry_time is not None else None
+                return self._frozen
+        except Exception as e:
+            if force:
+                logger.warning("Background refresh of AWS credentials failed: %s", e)
+            raise
+        finally:
+            if force:
+                self._refreshing = False
+
+    def _is_expired(self) -> bool:
+        return self._expires_at is not None and self._expires_at <= self._timer()
+
+
+@cache
+def get_credentials_provider() -> CachedCredentialsProvider:
+    return CachedCredentialsProvider()
+
+
+@cache
+def get_caller_arn() -> str:
+    """The ARN these credentials act as, looked up from STS once per process."""
+    return boto3.client("sts").get_caller_identity()["Arn"]
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+@lru_cache(maxsize=32)
+def get_signing_key(secret_key: str, datestamp: str, region: str, service: str) -> bytes:
+    """Derives the SigV4 signing key, which only changes with the day, region, service and secret key."""
+    k_date = _hmac(f"AWS4{secret_key}".encode(), datestamp)
+    k_region = _hmac(k_date, region)
+    k_service = _hmac(k_region, service)
+    return _hmac(k_service, "aws4_request")
+
+
+class CachedKeySigV4Auth(SigV4Auth):
+    """SigV4Auth that reuses the day's signing key rather than running four HMACs per request."""
+
+    def signature(self, string_to_sign: str, request: AWSRequest) -> str:
+        signing_key = get_signing_key(
+            self.credentials.secret_key,
+            request.context["timestamp"][0:8],
+            self._region_name,
+            self._service_name,
+        )
+        return self._sign(signing_key, string_to_sign, hex=True)
+
+
+class CachedAWSV4Signer(AWSV4Signer):
+    """Signs OpenSearch requests with credentials from a CachedCredentialsProvider and cached signing keys."""
+
+    def sign(self, method: str, url: str, body: Any) -> dict[str, str]:
+        aws_request = AWSRequest(method=method.upper(), url=url, data=body)
+
+        sig_v4_auth = CachedKeySigV4Auth(self.credentials.get_frozen_credentials(), self.service, self.region)
+        sig_v4_auth.add_auth(aws_request)
+
+        headers = dict(aws_request.headers.items())
+        headers["X-Amz-Content-SHA256"] = sig_v4_auth.payload(aws_request)
+
+        return headers
+
+
+class CachedAWSV4SignerAuth(AWSV4SignerAuth):
+    """requests auth for the sync OpenSearch client, signing with CachedAWSV4Signer."""
+
+    def __init__(self, credentials: CachedCredentialsProvider, region: str, service: str = "es"):
+        super().__init__(credentials, region, service)
+        self.signer = CachedAWSV4Signer(credentials, region, service)
+
+
+class CachedAWSV4SignerAsyncAuth(AWSV4SignerAsyncAuth):
+    """Auth for the async OpenSearch client, signing with CachedAWSV4Signer."""
+
+    def __init__(self, credentials: CachedCredentialsProvider, region: str, service: str = "es"):
+        super().__init__(credentials, region, service)
+        self.signer = CachedAWSV4Signer(credentials, region, service)
+
+    def _sign_request(
+        self, method: str, url: str, query_string: str | None, body: str | bytes | None
+    ) -> dict[str, str]:
+        return self.signer.sign(method, url, body)
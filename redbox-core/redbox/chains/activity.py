@@ -2,7 +2,7 @@
 Activity Log methods and classes
 """
 
-from langchain_core.callbacks.manager import dispatch_custom_event
+from langchain_core.callbacks.manager import adispatch_custom_event, dispatch_custom_event
 
 from redbox.models.graph import RedboxActivityEvent, RedboxEventType
 
@@ -16,3 +16,9 @@ def log_activity(activity_event: str | RedboxActivityEvent):
 
 def _log_activity(event: RedboxActivityEvent):
     dispatch_custom_event(name=RedboxEventType.activity, data=event)
+
+
+async def alog_activity(activity_event: str | RedboxActivityEvent):
+    if isinstance(activity_event, str):
+        activity_event = RedboxActivityEvent(message=activity_event)
+    await adispatch_custom_event(name=RedboxEventType.activity, data=activity_event)
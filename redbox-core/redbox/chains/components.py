@@ -2,20 +2,26 @@ import logging
 import os
 from functools import cache
 
+import boto3
+import requests
 import tiktoken
+from botocore.config import Config
 from dotenv import load_dotenv
 from langchain.chat_models import init_chat_model
 from langchain_community.embeddings import BedrockEmbeddings
 from langchain_core.embeddings import Embeddings, FakeEmbeddings
 from langchain_core.tools import StructuredTool
 from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 from langchain_core.utils import convert_to_secret_str
 from langchain_elasticsearch import ElasticsearchRetriever
 from langchain_openai.embeddings import AzureOpenAIEmbeddings, OpenAIEmbeddings
+from requests.adapters import HTTPAdapter
 
 
+from redbox.cache import TTLCache
 from redbox.chains.parser import StreamingJsonOutputParser
-from redbox.models.settings import ChatLLMBackend, Settings, catch_403
+from redbox.models.settings import ChatLLMBackend, Settings, catch_403, get_settings
 from redbox.retriever import AllElasticsearchRetriever, ParameterisedElasticsearchRetriever, OpenSearchRetriever, MetadataRetriever
 from langchain_community.embeddings import BedrockEmbeddings
 from langchain.chat_models import init_chat_model
@@ -27,12 +33,14 @@ logger.warning("inside components.py")
 load_dotenv()
 
 
-def get_chat_llm(model: ChatLLMBackend, tools: list[StructuredTool] | None = None):
+def get_chat_llm(model: ChatLLMBackend, tools: list[StructuredTool] | None = None, max_tokens: int | None = None):
     logger.debug("initialising model=%s model_provider=%s tools=%s", model.name, model.provider, tools)
+    model_kwargs = {"max_tokens": max_tokens} if max_tokens else {}
     chat_model = init_chat_model(
         model=model.name,
         model_provider=model.provider,
         configurable_fields=["base_url"],
+        **model_kwargs,
     )
     if tools:
         chat_model = chat_model.bind_tools(tools)
@@ -44,19 +52,54 @@ def get_tokeniser() -> tiktoken.Encoding:
     return tiktoken.get_encoding("cl100k_base")
 
 
-def get_azure_embeddings(env: Settings):
+@cache
+def get_map_cache() -> TTLCache:
+    env = get_settings()
+    return TTLCache(max_size=env.map_cache_max_size, ttl_seconds=env.map_cache_ttl_seconds)
+
+
+@cache
+def get_condense_cache() -> TTLCache:
+    env = get_settings()
+    return TTLCache(max_size=env.condense_cache_max_size, ttl_seconds=env.condense_cache_ttl_seconds)
+
+
+@cache
+def get_tool_executor() -> ContextThreadPoolExecutor:
+    """Thread pool shared by every request for running tools concurrently. Copies callback context to threads."""
+    env = get_settings()
+    return ContextThreadPoolExecutor(max_workers=env.tool_max_workers, thread_name_prefix="redbox-tool")
+
+
+@cache
+def get_external_search_session() -> requests.Session:
+    """HTTP session shared by the gov.uk and Wikipedia search tools so connections are kept alive between calls."""
+    env = get_settings()
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=env.tool_max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": "redbox (https://github.com/i-dot-ai/redbox)"})
+    return session
+
+
+@cache
+def get_external_search_cache() -> TTLCache:
+    env = get_settings()
+    return TTLCache(max_size=env.external_search_cache_max_size, ttl_seconds=env.external_search_cache_ttl_seconds)
+
+
+def get_azure_embeddings(env: Settings, timeout_seconds: float | None = None):
     return AzureOpenAIEmbeddings(
         api_key=convert_to_secret_str(env.embedding_openai_api_key),
         azure_endpoint=env.embedding_azure_openai_endpoint,
         api_version=env.azure_api_version_embeddings,
         model=env.embedding_backend,
-        max_retries=env.embedding_max_retries,
-        retry_min_seconds=env.embedding_retry_min_seconds,
-        retry_max_seconds=env.embedding_retry_max_seconds,
+        **_embedding_retry_kwargs(env, timeout_seconds),
     )
 
 
-def get_openai_embeddings(env: Settings):
+def get_openai_embeddings(env: Settings, timeout_seconds: float | None = None):
     os.environ["OPENAI_API_KEY"] = env.embedding_openai_api_key
     os.environ["OPENAI_ENDPOINT"] = env.embedding_openai_base_url
     return OpenAIEmbeddings(
@@ -64,22 +107,44 @@ def get_openai_embeddings(env: Settings):
         base_url=env.embedding_openai_base_url,
         model=env.embedding_model,
         chunk_size=env.embedding_max_batch_size,
+        **({"request_timeout": timeout_seconds, "max_retries": 0} if timeout_seconds else {}),
     )
 
 
-def get_aws_embeddings(env: Settings):
+def get_aws_embeddings(env: Settings, timeout_seconds: float | None = None):
+    if timeout_seconds:
+        client = boto3.client(
+            "bedrock-runtime",
+            region_name=env.aws_region,
+            config=Config(
+                connect_timeout=timeout_seconds, read_timeout=timeout_seconds, retries={"total_max_attempts": 1}
+            ),
+        )
+        return BedrockEmbeddings(client=client, region_name=env.aws_region, model_id=env.embedding_backend)
     return BedrockEmbeddings(region_name=env.aws_region, model_id=env.embedding_backend)
 
 
-def get_embeddings(env: Settings) -> Embeddings:
+def _embedding_retry_kwargs(env: Settings, timeout_seconds: float | None) -> dict:
+    if timeout_seconds:
+        return {"request_timeout": timeout_seconds, "max_retries": 0}
+    return {
+        "max_retries": env.embedding_max_retries,
+        "retry_min_seconds": env.embedding_retry_min_seconds,
+        "retry_max_seconds": env.embedding_retry_max_seconds,
+    }
+
+
+def get_embeddings(env: Settings, timeout_seconds: float | None = None) -> Embeddings:
+    """The configured embedding model. With timeout_seconds, each request gives up after that long without retrying,
+    for callers such as tools that can't wait through the usual retries."""
     if env.embedding_backend == "text-embedding-3-large":
-        return get_azure_embeddings(env)
+        return get_azure_embeddings(env, timeout_seconds)
     if env.embedding_backend == "text-embedding-ada-002":
-        return get_openai_embeddings(env)
+        return get_openai_embeddings(env, timeout_seconds)
     if env.embedding_backend == "fake":
         return FakeEmbeddings(size=3072)
     if env.embedding_backend == "amazon.titan-embed-text-v2:0":
-        return get_aws_embeddings(env)
+        return get_aws_embeddings(env, timeout_seconds)
     raise Exception("No configured embedding model")
 
 @catch_403
@@ -87,6 +152,7 @@ def get_all_chunks_retriever(env: Settings) -> OpenSearchRetriever:
     logger.warning("inside components.py get_all_chunks_retriever")
     return AllElasticsearchRetriever(
         es_client=env.elasticsearch_client(),
+        async_es_client=env.async_elasticsearch_client(),
         index_name=env.elastic_chunk_alias,
     )
 
@@ -101,6 +167,7 @@ def get_parameterised_retriever(env: Settings, embeddings: Embeddings | None = N
     logger.warning("inside components.py inside get_parameterised_retriever")
     return ParameterisedElasticsearchRetriever(
         es_client=env.elasticsearch_client(),
+        async_es_client=env.async_elasticsearch_client(),
         index_name=env.elastic_chunk_alias,
         embedding_model=embeddings or get_embeddings(env),
         embedding_field_name=env.embedding_document_field_name,
@@ -111,6 +178,7 @@ def get_metadata_retriever(env: Settings):
     logger.warning("inside components.py inside get_metadata_retriever")
     return MetadataRetriever(
         es_client=env.elasticsearch_client(),
+        async_es_client=env.async_elasticsearch_client(),
         index_name=env.elastic_chunk_alias,
     )
 
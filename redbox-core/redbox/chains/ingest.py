@@ -2,12 +2,12 @@ import logging
 from functools import partial
 from io import BytesIO
 from typing import TYPE_CHECKING, Iterator
-import boto3
 
 from langchain.vectorstores import VectorStore
 from langchain_core.documents.base import Document
 from langchain_core.runnables import Runnable, RunnableLambda, chain
 
+from redbox.aws import get_caller_arn, get_credentials_provider
 from redbox.loader.loaders import UnstructuredChunkLoader
 from redbox.models.settings import Settings
 from opensearchpy.exceptions import AuthorizationException
@@ -74,13 +74,13 @@ def ingest_from_loader(
             try:
                 log.warning("Attempting to add documents to vectorstore...")
 
-                credentials = boto3.Session().get_credentials()
+                credentials = get_credentials_provider().get_frozen_credentials()
                 if not credentials.token:
                     log.warning("Warning: No session token, request may be anonymous.")
 
                 log.warning(f"Client host: {vectorstore.client.transport.hosts}")
 
-                log.warning(f"Current IAM Role ARN: {boto3.client('sts').get_caller_identity()['Arn']}")
+                log.warning(f"Current IAM Role ARN: {get_caller_arn()}")
 
                 #index_exists = vectorstore.client.indices.exists(index="redbox-data-chunk")
                 #log.warning(f"Index exists check: {index_exists}")
@@ -14,6 +14,86 @@ from pydantic import BaseModel
 from redbox.models.graph import RedboxEventType
 
 
+class StreamedJsonField:
+    """
+    Scans JSON text as it arrives and returns the decoded content of one top level string field.
+
+    Each character is looked at once, so the cost of streaming the field is linear in the length of the response.
+    Text before the opening brace (such as a markdown fence) is skipped.
+    """
+
+    def __init__(self, field_name: str):
+        self.field_name = field_name
+        self._depth = 0
+        self._expecting_key = False
+        self._in_string = False
+        self._in_key = False
+        self._in_field = False
+        self._escape = ""
+        self._high_surrogate = ""
+        self._key_chars: list[str] = []
+        self._last_key: str | None = None
+
+    def feed(self, text: str) -> str:
+        """Consumes the next piece of text, returning any new content of the field."""
+        new_content: list[str] = []
+        for char in text:
+            if self._in_string:
+                if self._escape:
+                    self._escape += char
+                    if self._escape[1] == "u" and len(self._escape) < 6:
+                        continue
+                    self._add_string_content(self._decode_escape(self._escape), new_content)
+                    self._escape = ""
+                elif char == "\\":
+                    self._escape = char
+                elif char == '"':
+                    self._close_string()
+                else:
+                    self._add_string_content(char, new_content)
+            elif self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._expecting_key = True
+            elif char == '"':
+                self._in_string = True
+                self._in_key = self._depth == 1 and self._expecting_key
+                self._in_field = self._depth == 1 and not self._expecting_key and self._last_key == self.field_name
+                self._key_chars = []
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+            elif self._depth == 1 and char == ":":
+                self._expecting_key = False
+            elif self._depth == 1 and char == ",":
+                self._expecting_key = True
+        return "".join(new_content)
+
+    def _add_string_content(self, content: str, new_content: list[str]):
+        if self._in_field:
+            new_content.append(content)
+        elif self._in_key:
+            self._key_chars.append(content)
+
+    def _close_string(self):
+        if self._in_key:
+            self._last_key = "".join(self._key_chars)
+        self._in_string = self._in_key = self._in_field = False
+
+    def _decode_escape(self, escape: str) -> str:
+        # Surrogate pairs arrive as two escapes and are only meaningful together
+        escape = self._high_surrogate + escape
+        self._high_surrogate = ""
+        if len(escape) == 6 and escape[1] == "u" and escape[2] in "dD" and escape[3] in "89abAB":
+            self._high_surrogate = escape
+            return ""
+        try:
+            return json.loads(f'"{escape}"')
+        except json.JSONDecodeError:
+            return escape
+
+
 class StreamingJsonOutputParser(BaseCumulativeTransformOutputParser[Any]):
     """
     A Pydantic output parser which emits token events for a given field from the JSON intermediate stage.
@@ -22,7 +102,7 @@ class StreamingJsonOutputParser(BaseCumulativeTransformOutputParser[Any]):
 
     This class is mostly based on existing implementations in BaseCumulativeTransformOutputParser and JsonOutputParser.
     This custom parser is here to allow emitting custom events and maintaining state for each parse, every invocation of the
-    parser tracks the current length of the answer field to allow emitting delta token events.
+    parser scans the stream with a StreamedJsonField to emit delta token events and validates once at the end.
     """
 
     diff: bool = False  # Ignored
@@ -46,37 +126,25 @@ class StreamingJsonOutputParser(BaseCumulativeTransformOutputParser[Any]):
         return chunk_gen
 
     def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[Any]:
-        acc_gen: Union[GenerationChunk, ChatGenerationChunk, None] = None
-        field_length_at_last_run: int = 0
-        parsed = None
+        streamed_field = StreamedJsonField(self.name_of_streamed_field)
+        texts: list[str] = []
         for chunk in input:
-            chunk_gen = self._to_generation_chunk(chunk)
-            acc_gen = chunk_gen if acc_gen is None else acc_gen + chunk_gen  # type: ignore[operator]
-
-            if parsed := self.parse_partial_json(acc_gen.text):
-                if field_content := parsed.get(self.name_of_streamed_field):
-                    if new_tokens := field_content[field_length_at_last_run:]:
-                        dispatch_custom_event(RedboxEventType.response_tokens, data=new_tokens)
-                        field_length_at_last_run = len(field_content)
-                        yield self.pydantic_schema_object.model_validate(parsed)
-        if parsed:
+            text = self._to_generation_chunk(chunk).text
+            texts.append(text)
+            if new_tokens := streamed_field.feed(text):
+                dispatch_custom_event(RedboxEventType.response_tokens, data=new_tokens)
+        if parsed := self.parse_partial_json("".join(texts)):
             yield self.pydantic_schema_object.model_validate(parsed)
 
     async def _atransform(self, input: AsyncIterator[Union[str, BaseMessage]]) -> AsyncIterator[Any]:
-        acc_gen: Union[GenerationChunk, ChatGenerationChunk, None] = None
-        field_length_at_last_run: int = 0
-        parsed = None
+        streamed_field = StreamedJsonField(self.name_of_streamed_field)
+        texts: list[str] = []
         async for chunk in input:
-            chunk_gen = self._to_generation_chunk(chunk)
-            acc_gen = chunk_gen if acc_gen is None else acc_gen + chunk_gen  # type: ignore[operator]
-
-            if parsed := self.parse_partial_json(acc_gen.text):
-                if field_content := parsed.get(self.name_of_streamed_field):
-                    if new_tokens := field_content[field_length_at_last_run:]:
-                        dispatch_custom_event(RedboxEventType.response_tokens, data=new_tokens)
-                        field_length_at_last_run = len(field_content)
-                        yield self.pydantic_schema_object.model_validate(parsed)
-        if parsed:
+            text = self._to_generation_chunk(chunk).text
+            texts.append(text)
+            if new_tokens := streamed_field.feed(text):
+                dispatch_custom_event(RedboxEventType.response_tokens, data=new_tokens)
+        if parsed := self.parse_partial_json("".join(texts)):
             yield self.pydantic_schema_object.model_validate(parsed)
 
     @property
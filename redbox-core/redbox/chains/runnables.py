@@ -1,13 +1,14 @@
 import logging
 import re
-from typing import Any, Callable, Iterable, Iterator
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
 
 from langchain_core.callbacks.manager import CallbackManagerForLLMRun, dispatch_custom_event
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
 from langchain_core.runnables import Runnable, RunnableGenerator, RunnableLambda, RunnablePassthrough, chain
 from tiktoken import Encoding
 
@@ -23,6 +24,88 @@ log = logging.getLogger()
 re_string_pattern = re.compile(r"(\S+)")
 
 
+def get_chat_message_token_count(message: ChainChatMessage, tokeniser: Encoding) -> int:
+    """Uses the token count stored with the message, only encoding messages saved without one."""
+    token_count = message.get("token_count")
+    if token_count is None:
+        return len(tokeniser.encode(message["text"]))
+    return token_count
+
+
+class CompiledChatPrompt(NamedTuple):
+    """The parts of a chat prompt that don't depend on the request being answered."""
+
+    system_message: SystemMessagePromptTemplate
+    question_message: HumanMessagePromptTemplate
+    prompts_token_count: int
+
+
+@lru_cache(maxsize=128)
+def compile_chat_prompt(
+    prompt_set: PromptSet,
+    system_info_prompt: str,
+    task_system_prompt: str,
+    persona_info_prompt: str,
+    caller_info_prompt: str,
+    task_question_prompt: str,
+    format_instructions: str,
+    tokeniser: Encoding,
+) -> CompiledChatPrompt:
+    """Parses the system and question templates and counts their tokens once per distinct set of prompts."""
+    # Set the system prompt to be our composed structure
+    # We preserve the format instructions
+    system_prompt_message = f"""
+            {system_info_prompt}
+            {task_system_prompt}
+            {persona_info_prompt}
+            {caller_info_prompt}
+            {{format_instructions}}
+            """
+    return CompiledChatPrompt(
+        system_message=SystemMessagePromptTemplate.from_template(
+            system_prompt_message, partial_variables={"format_instructions": format_instructions}
+        ),
+        question_message=HumanMessagePromptTemplate.from_template(task_question_prompt),
+        prompts_token_count=len(tokeniser.encode(task_system_prompt)) + len(tokeniser.encode(task_question_prompt)),
+    )
+
+
+def compile_request_chat_prompt(
+    state: RedboxState, prompt_set: PromptSet, tokeniser: Encoding, format_instructions: str = ""
+) -> tuple[CompiledChatPrompt, list[ChainChatMessage]]:
+    """Compiles the request's prompts and keeps as much of its chat history as fits the context window with them."""
+    ai_settings = state["request"].ai_settings
+    task_system_prompt, task_question_prompt = get_prompts(state, prompt_set)
+
+    compiled_prompt = compile_chat_prompt(
+        prompt_set=prompt_set,
+        system_info_prompt=ai_settings.system_info_prompt,
+        task_system_prompt=task_system_prompt,
+        persona_info_prompt=ai_settings.persona_info_prompt,
+        caller_info_prompt=ai_settings.caller_info_prompt,
+        task_question_prompt=task_question_prompt,
+        format_instructions=format_instructions,
+        tokeniser=tokeniser,
+    )
+    chat_history_budget = (
+        ai_settings.context_window_size - ai_settings.llm_max_tokens - compiled_prompt.prompts_token_count
+    )
+
+    if chat_history_budget <= 0:
+        raise QuestionLengthError
+
+    # Keep the longest suffix of the history whose running token total stays inside the budget
+    chat_history = state["request"].chat_history
+    history_tokens = 0
+    history_start = len(chat_history)
+    for msg in reversed(chat_history):
+        history_tokens += get_chat_message_token_count(msg, tokeniser)
+        if history_tokens >= chat_history_budget:
+            break
+        history_start -= 1
+    return compiled_prompt, chat_history[history_start:]
+
+
 def build_chat_prompt_from_messages_runnable(
     prompt_set: PromptSet,
     tokeniser: Encoding = None,
@@ -38,55 +121,41 @@ def build_chat_prompt_from_messages_runnable(
         ai_settings = state["request"].ai_settings
         _tokeniser = tokeniser or get_tokeniser()
         _additional_variables = additional_variables or dict()
-        task_system_prompt, task_question_prompt = get_prompts(state, prompt_set)
 
         log.debug("Setting chat prompt")
-        # Set the system prompt to be our composed structure
-        # We preserve the format instructions
-        system_prompt_message = f"""
-            {ai_settings.system_info_prompt}
-            {task_system_prompt}
-            {ai_settings.persona_info_prompt}
-            {ai_settings.caller_info_prompt}
-            {{format_instructions}}
-            """
-        prompts_budget = len(_tokeniser.encode(task_system_prompt)) + len(_tokeniser.encode(task_question_prompt))
-        chat_history_budget = ai_settings.context_window_size - ai_settings.llm_max_tokens - prompts_budget
-
-        if chat_history_budget <= 0:
-            raise QuestionLengthError
-
-        truncated_history: list[ChainChatMessage] = []
-        for msg in state["request"].chat_history[::-1]:
-            chat_history_budget -= len(_tokeniser.encode(msg["text"]))
-            if chat_history_budget <= 0:
-                break
-            else:
-                truncated_history.insert(0, msg)
-
-        prompt_template_context = (
-            state["request"].model_dump()
-            | {"messages": state.get("messages")}
-            | {
-                "text": state.get("text"),
-                "formatted_documents": format_documents(flatten_document_state(state.get("documents"))),
-                "tool_calls": format_toolstate(state.get("tool_calls")),
-                "system_info": ai_settings.system_info_prompt,
-                "persona_info": ai_settings.persona_info_prompt,
-                "caller_info": ai_settings.caller_info_prompt,
-                "task_prompt": task_system_prompt,
-            }
-            | _additional_variables
+        compiled_prompt, truncated_history = compile_request_chat_prompt(
+            state, prompt_set, _tokeniser, format_instructions
         )
 
-        return ChatPromptTemplate(
+        prompt_template = ChatPromptTemplate(
             messages=(
-                [("system", system_prompt_message)]
+                [compiled_prompt.system_message]
                 + [(msg["role"], msg["text"]) for msg in truncated_history]
-                + [("user", task_question_prompt)]
+                + [compiled_prompt.question_message]
             ),
-            partial_variables={"format_instructions": format_instructions},
-        ).invoke(prompt_template_context)
+        )
+
+        # Only build the variables the template uses, formatting documents and dumping the request is costly
+        state_variables: dict[str, Callable[[], Any]] = {
+            "messages": lambda: state.get("messages"),
+            "text": lambda: state.get("text"),
+            "formatted_documents": lambda: format_documents(flatten_document_state(state.get("documents"))),
+            "tool_calls": lambda: format_toolstate(state.get("tool_calls")),
+            "system_info": lambda: ai_settings.system_info_prompt,
+            "persona_info": lambda: ai_settings.persona_info_prompt,
+            "caller_info": lambda: ai_settings.caller_info_prompt,
+            "task_prompt": lambda: get_prompts(state, prompt_set)[0],
+        }
+        prompt_template_context = {}
+        for variable in prompt_template.input_variables:
+            if variable in _additional_variables:
+                prompt_template_context[variable] = _additional_variables[variable]
+            elif variable in state_variables:
+                prompt_template_context[variable] = state_variables[variable]()
+            elif variable in type(state["request"]).model_fields:
+                prompt_template_context[variable] = state["request"].model_dump(include={variable})[variable]
+
+        return prompt_template.invoke(prompt_template_context)
 
     return _chat_prompt_from_messages
 
@@ -146,15 +215,16 @@ def build_self_route_output_parser(
     """
 
     def _self_route_output_parser(chunks: Iterable[AIMessageChunk]) -> Iterable[str]:
+        # Only the first max_tokens_to_check chunks are ever checked, the rest stream straight through
+        checked_chunks: list[str] = []
         current_content = ""
-        token_count = 0
         for chunk in chunks:
-            current_content += chunk.content
-            token_count += 1
+            checked_chunks.append(chunk.content)
+            current_content = "".join(checked_chunks)
             if match_condition(current_content):
                 yield current_content
                 return
-            elif token_count > max_tokens_to_check:
+            elif len(checked_chunks) > max_tokens_to_check:
                 break
         if final_response_chain:
             dispatch_custom_event(RedboxEventType.response_tokens, current_content)
@@ -1,32 +1,87 @@
+import asyncio
+import hashlib
 import json
 import logging
 import re
 import textwrap
 from collections.abc import Callable
+from concurrent.futures import wait
 from functools import reduce
+from string import Formatter
 from typing import Any, Iterable
 from uuid import uuid4
 
 from langchain.schema import StrOutputParser
 from langchain_core.callbacks.manager import dispatch_custom_event
 from langchain_core.documents import Document
-from langchain_core.messages import AIMessage, HumanMessage
-from langchain_core.runnables import Runnable, RunnableLambda, RunnableParallel
+from langchain_core.messages import AIMessage, HumanMessage, ToolCall
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda, RunnableParallel
 from langchain_core.tools import StructuredTool
 from langchain_core.vectorstores import VectorStoreRetriever
 
-from redbox.chains.activity import log_activity
-from redbox.chains.components import get_chat_llm, get_tokeniser
-from redbox.chains.runnables import CannedChatLLM, build_llm_chain
+from redbox.cache import TTLCache
+from redbox.chains.activity import alog_activity, log_activity
+from redbox.chains.components import get_chat_llm, get_condense_cache, get_tokeniser, get_tool_executor
+from redbox.chains.runnables import CannedChatLLM, build_llm_chain, compile_request_chat_prompt
 from redbox.graph.nodes.tools import get_log_formatter_for_retrieval_tool, has_injected_state, is_valid_tool
 from redbox.models import ChatRoute
-from redbox.models.chain import DocumentState, PromptSet, RedboxState, RequestMetadata, merge_redbox_state_updates
+from redbox.models.chain import (
+    DocumentState,
+    PromptSet,
+    RedboxState,
+    RequestMetadata,
+    get_prompts,
+    merge_redbox_state_updates,
+)
 from redbox.models.graph import ROUTE_NAME_TAG, SOURCE_DOCUMENTS_TAG, RedboxActivityEvent, RedboxEventType
 from redbox.transform import combine_documents, flatten_document_state
 
 log = logging.getLogger(__name__)
 re_keyword_pattern = re.compile(r"@(\w+)")
 
+# Prompt variables that don't change a map result for a given chunk
+MAP_CACHE_STATIC_VARIABLES = frozenset(
+    {"formatted_documents", "system_info", "persona_info", "caller_info", "task_prompt", "format_instructions"}
+)
+
+
+def _hash(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+def build_map_cache_key(state: RedboxState, prompt_set: PromptSet, documents: list[Document]) -> tuple | None:
+    """Keys a map result on its chunk uuids, prompts, chat backend, the chat history the prompt keeps and, if the
+    prompts use it, the question.
+
+    Returns None when the prompts reference anything else from the request, as the result can't be reused.
+    """
+    ai_settings = state["request"].ai_settings
+    system_prompt, question_prompt = get_prompts(state, prompt_set)
+    prompts = (
+        ai_settings.system_info_prompt,
+        system_prompt,
+        ai_settings.persona_info_prompt,
+        ai_settings.caller_info_prompt,
+        question_prompt,
+    )
+    prompt_variables = {name for prompt in prompts for _, name, _, _ in Formatter().parse(prompt) if name}
+
+    if prompt_variables - MAP_CACHE_STATIC_VARIABLES - {"question"}:
+        return None
+
+    question_hash = _hash(state["request"].question) if "question" in prompt_variables else None
+    _, chat_history = compile_request_chat_prompt(state, prompt_set, get_tokeniser())
+
+    return (
+        tuple(str(document.metadata["uuid"]) for document in documents),
+        _hash(*prompts),
+        ai_settings.chat_backend.model_dump_json(),
+        ai_settings.context_window_size,
+        ai_settings.llm_max_tokens,
+        _hash(*(f"{message['role']}:{message['text']}" for message in chat_history)),
+        question_hash,
+    )
+
 
 # Patterns: functions that build processes
 
@@ -52,6 +107,63 @@ def build_retrieve_pattern(
     return _retriever
 
 
+def question_word_overlap(question: str, other_question: str) -> float:
+    """The Jaccard similarity of the lowercased words in two questions."""
+    words, other_words = set(question.lower().split()), set(other_question.lower().split())
+    if not words or not other_words:
+        return float(words == other_words)
+    return len(words & other_words) / len(words | other_words)
+
+
+def build_speculative_retrieve_pattern(
+    retriever: VectorStoreRetriever,
+    structure_func: Callable[[list[Document]], DocumentState],
+    final_source_chain: bool = False,
+) -> Runnable[RedboxState, dict[str, Any]]:
+    """Returns a Runnable that condenses the question and sets state["documents"] in one step.
+
+    Documents are retrieved for the raw question while it's being condensed. If the condensed question's words
+    overlap the raw question's by at least ai_settings.speculative_retrieval_threshold those documents are used,
+    otherwise retrieval is repeated with the condensed question.
+
+    As the speculative documents may be discarded, sources are reported once the documents are chosen rather
+    than from the retriever.
+    """
+    condense = build_condense_pattern(cache=get_condense_cache())
+    retrieve = retriever | structure_func
+
+    def _retrieve_for_raw_question(state: RedboxState) -> DocumentState:
+        return retrieve.invoke(
+            RedboxState(request=state["request"], messages=[HumanMessage(content=state["request"].question)])
+        )
+
+    speculate = RunnableParallel(condense_update=condense, documents=_retrieve_for_raw_question)
+
+    @RunnableLambda
+    def _speculative_retrieve(state: RedboxState) -> dict[str, Any]:
+        speculation = speculate.invoke(state)
+        condense_update = speculation["condense_update"]
+        condensed_question = condense_update["messages"][-1].content
+        documents = speculation["documents"]
+
+        overlap = question_word_overlap(state["request"].question, condensed_question)
+        if overlap < state["request"].ai_settings.speculative_retrieval_threshold:
+            log.debug("Condensed question overlaps raw question by %.2f, retrieving again", overlap)
+            documents = retrieve.invoke(
+                RedboxState(
+                    request=state["request"],
+                    messages=[*state.get("messages", []), *condense_update["messages"]],
+                )
+            )
+
+        if final_source_chain:
+            dispatch_custom_event(RedboxEventType.on_source_report, flatten_document_state(documents))
+
+        return condense_update | {"documents": documents}
+
+    return _speculative_retrieve
+
+
 def build_chat_pattern(
     prompt_set: PromptSet,
     tools: list[StructuredTool] | None = None,
@@ -73,10 +185,46 @@ def build_chat_pattern(
     return _chat
 
 
+def build_condense_pattern(cache: TTLCache | None = None) -> Runnable[RedboxState, dict[str, Any]]:
+    """Returns a Runnable that uses state["request"] to add a standalone version of the question to state["messages"].
+
+    With no chat history there's nothing to condense, so the question is used as it is without calling the LLM.
+    Otherwise ai_settings.condense_backend is used, falling back to the chat_backend.
+
+    If a cache is supplied condensed questions are stored against the chat and the number of messages in it.
+    """
+
+    @RunnableLambda
+    def _condense(state: RedboxState) -> dict[str, Any]:
+        request = state["request"]
+        if not request.chat_history:
+            return {"messages": [AIMessage(content=request.question)]}
+
+        backend = request.ai_settings.condense_backend or request.ai_settings.chat_backend
+        cache_key = None
+        if cache is not None and request.chat_id is not None:
+            cache_key = (request.chat_id, len(request.chat_history), backend.provider, backend.name)
+            if (condensed_question := cache.get(cache_key)) is not None:
+                return {"messages": [AIMessage(content=condensed_question)]}
+
+        condense_update = build_llm_chain(
+            prompt_set=PromptSet.CondenseQuestion,
+            llm=get_chat_llm(backend),
+        ).invoke(state)
+
+        if cache_key is not None:
+            cache.set(cache_key, condense_update["messages"][-1].content)
+
+        return condense_update
+
+    return _condense
+
+
 def build_merge_pattern(
     prompt_set: PromptSet,
     tools: list[StructuredTool] | None = None,
     final_response_chain: bool = False,
+    cache: TTLCache | None = None,
 ) -> Runnable[RedboxState, dict[str, Any]]:
     """Returns a Runnable that uses state["request"] and state["documents"] to return one item in state["documents"].
 
@@ -87,6 +235,9 @@ def build_merge_pattern(
     When used without a send, the first Document receieved defines the metadata.
 
     If tools are supplied, can also set state["tool_calls"].
+
+    If a cache is supplied, LLM responses are stored against build_map_cache_key and reused
+    when the same documents are merged again with the same prompts.
     """
     tokeniser = get_tokeniser()
 
@@ -99,32 +250,42 @@ def build_merge_pattern(
 
         flattened_documents = flatten_document_state(state["documents"])
 
+        cache_key = build_map_cache_key(state, prompt_set, flattened_documents) if cache is not None else None
+        cached_content = cache.get(cache_key) if cache_key is not None else None
+
         merged_document = reduce(lambda left, right: combine_documents(left, right), flattened_documents)
+        merged_document = Document(page_content=merged_document.page_content, metadata=merged_document.metadata.copy())
 
-        merge_state = RedboxState(
-            request=state["request"],
-            documents={merged_document.metadata["uri"]: {merged_document.metadata["uuid"]: merged_document}},
-        )
+        if cached_content is not None:
+            log.debug("Map cache hit for %s document(s)", len(flattened_documents))
+            merged_document.page_content, merged_document.metadata["token_count"] = cached_content
+            request_metadata = None
+        else:
+            merge_state = RedboxState(
+                request=state["request"],
+                documents={merged_document.metadata["uri"]: {merged_document.metadata["uuid"]: merged_document}},
+            )
+
+            merge_response = build_llm_chain(
+                prompt_set=prompt_set, llm=llm, final_response_chain=final_response_chain
+            ).invoke(merge_state)
 
-        merge_response = build_llm_chain(
-            prompt_set=prompt_set, llm=llm, final_response_chain=final_response_chain
-        ).invoke(merge_state)
+            merged_document.page_content = merge_response["messages"][-1].content
+            request_metadata = merge_response["metadata"]
+            merged_document.metadata["token_count"] = len(tokeniser.encode(merged_document.page_content))
 
-        merged_document.page_content = merge_response["messages"][-1].content
-        request_metadata = merge_response["metadata"]
-        merged_document.metadata["token_count"] = len(tokeniser.encode(merged_document.page_content))
+            if cache_key is not None:
+                cache.set(cache_key, (merged_document.page_content, merged_document.metadata["token_count"]))
 
         group_uuid = next(iter(state["documents"] or {}), uuid4())
         document_uuid = merged_document.metadata.get("uuid", uuid4())
 
         # Clear old documents, add new one
-        document_state = state["documents"].copy()
+        document_state = {group: dict.fromkeys(documents) for group, documents in state["documents"].items()}
+        document_state.setdefault(group_uuid, {})[document_uuid] = merged_document
 
-        for group in document_state:
-            for document in document_state[group]:
-                document_state[group][document] = None
-
-        document_state[group_uuid][document_uuid] = merged_document
+        if request_metadata is None:
+            return {"documents": document_state}
 
         return {"documents": document_state, "metadata": request_metadata}
 
@@ -162,6 +323,48 @@ def build_stuff_pattern(
     return _stuff
 
 
+def build_self_route_classifier_pattern(
+    retriever: VectorStoreRetriever,
+    fallback_retriever: VectorStoreRetriever,
+    structure_func: Callable[[list[Document]], DocumentState],
+    conditional: Callable[[str], bool],
+    max_tokens: int = 8,
+) -> Runnable[RedboxState, dict[str, Any]]:
+    """Returns a Runnable that decides whether the question can be answered from the retriever's documents.
+
+    The question is condensed, retrieved and put to the PromptSet.SelfRoute prompt with the response capped at
+    max_tokens, which is enough to see whether the LLM starts answering or replies 'unanswerable'. The response is
+    added to state["messages"] for build_set_self_route_from_llm_answer.
+
+    The fallback_retriever's documents are fetched in parallel. If the conditional is true for the response they
+    replace the retriever's in state["documents"], so the fallback route can start without another retrieval.
+    """
+    condense = build_condense_pattern(cache=get_condense_cache())
+
+    @RunnableLambda
+    def _probe(state: RedboxState) -> dict[str, Any]:
+        condense_update = condense.invoke(state)
+        probe_state = RedboxState(
+            request=state["request"],
+            messages=[*state.get("messages", []), *condense_update["messages"]],
+        )
+        probe_state["documents"] = structure_func(retriever.invoke(probe_state))
+
+        llm = get_chat_llm(state["request"].ai_settings.chat_backend, max_tokens=max_tokens)
+        probe_update = build_llm_chain(prompt_set=PromptSet.SelfRoute, llm=llm).invoke(probe_state)
+
+        return merge_redbox_state_updates(condense_update, probe_update) | {"documents": probe_state["documents"]}
+
+    @RunnableLambda
+    def _classify(results: dict[str, Any]) -> dict[str, Any]:
+        probe_update = results["probe"]
+        if conditional(probe_update["messages"][-1].content):
+            return probe_update | {"documents": results["fallback_documents"]}
+        return probe_update
+
+    return RunnableParallel(probe=_probe, fallback_documents=fallback_retriever | structure_func) | _classify
+
+
 ## Utility patterns
 
 
@@ -251,11 +454,20 @@ def build_error_pattern(text: str, route_name: str | None) -> Runnable[RedboxSta
 
 
 def build_tool_pattern(
-    tools=list[StructuredTool], final_source_chain: bool = False
+    tools=list[StructuredTool], final_source_chain: bool = False, timeout_seconds: float | None = 30
 ) -> Runnable[RedboxState, dict[str, Any]]:
     """Builds a process that takes state["tool_calls"] and returns state updates.
 
     The state attributes affected are defined in the tool.
+
+    Uncalled tools run concurrently, in threads or as coroutines depending on how the process is invoked,
+    so a step takes as long as its slowest tool. A tool that fails or takes longer than timeout_seconds is
+    marked as called without contributing to the state, and the other tools' results are kept.
+
+    A timed out tool that hasn't started is cancelled, but one already running in a thread of the shared
+    get_tool_executor() pool can't be stopped, and holds its thread until it returns. Tools must therefore bound
+    their own blocking calls by a timeout below timeout_seconds, as the search tools do, or repeated timeouts would
+    use up the pool.
     """
     tools_by_name: dict[str, StructuredTool] = {}
 
@@ -265,20 +477,14 @@ def build_tool_pattern(
             raise ValueError(msg)
         tools_by_name[tool.name] = tool
 
-    @RunnableLambda
-    def _tool(state: RedboxState) -> dict[str, Any]:
-        state_updates: list[dict] = []
-
-        tool_calls = state.get("tool_calls", {})
-        if not tool_calls:
-            log.warning("No tool calls found in state")
-            return {}
+    def _get_pending_calls(state: RedboxState) -> list[tuple[str, ToolCall, StructuredTool, dict[str, Any]]]:
+        pending_calls = []
 
-        for tool_id, tool_call_dict in tool_calls.items():
+        for tool_id, tool_call_dict in state.get("tool_calls", {}).items():
             tool_call = tool_call_dict["tool"]
 
             if not tool_call_dict["called"]:
-                tool = tools_by_name[tool_call["name"]]
+                tool = tools_by_name.get(tool_call["name"])
 
                 if tool is None:
                     log.warning(f"Tool {tool_call['name']} not found")
@@ -290,28 +496,84 @@ def build_tool_pattern(
                 if has_injected_state(tool):
                     args["state"] = state
 
-                # Invoke the tool
-                try:
-                    result_state_update = tool.invoke(args) or {}
+                pending_calls.append((tool_id, tool_call, tool, args))
+
+        return pending_calls
+
+    def _to_state_update(tool_id: str, tool_call: ToolCall, result: dict[str, Any] | BaseException | None) -> dict:
+        tool_called_state_update = {"tool_calls": {tool_id: {"called": True, "tool": tool_call}}}
+
+        if isinstance(result, BaseException):
+            log.warning(f"Error invoking tool {tool_call['name']}: {result!r} \n")
+            return tool_called_state_update
+
+        return (result or {}) | tool_called_state_update
+
+    def _merge(state_updates: list[dict]) -> dict[str, Any]:
+        if state_updates:
+            return merge_redbox_state_updates(state_updates[0], state_updates[1:])
+        return {}
+
+    def _tool(state: RedboxState, config: RunnableConfig) -> dict[str, Any]:
+        pending_calls = _get_pending_calls(state)
+        if not pending_calls:
+            log.warning("No tool calls found in state")
+            return {}
+
+        executor = get_tool_executor()
+        futures = [executor.submit(tool.invoke, args, config) for _, _, tool, args in pending_calls]
+        wait(futures, timeout=timeout_seconds)
+
+        state_updates = []
+        for (tool_id, tool_call, _, _), future in zip(pending_calls, futures, strict=True):
+            if not future.done():
+                future.cancel()
+                result = TimeoutError(f"No result after {timeout_seconds}s")
+            else:
+                result = future.exception() or future.result()
+                if not isinstance(result, BaseException):
                     log_activity(
                         get_log_formatter_for_retrieval_tool(tool_call).log_result(
-                            flatten_document_state(result_state_update.get("documents"))
+                            flatten_document_state((result or {}).get("documents"))
                         )
                     )
-                    tool_called_state_update = {"tool_calls": {tool_id: {"called": True, "tool": tool_call}}}
-                    state_updates.append(result_state_update | tool_called_state_update)
-                except Exception as e:
-                    state_updates.append({"tool_calls": {tool_id: {"called": True, "tool": tool_call}}})
-                    log.warning(f"Error invoking tool {tool_call['name']}: {e} \n")
-                    return {}
+            state_updates.append(_to_state_update(tool_id, tool_call, result))
 
-        if state_updates:
-            return reduce(merge_redbox_state_updates, state_updates)
+        return _merge(state_updates)
+
+    async def _atool(state: RedboxState, config: RunnableConfig) -> dict[str, Any]:
+        pending_calls = _get_pending_calls(state)
+        if not pending_calls:
+            log.warning("No tool calls found in state")
+            return {}
+
+        async def _ainvoke(tool_call: ToolCall, tool: StructuredTool, args: dict[str, Any]) -> dict[str, Any] | None:
+            result = await asyncio.wait_for(tool.ainvoke(args, config), timeout=timeout_seconds)
+            await alog_activity(
+                get_log_formatter_for_retrieval_tool(tool_call).log_result(
+                    flatten_document_state((result or {}).get("documents"))
+                )
+            )
+            return result
+
+        results = await asyncio.gather(
+            *(_ainvoke(tool_call, tool, args) for _, tool_call, tool, args in pending_calls),
+            return_exceptions=True,
+        )
+
+        return _merge(
+            [
+                _to_state_update(tool_id, tool_call, result)
+                for (tool_id, tool_call, _, _), result in zip(pending_calls, results, strict=True)
+            ]
+        )
+
+    tool_runnable = RunnableLambda(_tool, afunc=_atool, name="_tool")
 
     if final_source_chain:
-        return RunnableLambda(_tool).with_config(tags=[SOURCE_DOCUMENTS_TAG])
+        return tool_runnable.with_config(tags=[SOURCE_DOCUMENTS_TAG])
 
-    return _tool
+    return tool_runnable
 
 
 # Raw processes: functions that need no building
@@ -5,9 +5,13 @@ from langgraph.constants import Send
 from redbox.models.chain import RedboxState
 
 
-def _copy_state(state: RedboxState, **updates) -> RedboxState:
-    kwargs = dict(state) | updates
-    return RedboxState(**kwargs)
+def _send_state(state: RedboxState, **updates) -> RedboxState:
+    """Builds the state for one Send from the shared request and the updates for its shard.
+
+    The request is immutable, so every Send references the same object. Nothing else is carried over from
+    the parent state, which keeps the cost of a fan-out proportional to the number of shards.
+    """
+    return RedboxState(request=state["request"], **updates)
 
 
 def build_document_group_send(target: str) -> Callable[[RedboxState], list[Send]]:
@@ -15,7 +19,7 @@ def build_document_group_send(target: str) -> Callable[[RedboxState], list[Send]
 
     def _group_send(state: RedboxState) -> list[Send]:
         group_send_states: list[RedboxState] = [
-            _copy_state(
+            _send_state(
                 state,
                 documents={document_group_key: document_group},
             )
@@ -31,7 +35,7 @@ def build_document_chunk_send(target: str) -> Callable[[RedboxState], list[Send]
 
     def _chunk_send(state: RedboxState) -> list[Send]:
         chunk_send_states: list[RedboxState] = [
-            _copy_state(
+            _send_state(
                 state,
                 documents={document_group_key: {document_key: document}},
             )
@@ -41,19 +45,3 @@ def build_document_chunk_send(target: str) -> Callable[[RedboxState], list[Send]
         return [Send(node=target, arg=state) for state in chunk_send_states]
 
     return _chunk_send
-
-
-def build_tool_send(target: str) -> Callable[[RedboxState], list[Send]]:
-    """Builds Sends per tool call."""
-
-    def _tool_send(state: RedboxState) -> list[Send]:
-        tool_send_states: list[RedboxState] = [
-            _copy_state(
-                state,
-                tool_calls={tool_id: tool_call},
-            )
-            for tool_id, tool_call in state["tool_calls"].items()
-        ]
-        return [Send(node=target, arg=state) for state in tool_send_states]
-
-    return _tool_send
@@ -1,33 +1,22 @@
+import asyncio
+import time
 from typing import Annotated, Any, Union, Iterable, get_args, get_origin, get_type_hints
 
 import requests
 import tiktoken
 from elasticsearch import Elasticsearch
-from langchain_community.utilities import WikipediaAPIWrapper
 from langchain_core.documents import Document
 from langchain_core.embeddings.embeddings import Embeddings
 from langchain_core.messages import ToolCall
 from langchain_core.tools import StructuredTool, Tool, tool
 from langgraph.prebuilt import InjectedState
-from opensearchpy import OpenSearch
+from opensearchpy import AsyncOpenSearch, OpenSearch
+from redbox.cache import TTLCache
 from redbox.models.chain import RedboxState
 from redbox.models.file import ChunkCreatorType, ChunkMetadata, ChunkResolution
-from redbox.retriever.queries import (
-    add_document_filter_scores_to_query,
-    build_document_query,
-)
-from redbox.retriever.retrievers import query_to_documents
-from redbox.transform import (
-    merge_documents,
-    sort_documents,
-    structure_documents_by_group_and_indices,
-)
-from redbox.transform import (
-    merge_documents,
-    sort_documents,
-    structure_documents_by_group_and_indices,
-)
-from redbox.models.settings import catch_403
+from redbox.retriever.retrievers import arun_document_search, run_document_search, search_documents
+from redbox.transform import structure_documents_by_group_and_indices
+from redbox.models.settings import LoopLocalAsyncOpenSearch, catch_403
 
 import logging
 
@@ -80,6 +69,11 @@ def has_injected_state(tool: StructuredTool) -> bool:
 
     return False
 
+
+def _deadline(timeout_seconds: float | None) -> float | None:
+    return None if timeout_seconds is None else time.monotonic() + timeout_seconds
+
+
 @catch_403
 def build_search_documents_tool(
     es_client: Union[Elasticsearch, OpenSearch],
@@ -87,8 +81,17 @@ def build_search_documents_tool(
     embedding_model: Embeddings,
     embedding_field_name: str,
     chunk_resolution: ChunkResolution | None,
+    async_es_client: AsyncOpenSearch | LoopLocalAsyncOpenSearch | None = None,
+    timeout_seconds: float | None = 10,
 ) -> Tool:
-    """Constructs a tool that searches the index and sets state["documents"]."""
+    """Constructs a tool that searches the index and sets state["documents"].
+
+    If async_es_client is given, the tool searches with it when run asynchronously.
+    Embedding the query and searching share a deadline timeout_seconds after the tool is called, after which it
+    raises TimeoutError. Each search waits only for the time left, so to keep the whole call within the deadline,
+    es_client mustn't retry and embedding_model must time out its requests, as Settings.tool_elasticsearch_client
+    and get_embeddings(timeout_seconds=...) do.
+    """
     log.warning("inside tools.py inside build_search_documents_tool")
 
     @tool
@@ -109,55 +112,62 @@ def build_search_documents_tool(
             dict[str, Any]: A collection of document objects that match the query.
         """
         log.warning("inside tools.py inside _search_documents")
-        
+
+        deadline = _deadline(timeout_seconds)
         query_vector = embedding_model.embed_query(query)
-        selected_files = state["request"].s3_keys
-        permitted_files = state["request"].permitted_s3_keys
-        ai_settings = state["request"].ai_settings
-
-        # Initial pass
-        initial_query = build_document_query(
-            query=query,
-            query_vector=query_vector,
-            selected_files=selected_files,
-            permitted_files=permitted_files,
-            embedding_field_name=embedding_field_name,
-            chunk_resolution=chunk_resolution,
-            ai_settings=ai_settings,
-        )
-        initial_documents = query_to_documents(
-            es_client=es_client, index_name=index_name, query=initial_query
-        )
+        search = search_documents(query, query_vector, state["request"], embedding_field_name, chunk_resolution)
+        sorted_documents = run_document_search(search, es_client, index_name, deadline)
 
         # Handle nothing found (as when no files are permitted)
-        if not initial_documents:
+        if not sorted_documents:
             return None
 
-        # Adjacent documents
-        with_adjacent_query = add_document_filter_scores_to_query(
-            elasticsearch_query=initial_query,
-            ai_settings=ai_settings,
-            centres=initial_documents,
-        )
-        adjacent_boosted = query_to_documents(
-            es_client=es_client, index_name=index_name, query=with_adjacent_query
-        )
+        # Return as state update
+        return {"documents": structure_documents_by_group_and_indices(sorted_documents)}
 
-        # Merge and sort
-        merged_documents = merge_documents(
-            initial=initial_documents, adjacent=adjacent_boosted
-        )
-        sorted_documents = sort_documents(documents=merged_documents)
+    async def _asearch_documents(query: str, state: Annotated[RedboxState, InjectedState]) -> dict[str, Any]:
+        deadline = _deadline(timeout_seconds)
+        query_vector = await asyncio.wait_for(embedding_model.aembed_query(query), timeout_seconds)
+        search = search_documents(query, query_vector, state["request"], embedding_field_name, chunk_resolution)
+        sorted_documents = await arun_document_search(search, async_es_client, index_name, deadline)
+
+        # Handle nothing found (as when no files are permitted)
+        if not sorted_documents:
+            return None
 
         # Return as state update
         return {"documents": structure_documents_by_group_and_indices(sorted_documents)}
 
+    if async_es_client is not None:
+        _search_documents.coroutine = _asearch_documents
+
     return _search_documents
 
 
-def build_govuk_search_tool(num_results: int = 1) -> Tool:
-    """Constructs a tool that searches gov.uk and sets state["documents"]."""
+def _external_search_cache_key(tool_name: str, query: str, *params: Any) -> tuple:
+    """Queries differing only in case or whitespace share a cache entry."""
+    return (tool_name, " ".join(query.casefold().split()), *params)
+
+
+def _copy_documents(documents: list[Document]) -> list[Document]:
+    """Copies cached documents so callers can't change what's cached through their metadata."""
+    return [document.model_copy(update={"metadata": dict(document.metadata)}) for document in documents]
+
+
+def build_govuk_search_tool(
+    num_results: int = 1,
+    url_base: str = "https://www.gov.uk",
+    session: requests.Session | None = None,
+    cache: TTLCache | None = None,
+    timeout_seconds: float | None = 10,
+) -> Tool:
+    """Constructs a tool that searches gov.uk and sets state["documents"].
+
+    Requests are made through session, so connections are reused between calls.
+    If a cache is supplied the mapped documents are stored against the normalised query and reused.
+    """
 
+    session = session or requests.Session()
     tokeniser = tiktoken.encoding_for_model("gpt-4o")
 
     @tool
@@ -176,8 +186,10 @@ def build_govuk_search_tool(num_results: int = 1) -> Tool:
         - consultations
         - appeals
         """
+        cache_key = _external_search_cache_key("_search_govuk", query, url_base, num_results)
+        if cache is not None and (cached_documents := cache.get(cache_key)) is not None:
+            return {"documents": structure_documents_by_group_and_indices(_copy_documents(cached_documents))}
 
-        url_base = "https://www.gov.uk"
         required_fields = [
             "format",
             "title",
@@ -186,7 +198,7 @@ def build_govuk_search_tool(num_results: int = 1) -> Tool:
             "link",
         ]
 
-        response = requests.get(
+        response = session.get(
             f"{url_base}/api/search.json",
             params={
                 "q": query,
@@ -194,6 +206,7 @@ def build_govuk_search_tool(num_results: int = 1) -> Tool:
                 "fields": required_fields,
             },
             headers={"Accept": "application/json"},
+            timeout=timeout_seconds,
         )
         response.raise_for_status()
         response = response.json()
@@ -215,19 +228,40 @@ def build_govuk_search_tool(num_results: int = 1) -> Tool:
                 )
             )
 
-        return {"documents": structure_documents_by_group_and_indices(mapped_documents)}
+        if cache is not None:
+            cache.set(cache_key, mapped_documents)
+
+        return {"documents": structure_documents_by_group_and_indices(_copy_documents(mapped_documents))}
 
     return _search_govuk
 
 
-def build_search_wikipedia_tool(number_wikipedia_results=1, max_chars_per_wiki_page=12000) -> Tool:
-    """Constructs a tool that searches Wikipedia"""
-    _wikipedia_wrapper = WikipediaAPIWrapper(
-        top_k_results=number_wikipedia_results,
-        doc_content_chars_max=max_chars_per_wiki_page,
-    )
+def build_search_wikipedia_tool(
+    number_wikipedia_results: int = 1,
+    max_chars_per_wiki_page: int = 12000,
+    api_url: str = "https://en.wikipedia.org/w/api.php",
+    session: requests.Session | None = None,
+    cache: TTLCache | None = None,
+    timeout_seconds: float | None = 10,
+) -> Tool:
+    """Constructs a tool that searches Wikipedia and sets state["documents"].
+
+    Pages are found and read with the MediaWiki API through session, so connections are reused between calls.
+    If a cache is supplied the mapped documents are stored against the normalised query and reused.
+    """
+
+    session = session or requests.Session()
     tokeniser = tiktoken.encoding_for_model("gpt-4o")
 
+    def _get(params: dict[str, Any]) -> dict[str, Any]:
+        response = session.get(
+            api_url,
+            params=params | {"action": "query", "format": "json", "formatversion": 2},
+            timeout=timeout_seconds,
+        )
+        response.raise_for_status()
+        return response.json()
+
     @tool
     def _search_wikipedia(query: str, state: Annotated[RedboxState, InjectedState]) -> dict[str, Any]:
         """
@@ -242,20 +276,38 @@ def build_search_wikipedia_tool(number_wikipedia_results=1, max_chars_per_wiki_p
         Returns:
             response (str): The content of the relevant Wikipedia page
         """
-        response = _wikipedia_wrapper.load(query)
-        mapped_documents = [
-            Document(
-                page_content=doc.page_content,
-                metadata=ChunkMetadata(
-                    index=i,
-                    uri=doc.metadata["source"],
-                    token_count=len(tokeniser.encode(doc.page_content)),
-                    creator_type=ChunkCreatorType.wikipedia,
-                ).model_dump(),
+        cache_key = _external_search_cache_key(
+            "_search_wikipedia", query, api_url, number_wikipedia_results, max_chars_per_wiki_page
+        )
+        if cache is not None and (cached_documents := cache.get(cache_key)) is not None:
+            return {"documents": structure_documents_by_group_and_indices(_copy_documents(cached_documents))}
+
+        search_results = _get({"list": "search", "srsearch": query, "srlimit": number_wikipedia_results, "srprop": ""})
+
+        mapped_documents = []
+        for result in search_results["query"]["search"]:
+            pages = _get(
+                {"titles": result["title"], "prop": "extracts|info", "explaintext": 1, "inprop": "url", "redirects": 1}
+            )["query"]["pages"]
+            if not pages or not (page_content := pages[0].get("extract", "")[:max_chars_per_wiki_page]):
+                continue
+
+            mapped_documents.append(
+                Document(
+                    page_content=page_content,
+                    metadata=ChunkMetadata(
+                        index=len(mapped_documents),
+                        uri=pages[0]["fullurl"],
+                        token_count=len(tokeniser.encode(page_content)),
+                        creator_type=ChunkCreatorType.wikipedia,
+                    ).model_dump(),
+                )
             )
-            for i, doc in enumerate(response)
-        ]
-        return {"documents": structure_documents_by_group_and_indices(mapped_documents)}
+
+        if cache is not None:
+            cache.set(cache_key, mapped_documents)
+
+        return {"documents": structure_documents_by_group_and_indices(_copy_documents(mapped_documents))}
 
     return _search_wikipedia
 
@@ -1,9 +1,18 @@
+from collections.abc import Callable
+from functools import partial
+from threading import Lock
+
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 from langchain_core.tools import StructuredTool
 from langchain_core.vectorstores import VectorStoreRetriever
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.graph import CompiledGraph
 
-from redbox.chains.components import get_structured_response_with_citations_parser
+from redbox.chains.components import (
+    get_condense_cache,
+    get_map_cache,
+    get_structured_response_with_citations_parser,
+)
 from redbox.chains.runnables import build_self_route_output_parser
 from redbox.graph.edges import (
     build_documents_bigger_than_context_conditional,
@@ -17,20 +26,23 @@ from redbox.graph.nodes.processes import (
     PromptSet,
     build_activity_log_node,
     build_chat_pattern,
+    build_condense_pattern,
     build_error_pattern,
     build_merge_pattern,
     build_passthrough_pattern,
     build_retrieve_pattern,
     build_set_metadata_pattern,
     build_set_route_pattern,
+    build_self_route_classifier_pattern,
     build_set_self_route_from_llm_answer,
+    build_speculative_retrieve_pattern,
     build_stuff_pattern,
     build_tool_pattern,
     clear_documents_process,
     empty_process,
     report_sources_process,
 )
-from redbox.graph.nodes.sends import build_document_chunk_send, build_document_group_send, build_tool_send
+from redbox.graph.nodes.sends import build_document_chunk_send, build_document_group_send
 from redbox.graph.nodes.tools import get_log_formatter_for_retrieval_tool
 from redbox.models.chain import RedboxState
 from redbox.models.chat import ChatRoute, ErrorRoute
@@ -38,14 +50,39 @@ from redbox.models.graph import ROUTABLE_KEYWORDS, RedboxActivityEvent
 from redbox.transform import structure_documents_by_file_name, structure_documents_by_group_and_indices
 
 
+def build_lazy_subgraph(build: Callable[[], CompiledGraph]) -> Runnable:
+    """Wraps a subgraph so it's compiled the first time a request reaches it rather than with its parent.
+
+    The compiled graph is kept and reused for every later request.
+    """
+    lock = Lock()
+    compiled: list[CompiledGraph] = []
+
+    def get_compiled() -> CompiledGraph:
+        if not compiled:
+            with lock:
+                if not compiled:
+                    compiled.append(build())
+        return compiled[0]
+
+    def _run(state: RedboxState, config: RunnableConfig):
+        return get_compiled().invoke(state, config)
+
+    async def _arun(state: RedboxState, config: RunnableConfig):
+        return await get_compiled().ainvoke(state, config)
+
+    return RunnableLambda(_run, afunc=_arun)
+
+
+def self_route_question_is_unanswerable(llm_response: str):
+    return "unanswerable" in llm_response
+
+
 def get_self_route_graph(retriever: VectorStoreRetriever, prompt_set: PromptSet, debug: bool = False):
     builder = StateGraph(RedboxState)
 
-    def self_route_question_is_unanswerable(llm_response: str):
-        return "unanswerable" in llm_response
-
     # Processes
-    builder.add_node("p_condense_question", build_chat_pattern(prompt_set=PromptSet.CondenseQuestion))
+    builder.add_node("p_condense_question", build_condense_pattern(cache=get_condense_cache()))
     builder.add_node(
         "p_retrieve_docs",
         build_retrieve_pattern(
@@ -94,6 +131,43 @@ def get_self_route_graph(retriever: VectorStoreRetriever, prompt_set: PromptSet,
     return builder.compile(debug=debug)
 
 
+def get_self_route_classifier_graph(
+    retriever: VectorStoreRetriever, fallback_retriever: VectorStoreRetriever, debug: bool = False
+):
+    """Creates a subgraph that routes to search or map reduce from a short classification call.
+
+    Unlike get_self_route_graph nothing is streamed to the user. The documents for map reduce are retrieved while
+    the question is classified and left in the state for it.
+    """
+    builder = StateGraph(RedboxState)
+
+    # Processes
+    builder.add_node(
+        "p_classify_question",
+        build_self_route_classifier_pattern(
+            retriever=retriever,
+            fallback_retriever=fallback_retriever,
+            structure_func=structure_documents_by_file_name,
+            conditional=self_route_question_is_unanswerable,
+        ),
+    )
+    builder.add_node(
+        "p_set_route_name_from_answer",
+        build_set_self_route_from_llm_answer(
+            self_route_question_is_unanswerable,
+            true_condition_state_update={"route_name": ChatRoute.chat_with_docs_map_reduce},
+            false_condition_state_update={"route_name": ChatRoute.search},
+        ),
+    )
+
+    # Edges
+    builder.add_edge(START, "p_classify_question")
+    builder.add_edge("p_classify_question", "p_set_route_name_from_answer")
+    builder.add_edge("p_set_route_name_from_answer", END)
+
+    return builder.compile(debug=debug)
+
+
 def get_chat_graph(
     debug: bool = False,
 ) -> CompiledGraph:
@@ -127,7 +201,7 @@ def get_search_graph(
 
     # Processes
     builder.add_node("p_set_search_route", build_set_route_pattern(route=ChatRoute.search))
-    builder.add_node("p_condense_question", build_chat_pattern(prompt_set=PromptSet.CondenseQuestion))
+    builder.add_node("p_condense_question", build_condense_pattern(cache=get_condense_cache()))
     builder.add_node(
         "p_retrieve_docs",
         build_retrieve_pattern(
@@ -136,15 +210,32 @@ def get_search_graph(
             final_source_chain=final_sources,
         ),
     )
+    builder.add_node(
+        "p_condense_question_and_retrieve_docs",
+        build_speculative_retrieve_pattern(
+            retriever=retriever,
+            structure_func=structure_documents_by_group_and_indices,
+            final_source_chain=final_sources,
+        ),
+    )
     builder.add_node(
         "p_stuff_docs",
         build_stuff_pattern(prompt_set=prompt_set, final_response_chain=final_response),
     )
 
+    # Decisions
+    builder.add_node("d_speculative_retrieval_is_enabled", empty_process)
+
     # Edges
     builder.add_edge(START, "p_set_search_route")
-    builder.add_edge("p_set_search_route", "p_condense_question")
+    builder.add_edge("p_set_search_route", "d_speculative_retrieval_is_enabled")
+    builder.add_conditional_edges(
+        "d_speculative_retrieval_is_enabled",
+        lambda s: s["request"].ai_settings.speculative_retrieval_enabled,
+        {True: "p_condense_question_and_retrieve_docs", False: "p_condense_question"},
+    )
     builder.add_edge("p_condense_question", "p_retrieve_docs")
+    builder.add_edge("p_condense_question_and_retrieve_docs", "p_stuff_docs")
     builder.add_edge("p_retrieve_docs", "p_stuff_docs")
     builder.add_edge("p_stuff_docs", END)
 
@@ -197,9 +288,6 @@ def get_agentic_search_graph(tools: dict[str, StructuredTool], debug: bool = Fal
     # Decisions
     builder.add_node("d_x_steps_left_or_less", empty_process)
 
-    # Sends
-    builder.add_node("s_tool", empty_process)
-
     # Edges
     builder.add_edge(START, "p_set_agentic_search_route")
     builder.add_edge("p_set_agentic_search_route", "d_x_steps_left_or_less")
@@ -214,10 +302,9 @@ def get_agentic_search_graph(tools: dict[str, StructuredTool], debug: bool = Fal
     builder.add_conditional_edges(
         "p_search_agent",
         build_tools_selected_conditional(tools=agent_tool_names),
-        {True: "s_tool", False: "p_report_sources"},
+        {True: "p_retrieval_tools", False: "p_report_sources"},
     )
     builder.add_edge("p_search_agent", "p_activity_log_retrieval_tool_calls")
-    builder.add_conditional_edges("s_tool", build_tool_send("p_retrieval_tools"), path_map=["p_retrieval_tools"])
     builder.add_edge("p_retrieval_tools", "d_x_steps_left_or_less")
     builder.add_edge("p_report_sources", END)
 
@@ -241,7 +328,7 @@ def get_chat_with_documents_graph(
     )
     builder.add_node(
         "p_summarise_each_document",
-        build_merge_pattern(prompt_set=PromptSet.ChatwithDocsMapReduce),
+        build_merge_pattern(prompt_set=PromptSet.ChatwithDocsMapReduce, cache=get_map_cache()),
     )
     builder.add_node(
         "p_summarise_document_by_document",
@@ -264,8 +351,17 @@ def get_chat_with_documents_graph(
     )
     builder.add_node(
         "p_answer_or_decide_route",
-        get_self_route_graph(parameterised_retriever, PromptSet.SelfRoute),
+        build_lazy_subgraph(partial(get_self_route_graph, parameterised_retriever, PromptSet.SelfRoute)),
+    )
+    builder.add_node(
+        "p_classify_route",
+        build_lazy_subgraph(partial(get_self_route_classifier_graph, parameterised_retriever, all_chunks_retriever)),
+    )
+    builder.add_node(
+        "p_answer_from_retrieved_docs",
+        build_stuff_pattern(prompt_set=PromptSet.Search, final_response_chain=True),
     )
+    builder.add_node("p_report_all_chunks", report_sources_process)
     builder.add_node(
         "p_retrieve_all_chunks",
         build_retrieve_pattern(
@@ -306,10 +402,24 @@ def get_chat_with_documents_graph(
     )
     builder.add_conditional_edges(
         "d_self_route_is_enabled",
-        lambda s: s["request"].ai_settings.self_route_enabled,
-        {True: "p_answer_or_decide_route", False: "p_set_chat_docs_map_reduce_route"},
+        lambda s: s["request"].ai_settings.self_route_enabled and s["request"].ai_settings.self_route_mode,
+        {
+            "stream": "p_answer_or_decide_route",
+            "classify": "p_classify_route",
+            False: "p_set_chat_docs_map_reduce_route",
+        },
         then="p_activity_log_tool_decision",
     )
+    builder.add_conditional_edges(
+        "p_classify_route",
+        lambda state: state.get("route_name"),
+        {
+            ChatRoute.search: "p_answer_from_retrieved_docs",
+            ChatRoute.chat_with_docs_map_reduce: "p_report_all_chunks",
+        },
+    )
+    builder.add_edge("p_answer_from_retrieved_docs", END)
+    builder.add_edge("p_report_all_chunks", "s_chunk")
     builder.add_conditional_edges(
         "p_answer_or_decide_route",
         lambda state: state.get("route_name"),
@@ -404,22 +514,32 @@ def get_root_graph(
     all_chunks_retriever: VectorStoreRetriever,
     parameterised_retriever: VectorStoreRetriever,
     metadata_retriever: VectorStoreRetriever,
-    tools: dict[str, StructuredTool],
+    tools: dict[str, StructuredTool] | Callable[[], dict[str, StructuredTool]],
     debug: bool = False,
 ) -> CompiledGraph:
-    """Creates the core Redbox graph."""
+    """Creates the core Redbox graph.
+
+    tools may be given as a function returning them, so that they're only built if a request needs them.
+    """
     builder = StateGraph(RedboxState)
 
-    # Subgraphs
-    chat_subgraph = get_chat_graph(debug=debug)
-    rag_subgraph = get_search_graph(retriever=parameterised_retriever, debug=debug)
-    agent_subgraph = get_agentic_search_graph(tools=tools, debug=debug)
-    cwd_subgraph = get_chat_with_documents_graph(
-        all_chunks_retriever=all_chunks_retriever,
-        parameterised_retriever=parameterised_retriever,
-        debug=debug,
+    # Subgraphs, compiled when a request is first routed to them
+    chat_subgraph = build_lazy_subgraph(partial(get_chat_graph, debug=debug))
+    rag_subgraph = build_lazy_subgraph(partial(get_search_graph, retriever=parameterised_retriever, debug=debug))
+    agent_subgraph = build_lazy_subgraph(
+        lambda: get_agentic_search_graph(tools=tools() if callable(tools) else tools, debug=debug)
+    )
+    cwd_subgraph = build_lazy_subgraph(
+        partial(
+            get_chat_with_documents_graph,
+            all_chunks_retriever=all_chunks_retriever,
+            parameterised_retriever=parameterised_retriever,
+            debug=debug,
+        )
+    )
+    metadata_subgraph = build_lazy_subgraph(
+        partial(get_retrieve_metadata_graph, metadata_retriever=metadata_retriever, debug=debug)
     )
-    metadata_subgraph = get_retrieve_metadata_graph(metadata_retriever=metadata_retriever, debug=debug)
 
     # Processes
     builder.add_node("p_search", rag_subgraph)
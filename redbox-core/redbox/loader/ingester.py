@@ -1,9 +1,11 @@
 import logging
+from functools import cache
 from typing import TYPE_CHECKING
 from langchain_core.runnables import RunnableParallel
 from langchain_elasticsearch.vectorstores import BM25Strategy, ElasticsearchStore
 from langchain_community.vectorstores import OpenSearchVectorSearch
 from redbox_app.setting_enums import Environment
+from redbox.aws import CachedAWSV4Signer, get_credentials_provider
 from redbox.chains.components import get_embeddings
 from redbox.chains.ingest import ingest_from_loader
 from redbox.loader.loaders import MetadataLoader, UnstructuredChunkLoader
@@ -14,11 +16,8 @@ from langchain_core.exceptions import OutputParserException
 from opensearchpy.exceptions import AuthorizationException
 import json
 import re
-import boto3
-from opensearchpy import AWSV4SignerAuth
 from requests_aws4auth import AWS4Auth
 from requests.auth import AuthBase
-from requests.models import PreparedRequest
 
 if TYPE_CHECKING:
     from mypy_boto3_s3.client import S3Client
@@ -42,35 +41,24 @@ class CustomAuthWrapper(AuthBase):
         self.signer = signer
 
     def __call__(self, method, url, body=None, headers=None):
-        # Build a request object compatible with the AWSV4SignerAuth
-        request = PreparedRequest()
-        request.method = method
-        request.url = url
-        request.body = body
-        request.headers = headers or {}
-
-        # Sign the request
-        signed_request = self.signer(request)
-
-        # Extract the signed headers (we only want to return the headers)
-        return signed_request.headers
+        # Only the signed headers are needed, so sign directly rather than through a PreparedRequest
+        return (headers or {}) | self.signer.sign(method, url, body)
 
 if ENVIRONMENT.is_local:
     opensearch_url="https://localhost:9200"
 else:
     opensearch_url = f"https://{env_vars.str('OPENSEARCH_HOST')}"
 
-    session = boto3.Session()
-    credentials = session.get_credentials()
+
+@cache
+def get_opensearch_http_auth() -> CustomAuthWrapper | None:
+    """Signs requests to AWS OpenSearch. Created on first use so importing this module doesn't fetch credentials."""
+    if ENVIRONMENT.is_local:
+        return None
+
     region = "eu-west-2"
-    auth = AWSV4SignerAuth(credentials, region)
-    wrapped_auth = CustomAuthWrapper(auth)
+    return CustomAuthWrapper(CachedAWSV4Signer(get_credentials_provider(), region))
 
-    
-    #opensearch_host = env_vars.str('OPENSEARCH_HOST')  # Ensure this includes the endpoint
-    #username = env_vars.str('OPENSEARCH_USER')
-    #password = env_vars.str('OPENSEARCH_PASSWORD')
-    #opensearch_url = f"https://{username}:{password}@{opensearch_host}:443"
 
 def clean_json_metadata(raw_metadata: str) -> str:
     """Clean and extract valid JSON from raw metadata."""
@@ -100,7 +88,7 @@ def get_elasticsearch_store(es, es_index_name: str):
         embedding=get_embeddings(env),
         es_connection=es,
         opensearch_url = opensearch_url,
-        http_auth=wrapped_auth,
+        http_auth=get_opensearch_http_auth(),
         embedding_function=get_embeddings(env),
         query_field="text",
         vector_query_field=env.embedding_document_field_name,
@@ -118,7 +106,7 @@ def get_elasticsearch_store_without_embeddings(es, es_index_name: str):
         index_name=es_index_name,
         es_connection=es,
         opensearch_url = opensearch_url,
-        http_auth=wrapped_auth,
+        http_auth=get_opensearch_http_auth(),
         query_field="text",
         strategy=BM25Strategy(),
         embedding_function=get_embeddings(env),
@@ -1,11 +1,13 @@
 from datetime import UTC, datetime
 from enum import StrEnum
-from functools import reduce
+from collections.abc import Callable, Sequence
+from functools import cache, reduce
 from typing import Annotated, Literal, NotRequired, Required, TypedDict, get_args, get_origin
 from uuid import UUID, uuid4
 
 from langchain_core.documents import Document
 from langchain_core.messages import ToolCall
+from langgraph.channels.binop import BinaryOperatorAggregate
 from langgraph.graph import MessagesState
 from langgraph.managed.is_last_step import RemainingStepsManager
 from pydantic import BaseModel, Field, validator
@@ -17,6 +19,7 @@ from redbox.models.settings import ChatLLMBackend
 class ChainChatMessage(TypedDict):
     role: Literal["user", "ai", "system"]
     text: str
+    token_count: NotRequired[int | None]
 
 
 class AISettings(BaseModel):
@@ -29,6 +32,9 @@ class AISettings(BaseModel):
     # Prompts and LangGraph settings
     max_document_tokens: int = 1_000_000
     self_route_enabled: bool = False
+    self_route_mode: Literal["stream", "classify"] = "stream"
+    speculative_retrieval_enabled: bool = False
+    speculative_retrieval_threshold: float = 0.8
     map_max_concurrency: int = 128
     stuff_chunk_context_ratio: float = 0.75
     recursion_limit: int = 50
@@ -76,6 +82,8 @@ class AISettings(BaseModel):
 
     # this is also the azure_openai_model
     chat_backend: ChatLLMBackend = ChatLLMBackend()
+    # a smaller, faster model for condensing questions, uses chat_backend if unset
+    condense_backend: ChatLLMBackend | None = None
 
 
 class Source(BaseModel):
@@ -114,52 +122,80 @@ def document_reducer(current: DocumentState | None, update: DocumentState | list
     * If key(s) are matched, the group or Document is replaced
     * If key(s) are matched and the key is None, the key is cleared
     * If key(s) aren't matched, group or Document is added
+
+    A list of updates is applied in a single pass. Groups no update touches are shared with current
+    rather than copied, and each touched group is copied at most once, so neither current nor the
+    updates are ever mutated.
     """
-    # If update is actually a list of state updates, run them one by one
-    if isinstance(update, list):
-        reduced = reduce(lambda current, update: document_reducer(current, update), update, current)
-        return reduced
+    updates = update if isinstance(update, list) else [update]
 
-    # If state is empty, return update
+    # If state is empty, start from the first update
     if current is None:
-        return update
+        if not updates:
+            return current
+        current, updates = updates[0], updates[1:]
+
+    reduced = dict(current)
+    copied_group_keys = set()
+
+    for update in updates:
+        for group_key, group in update.items():
+            # If group is None, remove from output if a group key is matched
+            if group is None:
+                reduced.pop(group_key, None)
+                copied_group_keys.discard(group_key)
+                continue
+
+            # Copy the group on first write so current's groups are never changed
+            if group_key not in copied_group_keys:
+                reduced[group_key] = dict(reduced.get(group_key) or {})
+                copied_group_keys.add(group_key)
+
+            reduced_group = reduced[group_key]
+            for document_key, document in group.items():
+                if document is None:
+                    # If Document is None, remove from output if a group and document key is matched
+                    reduced_group.pop(document_key, None)
+                else:
+                    # Otherwise, update or add the value
+                    reduced_group[document_key] = document
+
+            # Remove group_key from output if it becomes empty after updates
+            if not reduced_group:
+                del reduced[group_key]
+                copied_group_keys.discard(group_key)
 
-    # Copy current
-    reduced = {k: v.copy() for k, v in current.items()}
+    return reduced
 
-    # Update with update
-    for group_key, group in update.items():
-        # If group is None, remove from output if a group key is matched
-        if group is None:
-            reduced.pop(group_key, None)
-            continue
 
-        # If group key isn't matched, add it
-        if group_key not in reduced:
-            reduced[group_key] = group
+class DocumentStateChannel(BinaryOperatorAggregate):
+    """Applies document_reducer once to all the document updates written in a step.
 
-        for document_key, document in group.items():
-            if document is None:
-                # If Document is None, remove from output if a group and document key is matched
-                reduced[group_key].pop(document_key, None)
-            else:
-                # Otherwise, update or add the value
-                reduced[group_key][document_key] = document
+    LangGraph's default channel folds a step's writes one at a time, so a fan-in of n Sends
+    would copy the document groups n times.
+    """
 
-        # Remove group_key from output if it becomes empty after updates
-        if not reduced[group_key]:
-            del reduced[group_key]
+    def __init__(self, typ: type, operator: Callable = document_reducer):
+        super().__init__(typ, operator)
 
-    return reduced
+    def update(self, values: Sequence[DocumentState]) -> bool:
+        if not values:
+            return False
+        self.value = self.operator(getattr(self, "value", None), list(values))
+        return True
 
 
 class RedboxQuery(BaseModel):
+    # Shared by reference between Sends, so must not be changed once created
+    model_config = {"frozen": True}
+
     question: str = Field(description="The last user chat message")
     s3_keys: list[str] = Field(description="List of files to process", default_factory=list)
     user_uuid: UUID = Field(description="User the chain in executing for")
     chat_history: list[ChainChatMessage] = Field(description="All previous messages in chat (excluding question)")
     ai_settings: AISettings = Field(description="User request AI settings", default_factory=AISettings)
     permitted_s3_keys: list[str] = Field(description="List of permitted files for response", default_factory=list)
+    chat_id: UUID | None = Field(description="Chat the question was asked in", default=None)
 
 
 class LLMCallMetadata(BaseModel):
@@ -263,7 +299,7 @@ def tool_calls_reducer(current: ToolState, update: ToolState | None) -> ToolStat
 
 class RedboxState(MessagesState):
     request: Required[RedboxQuery]
-    documents: Annotated[NotRequired[DocumentState], document_reducer]
+    documents: Annotated[NotRequired[DocumentState], DocumentStateChannel]
     route_name: NotRequired[str | None]
     tool_calls: Annotated[NotRequired[ToolState], tool_calls_reducer]
     metadata: Annotated[NotRequired[RequestMetadata], metadata_reducer]
@@ -323,61 +359,101 @@ def is_dict_type[T](annotated_type: T) -> bool:
     return issubclass(base_type, dict)
 
 
-def dict_reducer(current: dict, update: dict) -> dict:
+def _merge_dict_into(merged: dict, update: dict, owned: dict[int, dict]) -> None:
+    """Merges update into merged in place, copying nested dicts before their first write.
+
+    owned holds the dicts created during this merge, which are safe to write to.
+    """
+    for key, new_value in update.items():
+        if new_value is None:
+            merged[key] = None
+        elif isinstance(new_value, dict) and isinstance(merged.get(key), dict):
+            if id(merged[key]) not in owned:
+                merged[key] = merged[key].copy()
+                owned[id(merged[key])] = merged[key]
+            _merge_dict_into(merged[key], new_value, owned)
+        else:
+            merged[key] = new_value
+
+
+def dict_reducer(current: dict, update: dict | list[dict]) -> dict:
     """
     Recursively merge two dictionaries:
 
     * If update has None for a key, current's key will be replaced with None.
     * If both values are dictionaries, they will be merged recursively.
     * Otherwise, the value in update will replace the value in current.
+
+    A list of updates is applied in order in a single pass, copying each nested dict at most once.
     """
+    updates = update if isinstance(update, list) else [update]
+
     merged = current.copy()
+    owned = {id(merged): merged}
 
-    for key, new_value in update.items():
-        if new_value is None:
-            merged[key] = None
-        elif isinstance(new_value, dict) and isinstance(merged.get(key), dict):
-            merged[key] = dict_reducer(merged[key], new_value)
-        else:
-            merged[key] = new_value
+    for update in updates:
+        _merge_dict_into(merged, update, owned)
 
     return merged
 
 
-def merge_redbox_state_updates(current: RedboxState, update: RedboxState) -> RedboxState:
+@cache
+def get_state_merge_rules() -> dict[str, Callable | None]:
+    """Works out once how merge_redbox_state_updates should combine each RedboxState key.
+
+    Dictionaries map to dict_reducer, other annotated keys to their reducer and unannotated keys to None.
+    """
+    rules = {}
+    for key, annotation in RedboxState.__annotations__.items():
+        if get_origin(annotation) is not Annotated:
+            rules[key] = None
+        elif is_dict_type(annotation):
+            rules[key] = dict_reducer
+        else:
+            _, reducer_func = get_args(annotation)
+            rules[key] = reducer_func
+    return rules
+
+
+def merge_redbox_state_updates(current: RedboxState, update: RedboxState | list[RedboxState]) -> RedboxState:
     """
     Merge RedboxStates to the following rules, intended for use on state updates.
 
     * Unannotated items are overwritten but never with None
     * Annotated items apply their reducer function
     * UNLESS they're a dictionary, in which case we use dict_reducer to preserve Nones
+
+    A list of updates gives the same result as merging them one by one, but in a single pass.
     """
+    updates = update if isinstance(update, list) else [update]
+    rules = get_state_merge_rules()
+
     merged_state = current.copy()
 
-    all_keys = set(current.keys()).union(set(update.keys()))
+    all_keys = set(current.keys()).union(*(update.keys() for update in updates))
 
     for update_key in all_keys:
         current_value = current.get(update_key, None)
-        update_value = update.get(update_key, None)
-
-        annotation = RedboxState.__annotations__.get(update_key, None)
-
-        if get_origin(annotation) is Annotated:
-            if is_dict_type(annotation):
-                # If it's annotated and a subclass of dict, apply a custom reducer function
-                merged_state[update_key] = dict_reducer(current=current_value or {}, update=update_value or {})
-            elif current_value is None:
-                merged_state[update_key] = update_value
-            else:
-                # If it's annotated and not a dict, apply its reducer function
-                _, reducer_func = get_args(annotation)
-                merged_state[update_key] = reducer_func(current_value, update_value)
+        update_values = [update.get(update_key, None) for update in updates]
+
+        reducer_func = rules.get(update_key)
+
+        if reducer_func is dict_reducer:
+            # If it's annotated and a subclass of dict, apply a custom reducer function
+            merged_state[update_key] = dict_reducer(
+                current=current_value or {}, update=[update_value or {} for update_value in update_values]
+            )
+        elif reducer_func is not None:
+            # If it's annotated and not a dict, apply its reducer function
+            for update_value in update_values:
+                current_value = update_value if current_value is None else reducer_func(current_value, update_value)
+            merged_state[update_key] = current_value
         else:
             # If not annotated, replace but don't overwrite an existing value with None
-            if update_value is not None:
-                merged_state[update_key] = update_value
-            else:
-                merged_state[update_key] = current_value
+            for update_value in update_values:
+                if update_value is not None:
+                    current_value = update_value
+            merged_state[update_key] = current_value
 
     return merged_state
 
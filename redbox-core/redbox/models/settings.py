@@ -1,16 +1,22 @@
+import asyncio
+import inspect
 import logging
 import os
+from collections.abc import AsyncGenerator, Callable
+from contextlib import suppress
 from functools import cache, lru_cache, wraps
 from typing import Literal, Union
+from weakref import WeakKeyDictionary
 import boto3
 import environ
 from elasticsearch import Elasticsearch
 from openai import max_retries
-from opensearchpy import AWSV4SignerAuth, OpenSearch, RequestsHttpConnection
+from opensearchpy import AsyncHttpConnection, AsyncOpenSearch, OpenSearch, RequestsHttpConnection
 from opensearchpy.exceptions import AuthorizationException
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from redbox_app.setting_enums import Environment
+from redbox.aws import CachedAWSV4SignerAsyncAuth, CachedAWSV4SignerAuth, get_credentials_provider
 from langchain.globals import set_debug
 
 logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
@@ -20,6 +26,21 @@ env = environ.Env()
 ENVIRONMENT = Environment[env.str("ENVIRONMENT").upper()]
 
 def catch_403(func):
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except AuthorizationException as e:
+                logger.error(f"403 Authorization Error in function '{func.__name__}': {e}")
+                raise
+            except Exception as e:
+                logger.error(f"Other Error in function '{func.__name__}': {e}")
+                raise
+
+        return async_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         try:
@@ -143,6 +164,21 @@ class Settings(BaseSettings):
 
     unstructured_host: str = "unstructured"
 
+    # Cache of per-chunk map results, 0 disables
+    map_cache_max_size: int = 10_000
+    map_cache_ttl_seconds: int = 60 * 60 * 24
+    # Cache of condensed questions by chat and message count, 0 disables
+    condense_cache_max_size: int = 10_000
+    condense_cache_ttl_seconds: int = 60 * 60
+    # Threads shared by all requests for running agent tools concurrently, and how long the document search tool may
+    # take to embed its query and then run its searches, less than build_tool_pattern's timeout
+    tool_max_workers: int = 16
+    document_search_timeout_seconds: float = 10
+    # Pooled HTTP session and cache of results for the gov.uk and Wikipedia search tools, 0 disables the cache
+    external_search_timeout_seconds: float = 10
+    external_search_cache_max_size: int = 1_000
+    external_search_cache_ttl_seconds: int = 60 * 60
+
     model_config = SettingsConfigDict(
         env_file=".env", env_nested_delimiter="__", extra="allow", frozen=True
     )
@@ -167,40 +203,13 @@ class Settings(BaseSettings):
     @catch_403
     @lru_cache(1)
     def elasticsearch_client(self) -> Union[Elasticsearch, OpenSearch]:
-        logger.warning("inside settings.py inside elasticsearch_client")
-        if ENVIRONMENT.is_local:
-            auth = ("admin", "MyStrongPassword1!")
-            use_ssl = False
-            verify_certs = False
-            port = 9200
-        else:
-            credentials = boto3.Session().get_credentials()
-            #credentials = credentials.get_frozen_credentials()
-
-            auth = AWSV4SignerAuth(credentials, "eu-west-2")
-            use_ssl = True
-            verify_certs = True
-            port = 443
-
-        opensearch_url = env.str('OPENSEARCH_HOST')
-
-        #if opensearch_url.startswith("https://"):
-        #    opensearch_url = opensearch_url[len("https://"):]
- 
-        #OS_HOST = opensearch_url
-        #logger.warning(f"OpenSearch is={OS_HOST}")
-        #OS_PORT = port
-        #OS_USERNAME = env.str("OPENSEARCH_USER")
-        #OS_PASSWORD = env.str("OPENSEARCH_PASSWORD")
-        logger.warning("inside settings.py before client object created")
+        """Creates the client shared by everything in this process.
 
+        No requests are made here. Processes should call this after they start, not at import, so that
+        forked workers each get their own connection pool.
+        """
         client = OpenSearch(
-            hosts=[{"host": env.str("OPENSEARCH_HOST"), "port": port}],
-            http_auth=auth,
-            #hosts=[{"host": OS_HOST, "port": OS_PORT}],
-            #http_auth=(OS_USERNAME, OS_PASSWORD),  # Basic Authentication
-            use_ssl=use_ssl,
-            verify_certs=verify_certs,
+            **self._opensearch_connection_kwargs(signer=CachedAWSV4SignerAuth),
             connection_class=RequestsHttpConnection,
             pool_maxsize=100,
             timeout=30,
@@ -208,21 +217,79 @@ class Settings(BaseSettings):
             retry_on_timeout=True,
         )
 
-        logger.warning("inside settings.py before we print indices")
+        logger.info(f"Client hosts: {client.transport.hosts}")
+        logger.info(f"Client connection class: {client.transport.connection_class}")
+
+        return client
+
+    @catch_403
+    @lru_cache(1)
+    def tool_elasticsearch_client(self) -> OpenSearch:
+        """Creates the client shared by the agent's tools, which never retries.
+
+        A timed out request is given up on rather than retried, so a tool run in one of the shared tool threads lets
+        it go within the timeout its requests are given.
+        """
+        return OpenSearch(
+            **self._opensearch_connection_kwargs(signer=CachedAWSV4SignerAuth),
+            connection_class=RequestsHttpConnection,
+            pool_maxsize=self.tool_max_workers,
+            timeout=self.document_search_timeout_seconds,
+            max_retries=0,
+            retry_on_timeout=False,
+        )
+
+    @catch_403
+    @lru_cache(1)
+    def async_elasticsearch_client(self) -> "LoopLocalAsyncOpenSearch":
+        """Creates the asyncio client shared by everything in this process.
+
+        Each event loop that uses it gets its own AsyncOpenSearch and aiohttp connection pool. No requests are
+        made here.
+        """
+        return LoopLocalAsyncOpenSearch(
+            lambda: AsyncOpenSearch(
+                **self._opensearch_connection_kwargs(signer=CachedAWSV4SignerAsyncAuth),
+                connection_class=AsyncHttpConnection,
+                maxsize=100,
+                timeout=30,
+                max_retries=3,
+                retry_on_timeout=True,
+            )
+        )
+
+    def _opensearch_connection_kwargs(
+        self, signer: type[CachedAWSV4SignerAuth] | type[CachedAWSV4SignerAsyncAuth]
+    ) -> dict:
+        """Host and auth settings shared by the sync and async clients, signing with SigV4 outside local."""
+        if ENVIRONMENT.is_local:
+            return {
+                "hosts": [{"host": env.str("OPENSEARCH_HOST"), "port": 9200}],
+                "http_auth": ("admin", "MyStrongPassword1!"),
+                "use_ssl": False,
+                "verify_certs": False,
+            }
+
+        return {
+            "hosts": [{"host": env.str("OPENSEARCH_HOST"), "port": 443}],
+            "http_auth": signer(get_credentials_provider(), "eu-west-2"),
+            "use_ssl": True,
+            "verify_certs": True,
+        }
+
+    @catch_403
+    def bootstrap_indices(self) -> None:
+        """Creates the chunk index and points the chunk alias at it if the alias doesn't exist yet.
+
+        This is safe to run repeatedly, but is meant to run once per deploy rather than in every process.
+        """
+        client = self.elasticsearch_client()
 
-        # List all indices in the OpenSearch collection
         try:
             indices = client.cat.indices(format="json")
-            print("Indices in the collection:")
-            for index in indices:
-                print(f"- {index['index']}")
+            logger.info("Indices in the collection: %s", [index["index"] for index in indices])
         except Exception as e:
-            print(f"Error fetching indices: {e}")
-
-        logger.warning("inside settings.py after we print indices")
-
-        logger.info(f"Client hosts: {client.transport.hosts}")
-        logger.info(f"Client connection class: {client.transport.connection_class}")
+            logger.error(f"Error fetching indices: {e}")
 
         if not client.indices.exists_alias(
             name=f"{self.elastic_root_index}-chunk-current"
@@ -246,8 +313,6 @@ class Settings(BaseSettings):
                     f"Failed to set alias {self.elastic_root_index}-chunk-current: {e}"
                 )
 
-        return client
-
     def s3_client(self):
         if self.object_store == "minio":
             return boto3.client(
@@ -282,6 +347,55 @@ class Settings(BaseSettings):
         raise NotImplementedError(msg)
 
 
+class LoopLocalAsyncOpenSearch:
+    """Stands in for an AsyncOpenSearch, passing each call to a client of the running event loop's own.
+
+    An aiohttp connection pool can only be used from the loop it was made on, and the ASGI server, async_to_sync and
+    tests each run their own loops. Clients are created on first use in a loop, and closed as the loop shuts down its
+    async generators, which asyncio.run, and so async_to_sync, does before closing it.
+    """
+
+    def __init__(self, create_client: Callable[[], AsyncOpenSearch]):
+        self._create_client = create_client
+        self._clients: WeakKeyDictionary[
+            asyncio.AbstractEventLoop, tuple[AsyncOpenSearch, AsyncGenerator[None, None]]
+        ] = WeakKeyDictionary()
+
+    def for_running_loop(self) -> AsyncOpenSearch:
+        loop = asyncio.get_running_loop()
+        if (entry := self._clients.get(loop)) is None:
+            client = self._create_client()
+            closer = _close_at_shutdown(client)
+            # Starting the generator registers it with the loop, which closes it on shutdown
+            with suppress(StopIteration):
+                closer.asend(None).send(None)
+            entry = self._clients[loop] = (client, closer)
+        return entry[0]
+
+    def __getattr__(self, name: str):
+        return getattr(self.for_running_loop(), name)
+
+
+async def _close_at_shutdown(client: AsyncOpenSearch) -> AsyncGenerator[None, None]:
+    try:
+        yield
+    finally:
+        await client.close()
+
+
+class LazyElasticsearchClient:
+    """Stands in for Settings.elasticsearch_client() where a client is needed at import time.
+
+    The client is only created when an attribute is first used.
+    """
+
+    def __init__(self, settings: Settings | None = None):
+        self._settings = settings
+
+    def __getattr__(self, name: str):
+        return getattr((self._settings or get_settings()).elasticsearch_client(), name)
+
+
 @cache
 def get_settings() -> Settings:
     s = Settings()
@@ -1,21 +1,23 @@
 from calendar import c
 import logging
 from functools import partial
+import time
 from math import log
-from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Union, cast
+from typing import Any, Callable, Dict, Generator, Iterable, List, Mapping, Optional, Sequence, Union, cast
 
 import opensearchpy
 from opensearchpy import OpenSearch
 from elasticsearch import Elasticsearch
-from opensearchpy.helpers import scan
+from opensearchpy import AsyncOpenSearch
+from opensearchpy.helpers import async_scan, scan
 from kneed import KneeLocator
-from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
 from langchain_core.embeddings.embeddings import Embeddings
 from langchain_core.retrievers import BaseRetriever
 from langchain_elasticsearch.retrievers import ElasticsearchRetriever
 from opensearchpy import OpenSearch
-from redbox.models.chain import RedboxState
+from redbox.models.chain import RedboxQuery, RedboxState
 from redbox.models.file import ChunkResolution
 from redbox.retriever.queries import (
     add_document_filter_scores_to_query,
@@ -24,7 +26,7 @@ from redbox.retriever.queries import (
     get_metadata,
 )
 from redbox.transform import merge_documents, sort_documents
-from redbox.models.settings import catch_403
+from redbox.models.settings import LoopLocalAsyncOpenSearch, catch_403
 
 logger = logging.getLogger(__name__)
 logger.warning("inside retrievers.py")
@@ -50,14 +52,122 @@ def hit_to_doc(hit: dict[str, Any]) -> Document:
         | source["metadata"],
     )
 
+
+def _timeout_params(request_timeout: float | None) -> dict[str, float]:
+    return {} if request_timeout is None else {"request_timeout": request_timeout}
+
+
 @catch_403
-def query_to_documents(es_client: Union[Elasticsearch, OpenSearch], index_name: str, query: dict[str, Any]) -> list[Document]:
-    """Runs an Elasticsearch query and returns Documents."""
+def query_to_documents(
+    es_client: Union[Elasticsearch, OpenSearch],
+    index_name: str,
+    query: dict[str, Any],
+    request_timeout: float | None = None,
+) -> list[Document]:
+    """Runs an Elasticsearch query and returns Documents, waiting request_timeout seconds if given."""
     logger.warning("inside retrievers.py inside query_to_documents")
-    response = es_client.search(index=index_name, body=query)
+    response = es_client.search(index=index_name, body=query, **_timeout_params(request_timeout))
     return [hit_to_doc(hit) for hit in response["hits"]["hits"]]
 
 
+@catch_403
+async def aquery_to_documents(
+    es_client: Union[AsyncOpenSearch, LoopLocalAsyncOpenSearch],
+    index_name: str,
+    query: dict[str, Any],
+    request_timeout: float | None = None,
+) -> list[Document]:
+    """Runs an Elasticsearch query with the async client and returns Documents."""
+    response = await es_client.search(index=index_name, body=query, **_timeout_params(request_timeout))
+    return [hit_to_doc(hit) for hit in response["hits"]["hits"]]
+
+
+DocumentSearch = Generator[dict[str, Any], list[Document], list[Document]]
+
+
+def search_documents(
+    query: str,
+    query_vector: list[float],
+    request: RedboxQuery,
+    embedding_field_name: str,
+    chunk_resolution: ChunkResolution | None,
+) -> DocumentSearch:
+    """Builds the queries for a document search and merges their results, leaving running them to the caller.
+
+    Yields the initial query, then a query boosting documents adjacent to its results, and is sent the Documents
+    each returns. Returns the merged and sorted Documents. Run it with run_document_search or arun_document_search.
+    """
+    # Initial pass
+    initial_query = build_document_query(
+        query=query,
+        query_vector=query_vector,
+        selected_files=request.s3_keys,
+        permitted_files=request.permitted_s3_keys,
+        embedding_field_name=embedding_field_name,
+        chunk_resolution=chunk_resolution,
+        ai_settings=request.ai_settings,
+    )
+    initial_documents = yield initial_query
+
+    # Handle nothing found (as when no files are permitted)
+    if not initial_documents:
+        return []
+
+    # Adjacent documents
+    with_adjacent_query = add_document_filter_scores_to_query(
+        elasticsearch_query=initial_query,
+        ai_settings=request.ai_settings,
+        centres=initial_documents,
+    )
+    adjacent_boosted = yield with_adjacent_query
+
+    # Merge, sort, return
+    merged_documents = merge_documents(initial=initial_documents, adjacent=adjacent_boosted)
+    return sort_documents(documents=merged_documents)
+
+
+def _remaining_seconds(deadline: float | None) -> float | None:
+    """Seconds left until a time.monotonic() deadline, raising TimeoutError once it has passed."""
+    if deadline is None:
+        return None
+    if (remaining := deadline - time.monotonic()) <= 0:
+        raise TimeoutError("Document search ran out of time")
+    return remaining
+
+
+def run_document_search(
+    search: DocumentSearch,
+    es_client: Union[Elasticsearch, OpenSearch],
+    index_name: str,
+    deadline: float | None = None,
+) -> list[Document]:
+    """Runs each of a search_documents search's queries with the sync client.
+
+    Given a time.monotonic() deadline, each query waits only for the time left before it.
+    """
+    try:
+        query = next(search)
+        while True:
+            query = search.send(query_to_documents(es_client, index_name, query, _remaining_seconds(deadline)))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def arun_document_search(
+    search: DocumentSearch,
+    es_client: Union[AsyncOpenSearch, LoopLocalAsyncOpenSearch],
+    index_name: str,
+    deadline: float | None = None,
+) -> list[Document]:
+    """Runs each of a search_documents search's queries with the async client, like run_document_search."""
+    try:
+        query = next(search)
+        while True:
+            query = search.send(await aquery_to_documents(es_client, index_name, query, _remaining_seconds(deadline)))
+    except StopIteration as stop:
+        return stop.value
+
+
 def filter_by_elbow(
     enabled: bool = True, sensitivity: float = 1, score_scaling_factor: float = 100
 ) -> Callable[[list[Document]], list[Document]]:
@@ -97,6 +207,7 @@ class OpenSearchRetriever(BaseRetriever):
     """OpenSearch Retriever."""
 
     es_client: OpenSearch
+    async_es_client: Optional[Union[AsyncOpenSearch, LoopLocalAsyncOpenSearch]] = None
     index_name: Union[str, Sequence[str]]
     body_func: Callable[[str], Dict]
     content_field: Optional[Union[str, Mapping[str,str]]] = None
@@ -140,6 +251,20 @@ class OpenSearchRetriever(BaseRetriever):
         response = self.es_client.search(index=self.index_name, body=body)
         return [self.document_mapper(hit) for hit in response["hits"]["hits"]]
 
+    @catch_403
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # Without an async client, run the sync search in a thread
+        if self.async_es_client is None:
+            return await super()._aget_relevant_documents(query, run_manager=run_manager)
+        if not self.document_mapper:
+            raise ValueError("OpenSearch client or document mapper is not initialized")
+
+        body = self.body_func(query)
+        response = await self.async_es_client.search(index=self.index_name, body=body)
+        return [self.document_mapper(hit) for hit in response["hits"]["hits"]]
+
     def _single_field_mapper(self, hit: Mapping[str, Any]) -> Document:
         content = hit["_source"].pop(self.content_field)
         return Document(page_content=content, metadata=hit)
@@ -155,11 +280,21 @@ class ParameterisedElasticsearchRetriever(BaseRetriever):
     """A modified ElasticsearchRetriever that allows configuration from RedboxState."""
 
     es_client: Union[Elasticsearch, OpenSearch]
+    async_es_client: Optional[Union[AsyncOpenSearch, LoopLocalAsyncOpenSearch]] = None
     index_name: str | Sequence[str]
     embedding_model: Embeddings
     embedding_field_name: str = "embedding"
     chunk_resolution: ChunkResolution = ChunkResolution.normal
 
+    def _search(self, query_text: str, query_vector: list[float], query: RedboxState) -> DocumentSearch:
+        return search_documents(
+            query=query_text,
+            query_vector=query_vector,
+            request=query["request"],
+            embedding_field_name=self.embedding_field_name,
+            chunk_resolution=self.chunk_resolution,
+        )
+
     @catch_403
     def _get_relevant_documents(
         self, query: RedboxState, *, run_manager: CallbackManagerForRetrieverRun
@@ -167,48 +302,51 @@ class ParameterisedElasticsearchRetriever(BaseRetriever):
         logger.warning("inside retrievers.py inside _get_relevant_documents")
         query_text = query["messages"][-1].content
         query_vector = self.embedding_model.embed_query(query_text)
-        selected_files = query["request"].s3_keys
-        permitted_files = query["request"].permitted_s3_keys
-        ai_settings = query["request"].ai_settings
+        return run_document_search(self._search(query_text, query_vector, query), self.es_client, self.index_name)
 
-        # Initial pass
-        initial_query = build_document_query(
-            query=query_text,
-            query_vector=query_vector,
-            selected_files=selected_files,
-            permitted_files=permitted_files,
-            embedding_field_name=self.embedding_field_name,
-            chunk_resolution=self.chunk_resolution,
-            ai_settings=ai_settings,
-        )
-        initial_documents = query_to_documents(
-            es_client=self.es_client, index_name=self.index_name, query=initial_query
+    @catch_403
+    async def _aget_relevant_documents(
+        self, query: RedboxState, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        # Without an async client, run the sync search in a thread
+        if self.async_es_client is None:
+            return await super()._aget_relevant_documents(query, run_manager=run_manager)
+
+        query_text = query["messages"][-1].content
+        query_vector = await self.embedding_model.aembed_query(query_text)
+        return await arun_document_search(
+            self._search(query_text, query_vector, query), self.async_es_client, self.index_name
         )
 
-        # Handle nothing found (as when no files are permitted)
-        if not initial_documents:
-            return []
 
-        # Adjacent documents
-        with_adjacent_query = add_document_filter_scores_to_query(
-            elasticsearch_query=initial_query,
-            ai_settings=ai_settings,
-            centres=initial_documents,
-        )
-        adjacent_boosted = query_to_documents(
-            es_client=self.es_client,
-            index_name=self.index_name,
-            query=with_adjacent_query,
-        )
+class ScanRetriever(OpenSearchRetriever):
+    """An OpenSearchRetriever that scans every hit of its body_func's query, in index order."""
 
-        # Merge, sort, return
-        merged_documents = merge_documents(
-            initial=initial_documents, adjacent=adjacent_boosted
-        )
-        return sort_documents(documents=merged_documents)
+    def _sort_hits(self, hits: Iterable[Mapping[str, Any]]) -> list[Document]:
+        return sorted((self.document_mapper(hit) for hit in hits), key=lambda result: result.metadata["index"])
 
+    @catch_403
+    def _get_relevant_documents(
+        self, query: RedboxState, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:  # noqa:ARG002
+        logger.warning("inside retrievers.py inside _get_relevant_documents")
+        body = self.body_func(query)  # type: ignore
+        return self._sort_hits(scan(client=self.es_client, index=self.index_name, query=body, _source=True))
+
+    @catch_403
+    async def _aget_relevant_documents(
+        self, query: RedboxState, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:  # noqa:ARG002
+        # Without an async client, run the sync scan in a thread
+        if self.async_es_client is None:
+            return await super()._aget_relevant_documents(query, run_manager=run_manager)
 
-class AllElasticsearchRetriever(OpenSearchRetriever):
+        body = self.body_func(query)  # type: ignore
+        hits = async_scan(client=self.async_es_client, index=self.index_name, query=body, _source=True)
+        return self._sort_hits([hit async for hit in hits])
+
+
+class AllElasticsearchRetriever(ScanRetriever):
     """A modified ElasticsearchRetriever that allows retrieving whole documents."""
 
     chunk_resolution: ChunkResolution = ChunkResolution.largest
@@ -224,28 +362,8 @@ class AllElasticsearchRetriever(OpenSearchRetriever):
         super().__init__(**kwargs)
         self.body_func = partial(get_all, self.chunk_resolution)
 
-    @catch_403
-    def _get_relevant_documents(
-        self, query: RedboxState, *, run_manager: CallbackManagerForRetrieverRun
-    ) -> list[Document]:  # noqa:ARG002
-        logger.warning("inside retrievers.py inside _get_relevant_documents")
-        # if not self.es_client or not self.document_mapper:
-        #    msg = "faulty configuration"
-        #    raise ValueError(msg)  # should not happen
-
-        body = self.body_func(query)  # type: ignore
 
-        results = [
-            self.document_mapper(hit)
-            for hit in scan(
-                client=self.es_client, index=self.index_name, query=body, _source=True
-            )
-        ]
-
-        return sorted(results, key=lambda result: result.metadata["index"])
-
-
-class MetadataRetriever(OpenSearchRetriever):
+class MetadataRetriever(ScanRetriever):
     """A modified ElasticsearchRetriever that retrieves query metadata without any content"""
 
     chunk_resolution: ChunkResolution = ChunkResolution.largest
@@ -260,23 +378,3 @@ class MetadataRetriever(OpenSearchRetriever):
         kwargs["es_client"] = es_client
         super().__init__(**kwargs)
         self.body_func = partial(get_metadata, self.chunk_resolution)
-
-    @catch_403
-    def _get_relevant_documents(
-        self, query: RedboxState, *, run_manager: CallbackManagerForRetrieverRun
-    ) -> list[Document]:  # noqa:ARG002
-        logger.warning("inside retrievers.py inside _get_relevant_documents")
-        # if not self.es_client or not self.document_mapper:
-        #    msg = "faulty configuration"
-        #    raise ValueError(msg)  # should not happen
-
-        body = self.body_func(query)  # type: ignore
-
-        results = [
-            self.document_mapper(hit)
-            for hit in scan(
-                client=self.es_client, index=self.index_name, query=body, _source=True
-            )
-        ]
-
-        return sorted(results, key=lambda result: result.metadata["index"])
@@ -87,9 +87,9 @@ def es_vector_store(
 @pytest.fixture(autouse=True, scope="session")
 def create_index(env: Settings, es_index: str) -> Generator[None, None, None]:
     es = env.elasticsearch_client()
-    if not es.indices.exists(index=es_index):
-        es.indices.create(index=es_index)
+    env.bootstrap_indices()
     yield
+    es.indices.delete_alias(index=es_index, name=f"{es_index}-current")
     es.indices.delete(index=es_index)
 
 
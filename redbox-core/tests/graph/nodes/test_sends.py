@@ -1,11 +1,10 @@
 from uuid import uuid4
 
 from langchain_core.documents import Document
-from langchain_core.messages import ToolCall
 from langgraph.constants import Send
 
-from redbox.graph.nodes.sends import build_document_chunk_send, build_document_group_send, build_tool_send
-from redbox.models.chain import DocumentState, RedboxQuery, RedboxState, ToolState
+from redbox.graph.nodes.sends import build_document_chunk_send, build_document_group_send
+from redbox.models.chain import DocumentState, RedboxQuery, RedboxState
 
 
 def test_build_document_group_send():
@@ -23,8 +22,9 @@ def test_build_document_group_send():
         route_name=None,
     )
     actual = document_group_send(state)
-    expected = [Send(node=target, arg=state)]
+    expected = [Send(node=target, arg=RedboxState(request=request, documents=documents))]
     assert expected == actual
+    assert actual[0].arg["request"] is request
 
 
 def test_build_document_chunk_send():
@@ -50,8 +50,6 @@ def test_build_document_chunk_send():
             arg=RedboxState(
                 request=request,
                 documents=DocumentState(group={uuid_1: doc_1}),
-                text=None,
-                route_name=None,
             ),
         ),
         Send(
@@ -59,54 +57,6 @@ def test_build_document_chunk_send():
             arg=RedboxState(
                 request=request,
                 documents=DocumentState(group={uuid_2: doc_2}),
-                text=None,
-                route_name=None,
-            ),
-        ),
-    ]
-    assert expected == actual
-
-
-def test_build_tool_send():
-    target = "my-target"
-    request = RedboxQuery(question="what colour is the sky?", user_uuid=uuid4(), chat_history=[])
-
-    tool_call_1 = {
-        "foo": {"tool": ToolCall({"name": "foo", "args": {"a": 1, "b": 2}, "id": "123"}), "called": False},
-    }
-    tool_call_2 = {
-        "bar": {
-            "tool": ToolCall({"name": "bar", "args": {"x": 10, "y": 20}, "id": "456"}),
-            "called": False,
-        },
-    }
-
-    tool_send = build_tool_send("my-target")
-    actual = tool_send(
-        RedboxState(
-            request=request,
-            tool_calls=ToolState(tool_call_1 | tool_call_2),
-            text=None,
-            route_name=None,
-        ),
-    )
-    expected = [
-        Send(
-            node=target,
-            arg=RedboxState(
-                request=request,
-                tool_calls=ToolState(tool_call_1),
-                text=None,
-                route_name=None,
-            ),
-        ),
-        Send(
-            node=target,
-            arg=RedboxState(
-                request=request,
-                tool_calls=ToolState(tool_call_2),
-                text=None,
-                route_name=None,
             ),
         ),
     ]
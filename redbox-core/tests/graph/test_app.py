@@ -1,15 +1,20 @@
 import copy
 from typing import Any
+from unittest.mock import MagicMock
 from uuid import uuid4
 
 import pytest
 from langchain_core.documents import Document
 from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
 from langchain_core.tools import tool
 from pytest_mock import MockerFixture
 from tiktoken.core import Encoding
 
+import redbox.app
+import redbox.graph.root
 from redbox import Redbox
+from redbox.graph.root import build_lazy_subgraph
 from redbox.models.chain import (
     AISettings,
     Citation,
@@ -37,8 +42,8 @@ from redbox.transform import structure_documents_by_group_and_indices
 
 LANGGRAPH_DEBUG = True
 
-SELF_ROUTE_TO_SEARCH = ["Condense self route question", "Testing Response - Search"]
-SELF_ROUTE_TO_CHAT = ["Condense self route question", "unanswerable"]
+SELF_ROUTE_TO_SEARCH = ["Testing Response - Search"]
+SELF_ROUTE_TO_CHAT = ["unanswerable"]
 
 
 def assert_number_of_events(num_of_events: int):
@@ -230,13 +235,44 @@ TEST_CASES = [
                     number_of_docs=2,
                     tokens_in_all_docs=200_000,
                     chunk_resolution=ChunkResolution.normal,
-                    llm_responses=SELF_ROUTE_TO_SEARCH,  # + ["Condense Question", "Testing Response 1"],
+                    llm_responses=SELF_ROUTE_TO_SEARCH,
                     expected_route=ChatRoute.search,
                     expected_activity_events=assert_number_of_events(2),
                 ),
             ],
             test_id="Self Route Search large doc",
         ),
+        generate_test_cases(
+            query=RedboxQuery(
+                question="What is AI?",
+                s3_keys=["s3_key"],
+                user_uuid=uuid4(),
+                chat_history=[],
+                permitted_s3_keys=["s3_key"],
+                ai_settings=AISettings(self_route_enabled=True, self_route_mode="classify"),
+            ),
+            test_data=[
+                RedboxTestData(
+                    number_of_docs=2,
+                    tokens_in_all_docs=200_000,
+                    llm_responses=SELF_ROUTE_TO_CHAT
+                    + ["Map Step Response"] * 2
+                    + ["Merge Per Document Response"]
+                    + ["Testing Response 1"],
+                    expected_route=ChatRoute.chat_with_docs_map_reduce,
+                    expected_activity_events=assert_number_of_events(3),
+                ),
+                RedboxTestData(
+                    number_of_docs=2,
+                    tokens_in_all_docs=200_000,
+                    chunk_resolution=ChunkResolution.normal,
+                    llm_responses=SELF_ROUTE_TO_SEARCH + ["Testing Response - Search"],
+                    expected_route=ChatRoute.search,
+                    expected_activity_events=assert_number_of_events(3),
+                ),
+            ],
+            test_id="Self Route classifier large doc",
+        ),
         generate_test_cases(
             query=RedboxQuery(
                 question="What is AI?",
@@ -267,13 +303,13 @@ TEST_CASES = [
                 RedboxTestData(
                     number_of_docs=1,
                     tokens_in_all_docs=10000,
-                    llm_responses=["Condense response", "The cake is a lie"],
+                    llm_responses=["The cake is a lie"],
                     expected_route=ChatRoute.search,
                 ),
                 RedboxTestData(
                     number_of_docs=5,
                     tokens_in_all_docs=10000,
-                    llm_responses=["Condense response", "The cake is a lie"],
+                    llm_responses=["The cake is a lie"],
                     expected_route=ChatRoute.search,
                 ),
             ],
@@ -291,13 +327,62 @@ TEST_CASES = [
                 RedboxTestData(
                     number_of_docs=1,
                     tokens_in_all_docs=10000,
-                    llm_responses=["Condense response", "The cake is a lie"],
+                    llm_responses=["The cake is a lie"],
                     expected_route=ChatRoute.search,
                     s3_keys=["s3_key"],
                 ),
             ],
             test_id="Search, nothing selected",
         ),
+        generate_test_cases(
+            query=RedboxQuery(
+                question="@search What is AI?",
+                s3_keys=["s3_key"],
+                user_uuid=uuid4(),
+                chat_history=[
+                    {"role": "user", "text": "What is ML?"},
+                    {"role": "ai", "text": "Machine learning"},
+                ],
+                permitted_s3_keys=["s3_key"],
+            ),
+            test_data=[
+                RedboxTestData(
+                    number_of_docs=5,
+                    tokens_in_all_docs=10000,
+                    llm_responses=["Condense response", "The cake is a lie"],
+                    expected_route=ChatRoute.search,
+                ),
+            ],
+            test_id="Search with chat history",
+        ),
+        generate_test_cases(
+            query=RedboxQuery(
+                question="@search What is AI?",
+                s3_keys=["s3_key"],
+                user_uuid=uuid4(),
+                chat_history=[
+                    {"role": "user", "text": "What is ML?"},
+                    {"role": "ai", "text": "Machine learning"},
+                ],
+                permitted_s3_keys=["s3_key"],
+                ai_settings=AISettings(speculative_retrieval_enabled=True),
+            ),
+            test_data=[
+                RedboxTestData(
+                    number_of_docs=5,
+                    tokens_in_all_docs=10000,
+                    llm_responses=["What is AI?", "The cake is a lie"],
+                    expected_route=ChatRoute.search,
+                ),
+                RedboxTestData(
+                    number_of_docs=5,
+                    tokens_in_all_docs=10000,
+                    llm_responses=["Condense response", "The cake is a lie"],
+                    expected_route=ChatRoute.search,
+                ),
+            ],
+            test_id="Search, speculative retrieval",
+        ),
         generate_test_cases(
             query=RedboxQuery(
                 question="@gadget What is AI?",
@@ -609,3 +694,32 @@ def test_get_available_keywords(tokeniser: Encoding, env: Settings):
     keywords = {ChatRoute.search, ChatRoute.gadget}
 
     assert keywords == set(app.get_available_keywords().keys())
+
+
+def test_redbox_builds_graph_on_first_use(mocker: MockerFixture, env: Settings):
+    get_root_graph = mocker.spy(redbox.app, "get_root_graph")
+    get_chat_graph = mocker.spy(redbox.graph.root, "get_chat_graph")
+
+    app = Redbox(
+        all_chunks_retriever=mock_all_chunks_retriever([]),
+        parameterised_retriever=mock_parameterised_retriever([]),
+        metadata_retriever=mock_metadata_retriever([]),
+        env=env,
+        debug=LANGGRAPH_DEBUG,
+    )
+    assert get_root_graph.call_count == 0
+
+    assert app.graph is app.graph
+    assert get_root_graph.call_count == 1
+    assert get_chat_graph.call_count == 0, "Subgraphs should only be compiled when a request reaches them"
+    assert "tools" not in app.__dict__, "Tools should only be built when the agentic subgraph is first used"
+
+
+def test_build_lazy_subgraph_compiles_once():
+    build = MagicMock(return_value=RunnableLambda(lambda state: {"route_name": "chat"}))
+    node = build_lazy_subgraph(build)
+
+    build.assert_not_called()
+    assert node.invoke({}) == {"route_name": "chat"}
+    assert node.invoke({}) == {"route_name": "chat"}
+    build.assert_called_once()
@@ -1,30 +1,45 @@
+import asyncio
+import threading
 from typing import Any
 from uuid import uuid4
 
 import pytest
+from langchain_core.documents import Document
 from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
 from langchain_core.messages import AIMessage, ToolCall, HumanMessage
 from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
 from langchain_core.tools import StructuredTool, tool
 from langgraph.graph import END, START, StateGraph
 from pytest_mock import MockerFixture
 from tiktoken.core import Encoding
 
-from redbox.chains.runnables import CannedChatLLM, build_chat_prompt_from_messages_runnable, build_llm_chain
+from redbox.cache import TTLCache
+from redbox.chains.runnables import (
+    CannedChatLLM,
+    build_chat_prompt_from_messages_runnable,
+    build_llm_chain,
+    compile_chat_prompt,
+)
 from redbox.graph.nodes.processes import (
     build_chat_pattern,
+    build_condense_pattern,
     build_merge_pattern,
     build_passthrough_pattern,
     build_retrieve_pattern,
+    build_self_route_classifier_pattern,
     build_set_route_pattern,
     build_set_text_pattern,
+    build_speculative_retrieve_pattern,
     build_stuff_pattern,
     build_tool_pattern,
     clear_documents_process,
     empty_process,
 )
-from redbox.models.chain import PromptSet, RedboxQuery, RedboxState
+from redbox.models.chain import AISettings, PromptSet, RedboxQuery, RedboxState
 from redbox.models.chat import ChatRoute
+from redbox.models.settings import ChatLLMBackend
+from redbox.models.file import ChunkResolution
 from redbox.test.data import (
     RedboxChatTestCase,
     RedboxTestData,
@@ -69,6 +84,43 @@ def test_build_chat_prompt_from_messages_runnable(test_case: RedboxChatTestCase,
     assert len(messages) > 0
 
 
+def test_build_chat_prompt_from_messages_runnable_stored_token_counts(tokeniser: Encoding, mocker: MockerFixture):
+    """Tests chat history is truncated using the token counts stored with each message."""
+    chat_history = [
+        {"role": "user", "text": "Oldest question", "token_count": 200_000},
+        {"role": "ai", "text": "Oldest answer", "token_count": 10},
+        {"role": "user", "text": "Latest question", "token_count": 10},
+    ]
+    query = RedboxQuery(
+        question="What is AI?", s3_keys=[], user_uuid=uuid4(), chat_history=chat_history, permitted_s3_keys=[]
+    )
+    chat_prompt = build_chat_prompt_from_messages_runnable(prompt_set=PromptSet.Chat, tokeniser=tokeniser)
+    chat_prompt.invoke(RedboxState(request=query))
+
+    encode = mocker.spy(tokeniser, "encode")
+    messages = chat_prompt.invoke(RedboxState(request=query)).to_messages()
+
+    assert encode.call_count == 0
+    assert [message.content for message in messages[1:-1]] == ["Oldest answer", "Latest question"]
+
+
+def test_build_chat_prompt_from_messages_runnable_compiles_once(tokeniser: Encoding):
+    """Tests repeated prompts with the same settings reuse the compiled templates."""
+    query = RedboxQuery(question="What is AI?", s3_keys=[], user_uuid=uuid4(), chat_history=[], permitted_s3_keys=[])
+    chat_prompt = build_chat_prompt_from_messages_runnable(
+        prompt_set=PromptSet.Chat, tokeniser=tokeniser, format_instructions="Compile once"
+    )
+
+    compile_chat_prompt.cache_clear()
+    first = chat_prompt.invoke(RedboxState(request=query))
+    second = chat_prompt.invoke(RedboxState(request=query))
+
+    assert compile_chat_prompt.cache_info().misses == 1
+    assert compile_chat_prompt.cache_info().hits == 1
+    assert first.to_messages() == second.to_messages()
+    assert "What is AI?" in first.to_messages()[-1].content
+
+
 BUILD_LLM_TEST_CASES = generate_test_cases(
     query=RedboxQuery(question="What is AI?", file_uuids=[], user_uuid=uuid4(), chat_history=[], permitted_s3_keys=[]),
     test_data=[
@@ -232,6 +284,82 @@ def test_build_retrieve_pattern(test_case: RedboxChatTestCase, mock_retriever: B
     assert final_state.get("documents") == structure_documents_by_file_name(test_case.docs)
 
 
+@pytest.mark.parametrize(
+    ("condensed_question", "expected_queries"),
+    [
+        ("What is AI", ["What is AI?"]),
+        ("Explain artificial intelligence to me", ["What is AI?", "Explain artificial intelligence to me"]),
+    ],
+    ids=["Close enough", "Retrieve again"],
+)
+def test_build_speculative_retrieve_pattern(
+    condensed_question: str, expected_queries: list[str], mocker: MockerFixture
+):
+    """Tests speculative documents are kept unless the condensed question has drifted from the raw question."""
+    query = RedboxQuery(
+        question="What is AI?",
+        s3_keys=["s3_key"],
+        user_uuid=uuid4(),
+        chat_history=[{"role": "user", "text": "What is ML?"}, {"role": "ai", "text": "Machine learning"}],
+        permitted_s3_keys=["s3_key"],
+        ai_settings=AISettings(speculative_retrieval_threshold=0.5),
+    )
+    docs = list(generate_docs(s3_key="s3_key", number_of_docs=2))
+    queries = []
+
+    @RunnableLambda
+    def retriever(state: RedboxState) -> list[Document]:
+        queries.append(state["messages"][-1].content)
+        return docs
+
+    llm = GenericFakeChatModel(messages=iter([condensed_question]))
+    mocker.patch("redbox.graph.nodes.processes.get_chat_llm", return_value=llm)
+
+    speculative_retrieve = build_speculative_retrieve_pattern(
+        retriever=retriever, structure_func=structure_documents_by_file_name
+    )
+    response = speculative_retrieve.invoke(RedboxState(request=query))
+
+    assert queries == expected_queries
+    assert response["documents"] == structure_documents_by_file_name(docs)
+    assert response["messages"][-1].content == condensed_question
+
+
+def test_build_condense_pattern_without_history(mocker: MockerFixture):
+    """Tests the question is used as it is when there's no chat history to condense it with."""
+    query = RedboxQuery(question="What is AI?", s3_keys=[], user_uuid=uuid4(), chat_history=[], permitted_s3_keys=[])
+    get_chat_llm = mocker.patch("redbox.graph.nodes.processes.get_chat_llm")
+
+    response = build_condense_pattern().invoke(RedboxState(request=query))
+
+    get_chat_llm.assert_not_called()
+    assert response["messages"][-1].content == "What is AI?"
+
+
+def test_build_condense_pattern_with_history(mocker: MockerFixture):
+    """Tests the condense backend is used and condensed questions are cached per chat and message count."""
+    condense_backend = ChatLLMBackend(name="small-model", provider="openai")
+    query = RedboxQuery(
+        question="What about it?",
+        s3_keys=[],
+        user_uuid=uuid4(),
+        chat_history=[{"role": "user", "text": "What is AI?"}, {"role": "ai", "text": "Artificial intelligence"}],
+        permitted_s3_keys=[],
+        ai_settings=AISettings(condense_backend=condense_backend),
+        chat_id=uuid4(),
+    )
+    llm = GenericFakeChatModel(messages=iter(["What about AI?"]))
+    get_chat_llm = mocker.patch("redbox.graph.nodes.processes.get_chat_llm", return_value=llm)
+    condense = build_condense_pattern(cache=TTLCache(max_size=10, ttl_seconds=60))
+
+    first_response = condense.invoke(RedboxState(request=query))
+    second_response = condense.invoke(RedboxState(request=query))
+
+    get_chat_llm.assert_called_once_with(condense_backend)
+    assert first_response["messages"][-1].content == "What about AI?"
+    assert second_response["messages"][-1].content == "What about AI?"
+
+
 MERGE_TEST_CASES = generate_test_cases(
     query=RedboxQuery(
         question="What is AI?",
@@ -282,6 +410,78 @@ def test_build_merge_pattern(test_case: RedboxChatTestCase, mocker: MockerFixtur
     ), f"Expected document content: '{test_case_content}'. Received '{response_documents[0].page_content}'"
 
 
+@pytest.mark.parametrize(("test_case"), MERGE_TEST_CASES, ids=[t.test_id for t in MERGE_TEST_CASES])
+def test_build_merge_pattern_cache(test_case: RedboxChatTestCase, mocker: MockerFixture):
+    """Tests a repeated merge of the same documents is served from the cache without calling the LLM."""
+    llm = GenericFakeChatModel(messages=iter(test_case.test_data.llm_responses))
+    state = RedboxState(request=test_case.query, documents=structure_documents_by_file_name(test_case.docs))
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+
+    merge = build_merge_pattern(prompt_set=PromptSet.ChatwithDocsMapReduce, cache=cache)
+
+    mocker.patch("redbox.graph.nodes.processes.get_chat_llm", return_value=llm)
+    first_response = merge.invoke(state)
+    second_response = merge.invoke(state)
+
+    first_documents = [doc for doc in flatten_document_state(first_response["documents"]) if doc is not None]
+    second_documents = [doc for doc in flatten_document_state(second_response["documents"]) if doc is not None]
+
+    assert len(cache) == 1
+    assert "metadata" in first_response
+    assert "metadata" not in second_response
+    assert first_documents[0].page_content == second_documents[0].page_content
+    assert first_documents[0].metadata["token_count"] == second_documents[0].metadata["token_count"]
+
+
+def test_build_merge_pattern_cache_is_keyed_on_chat_history(mocker: MockerFixture):
+    """Tests the same documents merged for the same question in another conversation aren't served from the cache."""
+    test_case = MERGE_TEST_CASES[0]
+    llm = GenericFakeChatModel(messages=iter(["Testing Response 1", "Testing Response 2"]))
+    other_query = test_case.query.model_copy(
+        update={"chat_history": [{"role": "user", "text": "What is ML?"}, {"role": "ai", "text": "Machine learning"}]}
+    )
+    documents = structure_documents_by_file_name(test_case.docs)
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+
+    merge = build_merge_pattern(prompt_set=PromptSet.ChatwithDocsMapReduce, cache=cache)
+
+    mocker.patch("redbox.graph.nodes.processes.get_chat_llm", return_value=llm)
+    first_response = merge.invoke(RedboxState(request=test_case.query, documents=documents))
+    other_response = merge.invoke(RedboxState(request=other_query, documents=documents))
+
+    assert len(cache) == 2
+    assert "metadata" in first_response
+    assert "metadata" in other_response
+
+
+@pytest.mark.parametrize(
+    ("probe_response", "expected_fallback"),
+    [("unanswerable", True), ("AI is artificial intelligence", False)],
+    ids=["Unanswerable", "Answerable"],
+)
+def test_build_self_route_classifier_pattern(probe_response: str, expected_fallback: bool, mocker: MockerFixture):
+    """Tests the classification response picks between the retrieved and the fallback documents."""
+    query = RedboxQuery(
+        question="What is AI?", s3_keys=["s3_key"], user_uuid=uuid4(), chat_history=[], permitted_s3_keys=["s3_key"]
+    )
+    top_k_docs = list(generate_docs(s3_key="s3_key", number_of_docs=2))
+    all_chunks = list(generate_docs(s3_key="s3_key", number_of_docs=4, chunk_resolution=ChunkResolution.largest))
+    llm = GenericFakeChatModel(messages=iter([probe_response]))
+    mocker.patch("redbox.graph.nodes.processes.get_chat_llm", return_value=llm)
+
+    classify = build_self_route_classifier_pattern(
+        retriever=mock_parameterised_retriever(top_k_docs),
+        fallback_retriever=mock_all_chunks_retriever(all_chunks),
+        structure_func=structure_documents_by_file_name,
+        conditional=lambda response: "unanswerable" in response,
+    )
+    response = classify.invoke(RedboxState(request=query, messages=[HumanMessage(content=query.question)]))
+
+    expected_docs = all_chunks if expected_fallback else top_k_docs
+    assert response["documents"] == structure_documents_by_file_name(expected_docs)
+    assert response["messages"][-1].content == probe_response
+
+
 STUFF_TEST_CASES = generate_test_cases(
     query=RedboxQuery(
         question="What is AI?",
@@ -390,6 +590,98 @@ def test_build_tool_pattern(tools: list[StructuredTool], expected: dict[str, str
         assert tool_entry["called"]
 
 
+def _tool_state(tools: list[StructuredTool]) -> RedboxState:
+    tool_calls = [{"name": tool.name, "args": {}, "id": tool.name} for tool in tools]
+    return RedboxState(
+        request=RedboxQuery(
+            question="What is AI?", s3_keys=[], user_uuid=uuid4(), chat_history=[], permitted_s3_keys=[]
+        ),
+        tool_calls=tool_calls_to_toolstate(message=AIMessage(content="hello", tool_calls=tool_calls), called=False),
+        messages=[],
+    )
+
+
+def test_build_tool_pattern_runs_tools_concurrently():
+    """Both tools must be running at once to get past the barrier."""
+    barrier = threading.Barrier(2, timeout=5)
+
+    @tool
+    def first_tool() -> dict[str, Any]:
+        """Tool that waits for the second tool."""
+        barrier.wait()
+        return {"route_name": "first"}
+
+    @tool
+    def second_tool() -> dict[str, Any]:
+        """Tool that waits for the first tool."""
+        barrier.wait()
+        return {"messages": [HumanMessage(content="second")]}
+
+    response = build_tool_pattern(tools=[first_tool, second_tool]).invoke(_tool_state([first_tool, second_tool]))
+
+    assert response["route_name"] == "first"
+    assert response["messages"] == [HumanMessage(content="second")]
+
+
+def test_build_tool_pattern_keeps_partial_results():
+    release = threading.Event()
+
+    @tool
+    def slow_tool() -> dict[str, Any]:
+        """Tool that takes longer than the timeout."""
+        release.wait(timeout=5)
+        return {"route_name": "slow"}
+
+    @tool
+    def failing_tool() -> dict[str, Any]:
+        """Tool that fails."""
+        raise ValueError("Tool failed")
+
+    @tool
+    def fast_tool() -> dict[str, Any]:
+        """Tool that returns straight away."""
+        return {"messages": [HumanMessage(content="fast")]}
+
+    tools = [slow_tool, failing_tool, fast_tool]
+    try:
+        response = build_tool_pattern(tools=tools, timeout_seconds=0.2).invoke(_tool_state(tools))
+    finally:
+        release.set()
+
+    assert "route_name" not in response
+    assert response["messages"] == [HumanMessage(content="fast")]
+    assert {tool_id for tool_id, entry in response["tool_calls"].items() if entry["called"]} == {
+        "slow_tool",
+        "failing_tool",
+        "fast_tool",
+    }
+
+
+@pytest.mark.asyncio
+async def test_build_tool_pattern_runs_async_tools_concurrently():
+    barrier = asyncio.Barrier(2)
+
+    async def _wait_for_other_tool() -> dict[str, Any]:
+        await asyncio.wait_for(barrier.wait(), timeout=5)
+        return {}
+
+    def _first_tool() -> dict[str, Any]:
+        """First tool."""
+        return {}
+
+    def _second_tool() -> dict[str, Any]:
+        """Second tool."""
+        return {}
+
+    first_tool = StructuredTool.from_function(func=_first_tool, coroutine=_wait_for_other_tool)
+    second_tool = StructuredTool.from_function(func=_second_tool, coroutine=_wait_for_other_tool)
+
+    tools = [first_tool, second_tool]
+    response = await build_tool_pattern(tools=tools, timeout_seconds=10).ainvoke(_tool_state(tools))
+
+    assert all(entry["called"] for entry in response["tool_calls"].values())
+
+
 def test_build_passthrough_pattern():
     """Tests a given state["request"] correctly changes state["text"]."""
     passthrough = build_passthrough_pattern()
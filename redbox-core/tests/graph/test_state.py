@@ -8,6 +8,7 @@ from langchain_core.messages import ToolCall
 from redbox.models.chain import (
     AISettings,
     DocumentState,
+    DocumentStateChannel,
     LLMCallMetadata,
     RedboxQuery,
     RedboxState,
@@ -134,6 +135,48 @@ def test_document_reducer(a: DocumentState, b: DocumentState, expected: Document
     assert result == expected, f"Expected: {expected}. Result: {result}"
 
 
+def test_document_reducer_batches_updates_without_mutating_inputs():
+    current = {
+        GROUP_IDS[0]: {DOCUMENT_IDS[0]: Document("a")},
+        GROUP_IDS[1]: {DOCUMENT_IDS[1]: Document("b")},
+    }
+    updates = [
+        {GROUP_IDS[0]: {DOCUMENT_IDS[2]: Document("c")}},
+        {GROUP_IDS[0]: {DOCUMENT_IDS[0]: None}, GROUP_IDS[2]: {DOCUMENT_IDS[3]: Document("d"), DOCUMENT_IDS[4]: None}},
+        {GROUP_IDS[2]: {DOCUMENT_IDS[5]: Document("e")}},
+    ]
+    current_before = {k: v.copy() for k, v in current.items()}
+    updates_before = [{k: v.copy() for k, v in update.items()} for update in updates]
+
+    sequential = current
+    for update in updates:
+        sequential = document_reducer(sequential, update)
+
+    result = document_reducer(current, updates)
+
+    assert result == sequential
+    assert current == current_before
+    assert updates == updates_before
+    # Untouched groups are shared rather than copied
+    assert result[GROUP_IDS[1]] is current[GROUP_IDS[1]]
+
+
+def test_document_state_channel_reduces_a_step_in_one_call():
+    calls = []
+
+    def counting_reducer(current, update):
+        calls.append(update)
+        return document_reducer(current, update)
+
+    channel = DocumentStateChannel(DocumentState, counting_reducer)
+    updates = [{GROUP_IDS[0]: {DOCUMENT_IDS[i]: Document(str(i))}} for i in range(5)]
+
+    assert channel.update(updates)
+    assert len(calls) == 1
+    assert channel.get() == {GROUP_IDS[0]: {DOCUMENT_IDS[i]: Document(str(i)) for i in range(5)}}
+    assert not channel.update([])
+
+
 now = datetime.now(UTC)
 GPT_4o_multiple_calls_1 = [
     LLMCallMetadata(llm_model_name="gpt-4o", input_tokens=0, output_tokens=0, timestamp=now - timedelta(days=10)),
@@ -420,3 +463,28 @@ def test_merge_redbox_state_updates(a: RedboxState, b: RedboxState, expected: Re
     """
     result = merge_redbox_state_updates(a, b)
     assert result == expected, f"Expected: {expected}. Result: {result}"
+
+
+def test_merge_redbox_state_updates_batch_matches_sequential():
+    request = RedboxQuery(question="What is AI?", s3_keys=[], user_uuid=uuid4(), chat_history=[])
+    tool_call = ToolCall(name="foo", args={"x": 1}, id="1")
+    updates = [
+        RedboxState(
+            request=request,
+            documents={GROUP_IDS[0]: {DOCUMENT_IDS[0]: Document("a")}},
+            route_name="search",
+            tool_calls={"1": {"called": False, "tool": tool_call}},
+        ),
+        RedboxState(
+            request=request,
+            documents={GROUP_IDS[0]: {DOCUMENT_IDS[0]: None, DOCUMENT_IDS[1]: Document("b")}},
+            tool_calls={"1": {"called": True, "tool": tool_call}},
+        ),
+        RedboxState(request=request, documents={GROUP_IDS[1]: {DOCUMENT_IDS[2]: Document("c")}}, route_name=None),
+    ]
+
+    sequential = updates[0]
+    for update in updates[1:]:
+        sequential = merge_redbox_state_updates(sequential, update)
+
+    assert merge_redbox_state_updates(updates[0], updates[1:]) == sequential
@@ -1,7 +1,12 @@
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
 import pytest
+from langchain_core.embeddings.fake import FakeEmbeddings
 from langchain_core.messages import HumanMessage
+from opensearchpy import AsyncOpenSearch, OpenSearch
 
-from redbox.models.chain import RedboxState
+from redbox.models.chain import RedboxQuery, RedboxState
 from redbox.retriever import AllElasticsearchRetriever, MetadataRetriever, ParameterisedElasticsearchRetriever
 from redbox.test.data import RedboxChatTestCase
 
@@ -150,3 +155,56 @@ def test_metadata_retriever(metadata_retriever: MetadataRetriever, stored_file_m
         assert {c.metadata["uri"] for c in result} <= set(stored_file_metadata.query.permitted_s3_keys)
     else:
         len(result) == 0
+
+
+def _hit(index: int, file_name: str = "test.txt") -> dict:
+    return {
+        "_id": str(index),
+        "_score": 1.0,
+        "_source": {"text": f"chunk {index}", "metadata": {"index": index, "file_name": file_name}},
+    }
+
+
+@pytest.mark.asyncio
+async def test_parameterised_retriever_async_client(embedding_model: FakeEmbeddings):
+    es_client = MagicMock(spec=OpenSearch)
+    async_es_client = MagicMock(spec=AsyncOpenSearch)
+    async_es_client.search = AsyncMock(return_value={"hits": {"hits": [_hit(0)]}})
+    retriever = ParameterisedElasticsearchRetriever(
+        es_client=es_client,
+        async_es_client=async_es_client,
+        index_name="redbox-data-chunk",
+        embedding_model=embedding_model,
+    )
+    state = RedboxState(
+        request=RedboxQuery(question="Lorem ipsum?", s3_keys=["test.txt"], user_uuid=uuid4(), chat_history=[]),
+        messages=[HumanMessage(content="Lorem ipsum?")],
+    )
+
+    documents = await retriever.ainvoke(state)
+
+    assert [d.page_content for d in documents] == ["chunk 0"]
+    assert async_es_client.search.await_count == 2, "Expected an initial and an adjacent chunk query"
+    es_client.search.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_all_chunks_retriever_async_client():
+    es_client = MagicMock(spec=OpenSearch)
+    async_es_client = MagicMock(spec=AsyncOpenSearch)
+    async_es_client.search = AsyncMock(
+        return_value={"_scroll_id": "1", "hits": {"hits": [_hit(1), _hit(0)]}, "_shards": {"successful": 1, "total": 1}}
+    )
+    async_es_client.scroll = AsyncMock(return_value={"_scroll_id": "1", "hits": {"hits": []}})
+    async_es_client.clear_scroll = AsyncMock()
+    retriever = AllElasticsearchRetriever(
+        es_client=es_client, async_es_client=async_es_client, index_name="redbox-data-chunk"
+    )
+    state = RedboxState(
+        request=RedboxQuery(question="Lorem ipsum?", s3_keys=["test.txt"], user_uuid=uuid4(), chat_history=[]),
+    )
+
+    documents = await retriever.ainvoke(state)
+
+    assert [d.page_content for d in documents] == ["chunk 0", "chunk 1"]
+    es_client.search.assert_not_called()
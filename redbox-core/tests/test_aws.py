@@ -0,0 +1,79 @@
+from datetime import UTC, datetime
+from unittest.mock import MagicMock
+
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import ReadOnlyCredentials
+
+from redbox.aws import CachedCredentialsProvider, CachedKeySigV4Auth
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def fake_session_factory(expiry_timestamp: float | None) -> MagicMock:
+    credentials = MagicMock()
+    credentials.get_frozen_credentials.side_effect = lambda: ReadOnlyCredentials(
+        "access", f"secret-{credentials.get_frozen_credentials.call_count}", "token"
+    )
+    credentials._expiry_time = (
+        datetime.fromtimestamp(expiry_timestamp, tz=UTC) if expiry_timestamp is not None else None
+    )
+    session = MagicMock()
+    session.get_credentials.return_value = credentials
+    return MagicMock(return_value=session)
+
+
+def test_credentials_provider_reuses_frozen_credentials():
+    session_factory = fake_session_factory(expiry_timestamp=None)
+    provider = CachedCredentialsProvider(session_factory=session_factory)
+
+    first = provider.get_frozen_credentials()
+    second = provider.get_frozen_credentials()
+
+    assert first is second
+    session_factory.assert_called_once()
+
+
+def test_credentials_provider_refreshes_expired_credentials():
+    timer = FakeTimer()
+    provider = CachedCredentialsProvider(
+        session_factory=fake_session_factory(expiry_timestamp=3600), refresh_margin_seconds=60, timer=timer
+    )
+
+    first = provider.get_frozen_credentials()
+    timer.now = 3600
+
+    assert provider.get_frozen_credentials() != first
+
+
+def test_credentials_provider_refreshes_near_expiry_in_background(mocker):
+    thread = mocker.patch("redbox.aws.Thread")
+    timer = FakeTimer()
+    provider = CachedCredentialsProvider(
+        session_factory=fake_session_factory(expiry_timestamp=3600), refresh_margin_seconds=60, timer=timer
+    )
+
+    first = provider.get_frozen_credentials()
+    timer.now = 3590
+
+    assert provider.get_frozen_credentials() is first, "Still valid credentials should be returned while refreshing"
+    assert provider.get_frozen_credentials() is first
+    thread.assert_called_once()
+    thread.return_value.start.assert_called_once()
+
+
+def test_cached_key_sigv4_auth_matches_botocore():
+    credentials = ReadOnlyCredentials("access", "secret", "token")
+    request = AWSRequest(method="GET", url="https://example.com/")
+    request.context["timestamp"] = "20241019T120000Z"
+    string_to_sign = "AWS4-HMAC-SHA256\n20241019T120000Z\nscope\nhash"
+
+    expected = SigV4Auth(credentials, "es", "eu-west-2").signature(string_to_sign, request)
+
+    assert CachedKeySigV4Auth(credentials, "es", "eu-west-2").signature(string_to_sign, request) == expected
@@ -0,0 +1,42 @@
+from redbox.cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expires_entries():
+    timer = FakeTimer()
+    cache = TTLCache(max_size=10, ttl_seconds=5, timer=timer)
+    cache.set("key", "value")
+
+    timer.now = 4
+    assert cache.get("key") == "value"
+
+    timer.now = 5
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+
+def test_ttl_cache_disabled():
+    cache = TTLCache(max_size=0, ttl_seconds=60)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
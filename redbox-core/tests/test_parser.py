@@ -0,0 +1,57 @@
+import json
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from redbox.chains.parser import StreamedJsonField, StreamingJsonOutputParser
+from redbox.models.chain import StructuredResponseWithCitations
+from redbox.models.graph import RedboxEventType
+
+RESPONSE = StructuredResponseWithCitations.model_validate(
+    {
+        "answer": 'A "quoted" answer\nwith a \\ backslash, tab\tand emoji \U0001f600 {braces}',
+        "citations": [{"text_in_answer": "answer", "sources": [{"source": "a.pdf", "page_numbers": [2]}]}],
+    }
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_streamed_json_field(chunk_size: int):
+    """Tests the field is decoded correctly however the JSON text is split."""
+    text = "```json\n" + json.dumps({"citations": [], "answer": RESPONSE.answer}) + "\n```"
+    streamed_field = StreamedJsonField("answer")
+
+    content = "".join(streamed_field.feed(text[i : i + chunk_size]) for i in range(0, len(text), chunk_size))
+
+    assert content == RESPONSE.answer
+
+
+def test_streamed_json_field_ignores_nested_keys():
+    """Tests only the top level field is streamed."""
+    streamed_field = StreamedJsonField("answer")
+
+    content = streamed_field.feed('{"citations": [{"answer": "nested"}], "answer": "top level"}')
+
+    assert content == "top level"
+
+
+@pytest.mark.asyncio
+async def test_streaming_json_output_parser():
+    """Tests answer tokens are dispatched as they stream and the object is validated at the end."""
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content=RESPONSE.model_dump_json())]))
+    parser = StreamingJsonOutputParser(
+        name_of_streamed_field="answer", pydantic_schema_object=StructuredResponseWithCitations
+    )
+
+    tokens = []
+    outputs = []
+    async for event in (llm | parser).astream_events("Question", version="v2"):
+        if event["event"] == "on_custom_event" and event["name"] == RedboxEventType.response_tokens:
+            tokens.append(event["data"])
+        elif event["event"] == "on_chain_end" and not event["parent_ids"]:
+            outputs.append(event["data"]["output"])
+
+    assert len(tokens) > 1
+    assert "".join(tokens) == RESPONSE.answer
+    assert outputs == [RESPONSE]
@@ -0,0 +1,69 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from opensearchpy import AsyncOpenSearch
+from pytest_mock import MockerFixture
+
+from redbox.models.settings import LazyElasticsearchClient, LoopLocalAsyncOpenSearch, Settings
+
+
+def test_lazy_elasticsearch_client_connects_on_first_use(mocker: MockerFixture, env: Settings):
+    elasticsearch_client = mocker.patch.object(Settings, "elasticsearch_client")
+
+    es_client = LazyElasticsearchClient(env)
+    elasticsearch_client.assert_not_called()
+
+    es_client.indices.exists(index="redbox-data-chunk")
+
+    elasticsearch_client.assert_called_once_with()
+    elasticsearch_client.return_value.indices.exists.assert_called_once_with(index="redbox-data-chunk")
+
+
+def test_tool_elasticsearch_client_never_retries(env: Settings):
+    transport = env.tool_elasticsearch_client().transport
+
+    assert transport.max_retries == 0
+    assert not transport.retry_on_timeout
+    assert transport.kwargs["timeout"] == env.document_search_timeout_seconds
+
+
+def test_loop_local_async_client_is_created_once_per_event_loop():
+    created = []
+
+    def create_client():
+        client = MagicMock(spec=AsyncOpenSearch)
+        client.search = AsyncMock(return_value={"hits": {"hits": []}})
+        created.append(client)
+        return client
+
+    async_es_client = LoopLocalAsyncOpenSearch(create_client)
+
+    async def search_twice():
+        await async_es_client.search(index="redbox-data-chunk", body={})
+        await async_es_client.search(index="redbox-data-chunk", body={})
+
+    asyncio.run(search_twice())
+    asyncio.run(search_twice())
+
+    assert len(created) == 2, "Expected a client for each event loop"
+    assert [client.search.await_count for client in created] == [2, 2]
+
+
+def test_loop_local_async_client_is_closed_when_its_event_loop_shuts_down():
+    created = []
+
+    def create_client():
+        client = MagicMock(spec=AsyncOpenSearch)
+        client.search = AsyncMock(return_value={"hits": {"hits": []}})
+        created.append(client)
+        return client
+
+    async_es_client = LoopLocalAsyncOpenSearch(create_client)
+
+    async def search():
+        await async_es_client.search(index="redbox-data-chunk", body={})
+        created[0].close.assert_not_awaited()
+
+    asyncio.run(search())
+
+    created[0].close.assert_awaited_once()
@@ -1,4 +1,5 @@
 from typing import Annotated, Any
+from unittest.mock import MagicMock
 from urllib.parse import urlparse
 from uuid import UUID, uuid4
 
@@ -8,7 +9,10 @@ from langchain_core.embeddings.fake import FakeEmbeddings
 from langchain_core.messages import HumanMessage
 from langchain_core.tools import tool
 from langgraph.prebuilt import InjectedState
+from opensearchpy import OpenSearch
 
+from redbox.cache import TTLCache
+from redbox.chains.components import get_embeddings
 from redbox.graph.nodes.tools import (
     build_govuk_search_tool,
     build_search_documents_tool,
@@ -155,6 +159,49 @@ def test_search_documents_tool(
                 assert group_docs[doc.metadata["uuid"]] == doc
 
 
+def test_search_documents_tool_bounds_each_request():
+    es_client = MagicMock(spec=OpenSearch)
+    es_client.search.return_value = {"hits": {"hits": []}}
+    search = build_search_documents_tool(
+        es_client=es_client,
+        index_name="redbox-test-index",
+        embedding_model=FakeEmbeddings(size=8),
+        embedding_field_name="embedding",
+        chunk_resolution=ChunkResolution.normal,
+        timeout_seconds=2.5,
+    )
+
+    assert search.invoke(_tool_input("What's in my documents?")) is None
+    assert (
+        0 < es_client.search.call_args.kwargs["request_timeout"] <= 2.5
+    ), "A request that outlives the tool pattern's timeout would keep holding a shared tool thread"
+
+
+def test_search_documents_tool_gives_up_once_its_deadline_passes():
+    es_client = MagicMock(spec=OpenSearch)
+    search = build_search_documents_tool(
+        es_client=es_client,
+        index_name="redbox-test-index",
+        embedding_model=FakeEmbeddings(size=8),
+        embedding_field_name="embedding",
+        chunk_resolution=ChunkResolution.normal,
+        timeout_seconds=0,
+    )
+
+    with pytest.raises(TimeoutError):
+        search.invoke(_tool_input("What's in my documents?"))
+    es_client.search.assert_not_called()
+
+
+def test_tool_embeddings_give_up_without_retrying(env: Settings):
+    env = env.model_copy(update={"embedding_backend": "text-embedding-3-large"})
+
+    embeddings = get_embeddings(env, timeout_seconds=2.5)
+
+    assert embeddings.request_timeout == 2.5
+    assert embeddings.max_retries == 0
+
+
 def test_govuk_search_tool():
     tool = build_govuk_search_tool()
 
@@ -210,3 +257,82 @@ def test_wikipedia_tool():
         metadata = ChunkMetadata.model_validate(document.metadata)
         assert urlparse(metadata.uri).hostname == "en.wikipedia.org"
         assert metadata.creator_type == ChunkCreatorType.wikipedia
+
+
+def _tool_input(query: str) -> dict:
+    return {
+        "query": query,
+        "state": RedboxState(
+            request=RedboxQuery(
+                question=query,
+                s3_keys=[],
+                user_uuid=uuid4(),
+                chat_history=[],
+                ai_settings=AISettings(),
+                permitted_s3_keys=[],
+            ),
+            messages=[HumanMessage(content=query)],
+        ),
+    }
+
+
+def test_govuk_search_tool_caches_results(requests_mock):
+    search = requests_mock.get(
+        "http://govuk.test/api/search.json",
+        json={
+            "results": [
+                {
+                    "format": "travel_advice",
+                    "title": "Cuba travel advice",
+                    "description": "Advice for travelling to Cuba",
+                    "indexable_content": "Check the entry requirements before you travel.",
+                    "link": "/foreign-travel-advice/cuba",
+                }
+            ]
+        },
+    )
+    tool = build_govuk_search_tool(url_base="http://govuk.test", cache=TTLCache(max_size=10, ttl_seconds=60))
+
+    first = flatten_document_state(tool.invoke(_tool_input("Cuba travel advice"))["documents"])
+    second = flatten_document_state(tool.invoke(_tool_input("  cuba TRAVEL advice "))["documents"])
+
+    assert search.call_count == 1, "A query differing only in case and whitespace should be served from the cache"
+    assert [d.page_content for d in first] == [d.page_content for d in second]
+    assert first[0].metadata["uri"] == "http://govuk.test/foreign-travel-advice/cuba"
+    assert first[0].metadata["token_count"] > 0
+
+    first[0].metadata["token_count"] = 0
+    third = flatten_document_state(tool.invoke(_tool_input("Cuba travel advice"))["documents"])
+    assert third[0].metadata["token_count"] > 0, "Changing returned documents shouldn't change what's cached"
+
+
+def test_wikipedia_tool_caches_results(requests_mock):
+    def respond(request, context):
+        if request.qs.get("list") == ["search"]:
+            return {"query": {"search": [{"title": "Gordon Brown"}]}}
+        return {
+            "query": {
+                "pages": [
+                    {
+                        "title": "Gordon Brown",
+                        "extract": "Gordon Brown was Prime Minister of the United Kingdom.",
+                        "fullurl": "https://en.wikipedia.org/wiki/Gordon_Brown",
+                    }
+                ]
+            }
+        }
+
+    api = requests_mock.get("http://wikipedia.test/w/api.php", json=respond)
+    tool = build_search_wikipedia_tool(
+        api_url="http://wikipedia.test/w/api.php",
+        max_chars_per_wiki_page=12,
+        cache=TTLCache(max_size=10, ttl_seconds=60),
+    )
+
+    first = flatten_document_state(tool.invoke(_tool_input("Gordon Brown"))["documents"])
+    second = flatten_document_state(tool.invoke(_tool_input("gordon brown"))["documents"])
+
+    assert api.call_count == 2, "One search and one page read, then served from the cache"
+    assert [d.page_content for d in first] == [d.page_content for d in second] == ["Gordon Brown"]
+    assert first[0].metadata["uri"] == "https://en.wikipedia.org/wiki/Gordon_Brown"
+    assert first[0].metadata["creator_type"] == ChunkCreatorType.wikipedia
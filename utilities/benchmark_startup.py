@@ -0,0 +1,65 @@
+"""Times how long it takes to get a Redbox ready to serve, as paid by each ASGI worker on boot.
+
+Compares the lazy startup path against compiling every subgraph up front, which is what Redbox used to do.
+
+    cd redbox-core && poetry run python ../utilities/benchmark_startup.py
+"""
+
+import time
+
+from redbox.app import Redbox
+from redbox.graph.root import (
+    get_agentic_search_graph,
+    get_chat_graph,
+    get_chat_with_documents_graph,
+    get_retrieve_metadata_graph,
+    get_search_graph,
+    get_self_route_classifier_graph,
+    get_self_route_graph,
+)
+from redbox.models.chain import PromptSet
+from redbox.test.data import mock_all_chunks_retriever, mock_metadata_retriever, mock_parameterised_retriever
+
+REPEATS = 5
+
+
+def timed(label: str, func):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    print(f"{label:<40} best {min(timings) * 1000:8.1f}ms  mean {sum(timings) / REPEATS * 1000:8.1f}ms")  # noqa: T201
+
+
+def new_redbox() -> Redbox:
+    return Redbox(
+        all_chunks_retriever=mock_all_chunks_retriever([]),
+        parameterised_retriever=mock_parameterised_retriever([]),
+        metadata_retriever=mock_metadata_retriever([]),
+    )
+
+
+def lazy_startup():
+    _ = new_redbox().graph
+
+
+def eager_startup():
+    app = new_redbox()
+    _ = app.graph
+    get_chat_graph()
+    get_search_graph(retriever=app.parameterised_retriever)
+    get_agentic_search_graph(tools=app.tools)
+    get_chat_with_documents_graph(
+        all_chunks_retriever=app.all_chunks_retriever,
+        parameterised_retriever=app.parameterised_retriever,
+    )
+    get_self_route_graph(app.parameterised_retriever, PromptSet.SelfRoute)
+    get_self_route_classifier_graph(app.parameterised_retriever, app.all_chunks_retriever)
+    get_retrieve_metadata_graph(metadata_retriever=app.metadata_retriever)
+
+
+if __name__ == "__main__":
+    timed("Redbox()", new_redbox)
+    timed("Redbox().graph (lazy subgraphs)", lazy_startup)
+    timed("Redbox().graph + every subgraph", eager_startup)